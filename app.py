@@ -1,13 +1,26 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
+import json
+import hashlib
 import tempfile
+import threading
 import uuid
-from eDevlet import getQRdata, getFileBarkod, checkValid, getQRdataImg
+import zipfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from eDevlet import getQRdataByType, verifyBarkod, UpstreamUnavailable, RateLimited, BATCH, INTERACTIVE, verify_cache
+from qr_payload import QRParseError, TCKN_REQUIRED, UNREADABLE, parsePayload
+from cache import DocumentCache, TTLCache
+from jobs import JobQueue, QueueFull, InvalidCallback
+from storage import UploadStore, StorageFull
 import base64
 import io
-from ocr_comparison import DocumentComparator
+from worker_pool import cpu_pool, PoolBusy, TaskTimeout, compareDocuments, decodeDocument, scanDocument
+import metrics
+from metrics import stage_seconds
 
 app = Flask(__name__)
 CORS(app)  
@@ -17,18 +30,307 @@ UPLOAD_FOLDER = 'temp_uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# /upload dosyaları süreli ve kotalı depoda tutulur; terk edilen yüklemeleri arka planda temizler.
+# Temizleyici thread gunicorn post_fork'ta ya da __main__ bloğunda başlatılır.
+upload_store = UploadStore()
+
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
 
-comparator = DocumentComparator()
+# Bu boyuta kadar olan yüklemeler diske hiç yazılmadan bellekte işlenir
+UPLOAD_SPOOL_MAX = int(os.environ.get('UPLOAD_SPOOL_MAX', 4 * 1024 * 1024))
+
+class UploadSpool:
+    """
+    Yüklenen dosyanın akışı: max_size'a kadar bellekte, aşınca directory'de adı olan bir dosyada tutulur.
+    Dosya yazılırken sha256 özeti de hesaplanır. Diskteki dosya handover() ile kopyalanmadan başka bir
+    yola taşınabilir; devredilmeyen dosya akış kapatılınca silinir. Multipart ayrıştırıcının yaptığı
+    gibi yalnızca sona ekleyerek yazılmalıdır.
+    """
+    def __init__(self, max_size, directory):
+        self.max_size = max_size
+        self.directory = directory
+        self.file = io.BytesIO()
+        self.name = None
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        if self.name is None and self.file.tell() + len(data) > self.max_size:
+            self.rollover()
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def rollover(self):
+        fd, self.name = tempfile.mkstemp(dir=self.directory)
+        file = open(fd, 'w+b')
+        file.write(self.file.getvalue())
+        self.file = file
+
+    def handover(self, path):
+        """Diskteki dosyayı path'e taşır (aynı dosya sistemi); dosyanın silinmesi artık çağıranındır"""
+        self.file.flush()
+        os.replace(self.name, path)
+        self.name = None
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+    def close(self):
+        self.file.close()
+        if self.name is not None:
+            try:
+                os.remove(self.name)
+            except OSError:
+                pass
+            self.name = None
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def __getattr__(self, attr):
+        # read, seek, tell, seekable, flush... alttaki dosyadan
+        return getattr(self.file, attr)
+
+class SpooledRequest(Request):
+    """Multipart dosyaları UPLOAD_SPOOL_MAX'a kadar bellekte tutar, daha büyükleri deponun tmp/ klasörüne yazar"""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(UPLOAD_SPOOL_MAX, upload_store.tmp_dir)
+
+app.request_class = SpooledRequest
+
+# Toplu doğrulama ayarları
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 500))
+BATCH_MAX_UNZIPPED_SIZE = int(os.environ.get('BATCH_MAX_UNZIPPED_SIZE', 256 * 1024 * 1024))
+BATCH_UPSTREAM_CONCURRENCY = int(os.environ.get('BATCH_UPSTREAM_CONCURRENCY', 8))
+# Birleşik belgede (/verify-bundle) aranacak en fazla QR kodu
+BUNDLE_MAX_CODES = int(os.environ.get('BUNDLE_MAX_CODES', 50))
+
+_upstream_pool = None
+_upstream_pool_lock = threading.Lock()
+
+# QR çözme ve metin karşılaştırma istek thread'lerinde değil, süreç havuzunda çalışır.
+# Havuz içe aktarmada değil, gunicorn post_fork'ta ya da aşağıdaki __main__ bloğunda ısıtılır:
+# spawn süreçleri ana modülü tekrar yüklediğinden içe aktarmada başlatılan havuz bozulur.
+
+# Aynı içerikle tekrar yüklenen belgelerde QR çözme ve metin çıkarmayı atlamak için
+document_cache = DocumentCache()
+# Doğrulanmış PDF'ler, /verified/<pdf_id> ile ham olarak indirilebilmeleri için upload deposunun
+# yanındaki ayrı bir süreli ve kotalı depoda tutulur; böylece hangi worker'a düşerse düşsün bulunur
+VERIFIED_PDF_TTL = int(os.environ.get('VERIFIED_PDF_TTL', 600))
+verified_store = UploadStore(directory=os.path.join(upload_store.directory, 'verified'), ttl=VERIFIED_PDF_TTL,
+                             quota=int(os.environ.get('VERIFIED_PDF_MAX_BYTES', 256 * 1024 * 1024)),
+                             memory=upload_store.memory)
+# /upload sırasında hesaplanan özetler, /verify çağrısında dosyayı tekrar okumamak için
+upload_digests = TTLCache(4096)
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def save_upload(file, filepath):
+    """Yüklenen dosyayı parça parça diske yazar, bu sırada sha256 özetini hesaplayıp döndürür"""
+    digest = hashlib.sha256()
+    with stage_seconds.time(stage="upload_save"), open(filepath, 'wb') as out:
+        for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def spooled_on_disk(file):
+    """Dosya SpooledRequest tarafından zaten diske yazıldıysa akışı (UploadSpool), yoksa None"""
+    stream = file.stream
+    return stream if isinstance(stream, UploadSpool) and stream.name is not None else None
+
+def store_upload(file, file_id):
+    """Yüklenen dosyayı upload_store'a yazar ve sha256 özetini döndürür"""
+    spool = spooled_on_disk(file)
+    with upload_store.writer(file_id) as filepath:
+        if spool is not None:
+            # Diskteki spool dosyası ikinci kez kopyalanmadan depoya taşınır
+            spool.handover(filepath)
+            return spool.hexdigest()
+        return save_upload(file, filepath)
+
+def file_digest(filepath):
+    """Diskteki dosyanın sha256 özeti"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stream_size(stream):
+    """
+    Akışın boyutunu başa sararak döndürür; konumlanamayan akışlarda None.
+    SpooledTemporaryFile Python 3.11'den önce seekable() sunmadığı için seek/tell doğrudan denenir.
+    """
+    try:
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    return size
+
+def read_upload(file):
+    """
+    Yüklenen dosyayı işlenmek üzere hazırlar: UPLOAD_SPOOL_MAX'a kadar olan dosyalar bytes olarak
+    bellekte kalır, daha büyükleri deponun tmp/ klasöründe geçici dosyaya yazılır.
+    (kaynak, sha256 özeti, geçici dosya yolu ya da None) döndürür; kaynak bytes ya da dosya yoludur.
+    SpooledRequest'in zaten diske yazdığı dosyalar kopyalanmaz, geçici dosya olarak devralınır.
+    """
+    stream = file.stream
+    size = stream_size(stream)
+    if size is not None and size <= UPLOAD_SPOOL_MAX:
+        with stage_seconds.time(stage="upload_save"):
+            data = stream.read()
+        return data, hashlib.sha256(data).hexdigest(), None
+    with tempfile.NamedTemporaryFile(delete=False, dir=upload_store.tmp_dir,
+                                     suffix=f".{file.filename.split('.')[-1]}") as temp_file:
+        temp_filepath = temp_file.name
+    spool = spooled_on_disk(file)
+    if spool is not None:
+        spool.handover(temp_filepath)
+        return temp_filepath, spool.hexdigest(), temp_filepath
+    return temp_filepath, save_upload(file, temp_filepath), temp_filepath
+
+def decode_qr(source, file_ext, digest, with_pages=False):
+    """
+    Belgedeki QR bilgisini çözer; aynı içerik daha önce çözüldüyse önbellekten döndürür.
+    with_pages ise PDF'in sayfa metinleri de aynı işte, belge ikinci kez açılmadan çıkarılıp
+    karşılaştırma için önbelleğe yazılır.
+    """
+    entry = document_cache.get(digest) or {}
+    with_pages = with_pages and file_ext == 'pdf' and "pages" not in entry
+    if "qr" in entry and not with_pages:
+        return entry["qr"]
+    with stage_seconds.time(stage="qr_decode"):
+        qr_data, pages = cpu_pool.run(decodeDocument, source, file_ext, with_pages)
+    fields = {"qr": qr_data}
+    if pages is not None:
+        fields["pages"] = pages
+    document_cache.update(digest, **fields)
+    return qr_data
+
+def compare_cached(source, file_ext, digest, verification, document_type=None):
+    """Doğrulanmış belgeyle karşılaştırır; sonuç içerik özetiyle önbelleğe alınır"""
+    comparison_key = f"comparison:{document_type}" if document_type else "comparison"
+    entry = document_cache.get(digest) or {}
+    if comparison_key in entry:
+        return entry[comparison_key]
+    # QR çözülürken çıkarılan sayfa metinleri varsa orijinal belge tekrar açılmaz
+    with stage_seconds.time(stage="comparison"):
+        comparison = cpu_pool.run(compareDocuments, source, file_type=file_ext, original_pages=entry.get("pages"),
+                                  verified_pdf=verification.pdf, document_type=document_type)
+    if "error" not in comparison:
+        document_cache.update(digest, **{comparison_key: comparison})
+    return comparison
+
+def error_status(e):
+    """
+    Hataya göre HTTP durum kodu: QR içeriği okunamıyor ya da tanınmıyorsa 422 (TC kimlik numarası
+    gerekiyorsa 400), e-Devlet sorgu kotası doluysa 429, e-Devlet'e ulaşılamıyor ya da sunucu çok
+    yoğunsa 503, iş zaman aşımında 504, diğer durumlarda 500
+    """
+    if isinstance(e, QRParseError):
+        return e.http_status
+    if isinstance(e, RateLimited):
+        return 429
+    if isinstance(e, (UpstreamUnavailable, PoolBusy, QueueFull, StorageFull)):
+        return 503
+    if isinstance(e, TaskTimeout):
+        return 504
+    return 500
+
+def wants_pdf():
+    """İstemci Accept başlığında JSON yerine application/pdf tercih ediyor mu"""
+    return request.accept_mimetypes.best_match(['application/json', 'application/pdf']) == 'application/pdf'
+
+def embed_pdf_requested():
+    """Doğrulanmış PDF JSON yanıtına base64 olarak gömülsün mü (?embed_pdf=0 ile kapatılır)"""
+    return request.args.get('embed_pdf', '1') != '0' and not wants_pdf()
+
+def pdf_response(result, verification):
+    """Doğrulanmış PDF'i base64'e çevirmeden ham application/pdf olarak döndürür"""
+    response = send_file(io.BytesIO(verification.pdf), mimetype='application/pdf',
+                         download_name=f"{result['barkod']}.pdf")
+    response.headers['X-Barkod'] = result['barkod']
+    if 'verified_pdf_id' in result:
+        response.headers['X-Verified-Pdf-Id'] = result['verified_pdf_id']
+    return response
+
+def store_verified_pdf(pdf):
+    """Doğrulanmış PDF'i /verified/<pdf_id> için depoya yazar; kimliğini ya da depo doluysa None döndürür"""
+    pdf_id = uuid.uuid4().hex
+    try:
+        with verified_store.writer(pdf_id) as path, open(path, 'wb') as f:
+            f.write(pdf)
+    except (OSError, StorageFull) as e:
+        print(f"Doğrulanmış PDF saklanamadı: {e}")
+        return None
+    return pdf_id
+
+def load_verified_pdf(pdf_id):
+    """Depodaki doğrulanmış PDF'in içeriği; yoksa ya da süresi dolduysa None"""
+    path = verified_store.get(pdf_id)
+    if path is None:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def add_verification(result, verification, embed_pdf=True, store_pdf=True):
+    """Doğrulama sonucunu result sözlüğüne ekler; PDF'i istenirse depolar ve/veya base64 olarak gömer"""
+    result["is_valid"] = verification.is_valid
+    result["message"] = "Belge doğrulandı" if verification.is_valid else "Belge doğrulanamadı"
+    if verification.is_valid:
+        pdf_id = store_verified_pdf(verification.pdf) if store_pdf else None
+        if pdf_id is not None:
+            result["verified_pdf_id"] = pdf_id
+            result["verified_pdf_url"] = f"/verified/{pdf_id}"
+        if embed_pdf:
+            with stage_seconds.time(stage="pdf_base64"):
+                result["verified_pdf_base64"] = base64.b64encode(verification.pdf).decode('utf-8')
+
+def verify_qr(result, barkod, tc, embed_pdf=True, priority=INTERACTIVE, store_pdf=True):
+    """
+    Belgeyi e-Devlet'e tek sorguyla doğrular, sonucu result sözlüğüne ekler
+    ve doğrulama sonucunu (eDevlet.VerifyResult) döndürür.
+    Geçerli belgenin PDF'i store_pdf ise /verified/<pdf_id> ile indirilmek üzere saklanır;
+    embed_pdf ise ayrıca base64 olarak yanıta eklenir. Toplu işler e-Devlet hız sınırında
+    interaktif isteklerin arkasında kalsın diye priority=BATCH verir ve PDF'i zaten gömüyorlarsa
+    depoyu doldurmasın diye saklamaz.
+    """
+    verification = verifyBarkod(barkod, tc, priority)
+    add_verification(result, verification, embed_pdf, store_pdf)
+    return verification
+
+def get_upstream_pool():
+    """Toplu doğrulamadaki e-Devlet sorguları için sınırlı thread havuzunu ilk kullanımda oluşturur"""
+    global _upstream_pool
+    with _upstream_pool_lock:
+        if _upstream_pool is None:
+            _upstream_pool = ThreadPoolExecutor(max_workers=BATCH_UPSTREAM_CONCURRENCY,
+                                                thread_name_prefix='edevlet')
+        return _upstream_pool
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """API sağlık kontrolü"""
     return jsonify({"status": "healthy", "message": "API çalışıyor"})
 
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Doğrulama ve belge önbelleklerinin isabet/ıskalama sayaçları"""
+    return jsonify({"verification": verify_cache.stats(), "documents": document_cache.stats(),
+                    "storage": upload_store.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Aşama süreleri, QR çözme kademeleri, önbellek ve e-Devlet sayaçları (Prometheus metin formatı)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """Dosya yükleme endpointi"""
@@ -46,9 +348,8 @@ def upload_file():
         # Güvenli dosya adı oluştur
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4()}_{filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
         
-        file.save(filepath)
+        upload_digests.set(unique_filename, store_upload(file, unique_filename), upload_store.ttl)
         
         return jsonify({
             "message": "Dosya başarıyla yüklendi",
@@ -57,7 +358,7 @@ def upload_file():
         }), 200
         
     except Exception as e:
-        return jsonify({"error": f"Dosya yükleme hatası: {str(e)}"}), 500
+        return jsonify({"error": f"Dosya yükleme hatası: {str(e)}"}), error_status(e)
 
 @app.route('/verify', methods=['POST'])
 def verify_document():
@@ -69,63 +370,45 @@ def verify_document():
             return jsonify({"error": "file_id gerekli"}), 400
         
         file_id = data['file_id']
-        filepath = os.path.join(UPLOAD_FOLDER, file_id)
+        filepath = upload_store.get(file_id)
         
-        if not os.path.exists(filepath):
+        if filepath is None:
             return jsonify({"error": "Dosya bulunamadı"}), 404
         
         # Dosya uzantısına göre QR okuma
         file_ext = file_id.split('.')[-1].lower()
         
-        if file_ext == 'pdf':
-            qr_data = getQRdata(filepath)
-        elif file_ext in ['png', 'jpg', 'jpeg']:
-            qr_data = getQRdataImg(filepath)
-        else:
+        if file_ext not in ALLOWED_EXTENSIONS:
             return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
         
+        digest = upload_digests.pop(file_id) or file_digest(filepath)
+        qr_data = decode_qr(filepath, file_ext, digest)
+        
         barkod = qr_data["barkod"]
         tc = qr_data["tckn"]
         
-        # Belgeyi doğrula
-        is_valid = checkValid(barkod, tc)
-        
         result = {
             "file_id": file_id,
             "barkod": barkod,
-            "tc_kimlik": tc,
-            "is_valid": is_valid,
-            "message": "Belge doğrulandı" if is_valid else "Belge doğrulanamadı"
+            "tc_kimlik": tc
         }
         
-        # Eğer belge geçerliyse, doğrulanmış PDF'i oluştur
-        if is_valid:
-            verified_filename = f"verified_{file_id}"
-            verified_filepath = os.path.join(UPLOAD_FOLDER, verified_filename)
-            getFileBarkod(barkod, tc, verified_filepath)
-            
-            # Doğrulanmış PDF'i base64 olarak döndür
-            verified_pdf_path = verified_filepath + ".pdf"
-            with open(verified_pdf_path, 'rb') as f:
-                pdf_data = f.read()
-                pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
-            
-            result["verified_pdf_base64"] = pdf_base64
-            
-            # Geçici dosyayı sil
-            os.remove(verified_pdf_path)
+        # Belgeyi doğrula
+        verification = verify_qr(result, barkod, tc, embed_pdf=embed_pdf_requested())
         
         # Geçici dosyayı sil
-        os.remove(filepath)
+        upload_store.remove(file_id)
         
+        if verification.is_valid and wants_pdf():
+            return pdf_response(result, verification)
         return jsonify(result), 200
         
     except Exception as e:
         # Hata durumunda geçici dosyayı sil
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
+        if 'file_id' in locals():
+            upload_store.remove(file_id)
         
-        return jsonify({"error": f"Doğrulama hatası: {str(e)}"}), 500
+        return jsonify({"error": f"Doğrulama hatası: {str(e)}"}), error_status(e)
 
 @app.route('/verify-direct', methods=['POST'])
 def verify_direct():
@@ -141,63 +424,38 @@ def verify_direct():
         if not allowed_file(file.filename):
             return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
         
-        # Geçici dosya oluştur
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file.filename.split('.')[-1]}") as temp_file:
-            file.save(temp_file.name)
-            temp_filepath = temp_file.name
+        # Küçük dosyalar bellekte kalır, yalnızca büyükler geçici dosyaya yazılır
+        source, digest, temp_filepath = read_upload(file)
         
         try:
             # Dosya uzantısına göre QR okuma
             file_ext = file.filename.split('.')[-1].lower()
             
-            if file_ext == 'pdf':
-                qr_data = getQRdata(temp_filepath)
-            elif file_ext in ['png', 'jpg', 'jpeg']:
-                qr_data = getQRdataImg(temp_filepath)
-            else:
-                return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
+            qr_data = decode_qr(source, file_ext, digest)
             
             barkod = qr_data["barkod"]
             tc = qr_data["tckn"]
             
-            # Belgeyi doğrula
-            is_valid = checkValid(barkod, tc)
-            
             result = {
                 "filename": file.filename,
                 "barkod": barkod,
-                "tc_kimlik": tc,
-                "is_valid": is_valid,
-                "message": "Belge doğrulandı" if is_valid else "Belge doğrulanamadı"
+                "tc_kimlik": tc
             }
             
-            # Eğer belge geçerliyse, doğrulanmış PDF'i oluştur
-            if is_valid:
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as verified_temp:
-                    verified_filepath = verified_temp.name
-                
-                getFileBarkod(barkod, tc, verified_filepath)
-                
-                # Doğrulanmış PDF'i base64 olarak döndür
-                verified_pdf_path = verified_filepath + ".pdf"
-                with open(verified_pdf_path, 'rb') as f:
-                    pdf_data = f.read()
-                    pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
-                
-                result["verified_pdf_base64"] = pdf_base64
-                
-                # Geçici doğrulanmış dosyayı sil
-                os.remove(verified_pdf_path)
+            # Belgeyi doğrula
+            verification = verify_qr(result, barkod, tc, embed_pdf=embed_pdf_requested())
             
+            if verification.is_valid and wants_pdf():
+                return pdf_response(result, verification)
             return jsonify(result), 200
             
         finally:
             # Geçici dosyayı sil
-            if os.path.exists(temp_filepath):
+            if temp_filepath and os.path.exists(temp_filepath):
                 os.remove(temp_filepath)
         
     except Exception as e:
-        return jsonify({"error": f"Doğrulama hatası: {str(e)}"}), 500
+        return jsonify({"error": f"Doğrulama hatası: {str(e)}"}), error_status(e)
 
 @app.route('/verify-with-tc', methods=['POST'])
 def verify_with_tc():
@@ -210,81 +468,128 @@ def verify_with_tc():
         
         file_id = data['file_id']
         tc_kimlik = data['tc_kimlik']
-        filepath = os.path.join(UPLOAD_FOLDER, file_id)
+        filepath = upload_store.get(file_id)
         
-        if not os.path.exists(filepath):
+        if filepath is None:
             return jsonify({"error": "Dosya bulunamadı"}), 404
         
         # Dosya uzantısına göre QR okuma
         file_ext = file_id.split('.')[-1].lower()
         
-        if file_ext == 'pdf':
-            qr_data = getQRdata(filepath)
-        elif file_ext in ['png', 'jpg', 'jpeg']:
-            qr_data = getQRdataImg(filepath)
-        else:
+        if file_ext not in ALLOWED_EXTENSIONS:
             return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
         
-        barkod = qr_data["barkod"]
-        
-        # Belgeyi doğrula
-        is_valid = checkValid(barkod, tc_kimlik)
+        digest = upload_digests.pop(file_id) or file_digest(filepath)
+        try:
+            barkod = decode_qr(filepath, file_ext, digest)["barkod"]
+        except QRParseError as e:
+            # Yalnızca barkod içeren belgelerde (askerlik belgesi gibi) TC kimlik numarası istekten gelir
+            if e.code != TCKN_REQUIRED:
+                raise
+            barkod = e.barkod
         
         result = {
             "file_id": file_id,
             "barkod": barkod,
-            "tc_kimlik": tc_kimlik,
-            "is_valid": is_valid,
-            "message": "Belge doğrulandı" if is_valid else "Belge doğrulanamadı"
+            "tc_kimlik": tc_kimlik
         }
         
-        # Eğer belge geçerliyse, doğrulanmış PDF'i oluştur
-        if is_valid:
-            verified_filename = f"verified_{file_id}"
-            verified_filepath = os.path.join(UPLOAD_FOLDER, verified_filename)
-            getFileBarkod(barkod, tc_kimlik, verified_filepath)
-            
-            # Doğrulanmış PDF'i base64 olarak döndür
-            verified_pdf_path = verified_filepath + ".pdf"
-            with open(verified_pdf_path, 'rb') as f:
-                pdf_data = f.read()
-                pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
-            
-            result["verified_pdf_base64"] = pdf_base64
-            
-            # Geçici dosyayı sil
-            os.remove(verified_pdf_path)
+        # Belgeyi doğrula
+        verification = verify_qr(result, barkod, tc_kimlik, embed_pdf=embed_pdf_requested())
         
         # Geçici dosyayı sil
-        os.remove(filepath)
+        upload_store.remove(file_id)
         
+        if verification.is_valid and wants_pdf():
+            return pdf_response(result, verification)
         return jsonify(result), 200
         
     except Exception as e:
         # Hata durumunda geçici dosyayı sil
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
+        if 'file_id' in locals():
+            upload_store.remove(file_id)
         
-        return jsonify({"error": f"Doğrulama hatası: {str(e)}"}), 500
+        return jsonify({"error": f"Doğrulama hatası: {str(e)}"}), error_status(e)
 
 @app.route('/download/<file_id>', methods=['GET'])
 def download_file(file_id):
     """Yüklenen dosyayı indirme endpointi"""
     try:
-        filepath = os.path.join(UPLOAD_FOLDER, file_id)
+        filepath = upload_store.get(file_id)
         
-        if not os.path.exists(filepath):
+        if filepath is None:
             return jsonify({"error": "Dosya bulunamadı"}), 404
         
-        return send_file(filepath, as_attachment=True)
+        # Range (206), If-Range ve If-None-Match istekleri dosyayı baştan okumadan yanıtlanır.
+        # Dosya içeriği değişmediği için kimliği ETag olarak yeterlidir; depoda mtime son kullanma
+        # zamanı olduğundan Last-Modified gönderilmez.
+        response = send_file(filepath, as_attachment=True, conditional=True, etag=file_id)
+        response.headers.pop('Last-Modified', None)
+        return response
         
     except Exception as e:
         return jsonify({"error": f"İndirme hatası: {str(e)}"}), 500
 
 
+@app.route('/verified/<pdf_id>', methods=['GET'])
+def download_verified(pdf_id):
+    """Doğrulanmış PDF'i ham application/pdf olarak indirme endpointi"""
+    path = verified_store.get(pdf_id)
+    if path is None:
+        return jsonify({"error": "Doğrulanmış belge bulunamadı ya da süresi doldu"}), 404
+    return send_file(path, mimetype='application/pdf', download_name=f"{pdf_id}.pdf")
+
+
+def verify_and_compare(source, filename, file_ext, digest, embed_pdf=True, document_type=None, priority=INTERACTIVE,
+                       store_pdf=True):
+    """
+    /verify-compare'in işi: QR çözme, e-Devlet doğrulaması ve doğrulanmış belgeyle karşılaştırma.
+    Senkron endpoint ve iş kuyruğu tarafından kullanılır; sonuç sözlüğünü ve doğrulama sonucunu döndürür.
+    """
+    # Karşılaştırma için sayfa metinleri de QR çözülürken aynı açılışta çıkarılır
+    qr_data = decode_qr(source, file_ext, digest, with_pages=True)
+    
+    barkod = qr_data["barkod"]
+    tc = qr_data["tckn"]
+    
+    result = {
+        "filename": filename,
+        "barkod": barkod,
+        "tc_kimlik": tc
+    }
+    
+    verification = verify_qr(result, barkod, tc, embed_pdf=embed_pdf, priority=priority, store_pdf=store_pdf)
+    
+    if verification.is_valid:
+        result["ocr_comparison"] = compare_cached(source, file_ext, digest, verification, document_type)
+    else:
+        result["ocr_comparison"] = {
+            "error": "Belge doğrulanamadığı için OCR karşılaştırması yapılamadı",
+            "similarity_score": 0.0,
+            "similarity_percentage": 0.0,
+            "is_similar": False,
+            "comparison_status": "BELGE GEÇERSİZ"
+        }
+    return result, verification
+
+def run_compare_job(payload, params):
+    """İş kuyruğundaki bir /verify-compare işini çalıştırır"""
+    digest = hashlib.sha256(payload).hexdigest()
+    result, _ = verify_and_compare(payload, params["filename"], params["file_ext"], digest,
+                                   params["embed_pdf"], params["document_type"], priority=BATCH,
+                                   store_pdf=not params["embed_pdf"])
+    return result
+
+# Uzun süren doğrulama+karşılaştırma işleri için kalıcı kuyruk; istek hemen iş kimliğiyle döner.
+# Worker thread'leri içe aktarmada değil (preload'da gunicorn master'ında da çalışırlardı),
+# gunicorn post_fork'ta, __main__ bloğunda ya da ilk submit() çağrısında başlatılır.
+job_queue = JobQueue(run_compare_job)
+
 @app.route('/verify-compare', methods=['POST'])
 def verify_compare():
-    """Belgeyi doğrula ve OCR ile karşılaştır (tek adımda)"""
+    """Belgeyi doğrula ve OCR ile karşılaştır (tek adımda). ?async=1 ile iş kuyruğuna alınır."""
+    if request.args.get('async') == '1':
+        return submit_compare_job()
     try:
         if 'file' not in request.files:
             return jsonify({"error": "Dosya bulunamadı"}), 400
@@ -296,75 +601,263 @@ def verify_compare():
         if not allowed_file(file.filename):
             return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file.filename.split('.')[-1]}") as temp_file:
-            file.save(temp_file.name)
-            temp_filepath = temp_file.name
+        source, digest, temp_filepath = read_upload(file)
         
         try:
             file_ext = file.filename.split('.')[-1].lower()
-            
-            if file_ext == 'pdf':
-                qr_data = getQRdata(temp_filepath)
-            elif file_ext in ['png', 'jpg', 'jpeg']:
-                qr_data = getQRdataImg(temp_filepath)
-            else:
-                return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
-            
-            barkod = qr_data["barkod"]
-            tc = qr_data["tckn"]
-            
-            is_valid = checkValid(barkod, tc)
-            
-            result = {
-                "filename": file.filename,
-                "barkod": barkod,
-                "tc_kimlik": tc,
-                "is_valid": is_valid,
-                "message": "Belge doğrulandı" if is_valid else "Belge doğrulanamadı"
-            }
-            
-            if is_valid:
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as verified_temp:
-                    verified_filepath = verified_temp.name
-                
-                getFileBarkod(barkod, tc, verified_filepath)
-                
-                verified_pdf_path = verified_filepath + ".pdf"
-                with open(verified_pdf_path, 'rb') as f:
-                    pdf_data = f.read()
-                    pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
-                
-                result["verified_pdf_base64"] = pdf_base64
-                
-                comparison_result = comparator.compare_documents(temp_filepath, pdf_base64, file_ext)
-                result["ocr_comparison"] = comparison_result
-                
-                os.remove(verified_pdf_path)
-            else:
-                result["ocr_comparison"] = {
-                    "error": "Belge doğrulanamadığı için OCR karşılaştırması yapılamadı",
-                    "similarity_score": 0.0,
-                    "similarity_percentage": 0.0,
-                    "is_similar": False,
-                    "comparison_status": "BELGE GEÇERSİZ"
-                }
-            
+            result, _ = verify_and_compare(source, file.filename, file_ext, digest,
+                                           embed_pdf_requested(), request.form.get('document_type'))
             return jsonify(result), 200
             
         finally:
             # Geçici dosyayı sil
-            if os.path.exists(temp_filepath):
+            if temp_filepath and os.path.exists(temp_filepath):
                 os.remove(temp_filepath)
         
     except Exception as e:
-        return jsonify({"error": f"Doğrulama ve karşılaştırma hatası: {str(e)}"}), 500
+        return jsonify({"error": f"Doğrulama ve karşılaştırma hatası: {str(e)}"}), error_status(e)
+
+@app.route('/jobs/verify-compare', methods=['POST'])
+def submit_compare_job():
+    """Doğrulama ve karşılaştırmayı iş kuyruğuna alır; iş kimliğiyle hemen 202 döner"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "Dosya bulunamadı"}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"error": "Dosya seçilmedi"}), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
+        
+        params = {
+            "filename": file.filename,
+            "file_ext": file.filename.split('.')[-1].lower(),
+            "embed_pdf": request.args.get('embed_pdf', '1') != '0',
+            "document_type": request.form.get('document_type')
+        }
+        job_id = job_queue.submit(file.read(), params, request.form.get('callback_url'))
+        
+        response = jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"})
+        response.headers['Location'] = f"/jobs/{job_id}"
+        return response, 202
+        
+    except InvalidCallback as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"İş oluşturma hatası: {str(e)}"}), error_status(e)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """İşin durumu (queued, running, done, failed) ve bittiyse sonucu"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "İş bulunamadı ya da süresi doldu"}), 404
+    return jsonify(job), 200
+
+
+def collect_batch_files():
+    """İstekteki dosyaları (çoklu dosya ve/veya zip) (dosya adı, içerik) listesi olarak toplar"""
+    items = []
+    unzipped_size = 0
+    for file in request.files.getlist('files') + request.files.getlist('file'):
+        if file.filename == '':
+            continue
+        if file.filename.lower().endswith('.zip'):
+            # Python 3.11'den önce SpooledTemporaryFile seekable() sunmaz; zipfile altındaki dosyayı okur
+            with zipfile.ZipFile(getattr(file.stream, '_file', file.stream)) as zf:
+                for info in zf.infolist():
+                    name = os.path.basename(info.filename)
+                    if info.is_dir() or not name:
+                        continue
+                    # Sınır aşıldıysa kalan üyeler hiç açılmaz
+                    if len(items) >= BATCH_MAX_FILES:
+                        raise ValueError(f"Tek istekte en fazla {BATCH_MAX_FILES} belge gönderilebilir")
+                    if not allowed_file(name):
+                        items.append((name, None))
+                        continue
+                    unzipped_size += info.file_size
+                    if unzipped_size > BATCH_MAX_UNZIPPED_SIZE:
+                        raise ValueError("Zip içeriği izin verilen boyutu aşıyor")
+                    items.append((name, zf.read(info)))
+        elif allowed_file(file.filename):
+            items.append((file.filename, file.read()))
+        else:
+            items.append((file.filename, None))
+        if len(items) > BATCH_MAX_FILES:
+            raise ValueError(f"Tek istekte en fazla {BATCH_MAX_FILES} belge gönderilebilir")
+    return items
+
+def verify_batch_item(filename, qr_data, embed_pdf=True):
+    """Toplu doğrulamada tek belgenin e-Devlet sorgusunu yapar"""
+    barkod = qr_data["barkod"]
+    tc = qr_data["tckn"]
+    
+    result = {
+        "filename": filename,
+        "barkod": barkod,
+        "tc_kimlik": tc
+    }
+    verify_qr(result, barkod, tc, embed_pdf=embed_pdf, priority=BATCH, store_pdf=not embed_pdf)
+    return result
+
+def run_batch(items, embed_pdf=True):
+    """
+    QR kodlarını süreç havuzunda paralel çözer, her çözülen belge için e-Devlet sorgusunu
+    thread havuzuna verir ve sonuçları tamamlandıkça üretir. Havuz kuyruğu doluysa yeni
+    belgeler yer açıldıkça gönderilir. Çözme süresi, belge havuz kuyruğunda beklerken değil
+    bir worker'a verildiğinde işlemeye başlar.
+    """
+    upstream_pool = get_upstream_pool()
+    queue = deque(enumerate(items))
+    stages = {}
+    try:
+        while queue or stages:
+            while queue:
+                index, (filename, data) = queue[0]
+                if data is None:
+                    queue.popleft()
+                    yield {"index": index, "filename": filename, "error": "Desteklenmeyen dosya formatı"}
+                    continue
+                file_ext = filename.rsplit('.', 1)[1].lower()
+                try:
+                    # Bekleyen iş yoksa kuyrukta yer açılmasını bekle, varsa sonuçları işlemeye dön
+                    future = cpu_pool.submit(getQRdataByType, data, file_ext,
+                                             block=not stages, timeout=cpu_pool.task_timeout)
+                except PoolBusy:
+                    if not stages:
+                        raise
+                    break
+                queue.popleft()
+                stages[future] = (index, filename, 'decode', None)
+            if not stages:
+                continue
+            
+            now = time.monotonic()
+            for future, (index, filename, stage, deadline) in list(stages.items()):
+                if stage == 'decode' and deadline is None and future.started():
+                    stages[future] = (index, filename, stage, now + cpu_pool.task_timeout)
+            deadlines = [deadline for _, _, _, deadline in stages.values() if deadline is not None]
+            # Kuyrukta bekleyen işler ancak önceki bir iş bitince başlar; o da wait'i uyandırır
+            timeout = max(min(deadlines) - now, 0) if deadlines else cpu_pool.task_timeout
+            done, _ = wait(stages, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, filename, stage, _ = stages.pop(future)
+                try:
+                    value = future.result()
+                except Exception as e:
+                    yield {"index": index, "filename": filename, "error": f"Doğrulama hatası: {str(e)}"}
+                    continue
+                if stage == 'decode':
+                    stages[upstream_pool.submit(verify_batch_item, filename, value, embed_pdf)] = (index, filename, 'verify', None)
+                else:
+                    value["index"] = index
+                    yield value
+            
+            now = time.monotonic()
+            for future, (index, filename, stage, deadline) in list(stages.items()):
+                if deadline is not None and deadline < now:
+                    del stages[future]
+                    future.cancel()
+                    yield {"index": index, "filename": filename, "error": "Doğrulama hatası: İşlem zaman aşımına uğradı."}
+    finally:
+        # İstemci akışı yarıda keserse bekleyen işleri iptal et
+        for future in stages:
+            future.cancel()
+
+@app.route('/verify-batch', methods=['POST'])
+def verify_batch():
+    """Çoklu dosya ya da zip ile toplu belge doğrulama endpointi"""
+    try:
+        items = collect_batch_files()
+        if not items:
+            return jsonify({"error": "Dosya bulunamadı"}), 400
+        
+        embed_pdf = request.args.get('embed_pdf', '1') != '0'
+        stream = request.args.get('stream') == '1' or \
+            request.accept_mimetypes.best == 'application/x-ndjson'
+        
+        if stream:
+            def generate():
+                for result in run_batch(items, embed_pdf):
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        results = sorted(run_batch(items, embed_pdf), key=lambda r: r["index"])
+        return jsonify({"count": len(results), "results": results}), 200
+        
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Toplu doğrulama hatası: {str(e)}"}), error_status(e)
 
 
+def verify_bundle_item(code, embed_pdf=True):
+    """Birleşik belgede bulunan tek QR kodunu ayrıştırıp e-Devlet sorgusunu yapar; hatalar sonuca yazılır"""
+    result = {"page": code["page"]}
+    try:
+        payload = parsePayload(code["qr"])
+    except QRParseError as e:
+        result["error"] = str(e)
+        result["error_code"] = e.code
+        if e.barkod:
+            result["barkod"] = e.barkod
+        return result
+    result["barkod"] = payload.barkod
+    result["tc_kimlik"] = payload.tckn
+    try:
+        verify_qr(result, payload.barkod, payload.tckn, embed_pdf=embed_pdf, priority=BATCH, store_pdf=not embed_pdf)
+    except Exception as e:
+        result["error"] = f"Doğrulama hatası: {str(e)}"
+    return result
+
+@app.route('/verify-bundle', methods=['POST'])
+def verify_bundle():
+    """Birden fazla e-Devlet belgesini birleştiren tek dosyadaki tüm QR kodlarını bulup doğrulama endpointi"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "Dosya bulunamadı"}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"error": "Dosya seçilmedi"}), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
+        
+        limit = min(request.args.get('limit', type=int) or BUNDLE_MAX_CODES, BUNDLE_MAX_CODES)
+        embed_pdf = request.args.get('embed_pdf', '1') != '0'
+        source, _, temp_filepath = read_upload(file)
+        
+        try:
+            # Sayfalar havuzda paralel taranır, limit kadar kod bulununca tarama durur
+            file_ext = file.filename.split('.')[-1].lower()
+            with stage_seconds.time(stage="qr_scan"):
+                codes = scanDocument(source, file_ext, limit=limit)
+        finally:
+            if temp_filepath and os.path.exists(temp_filepath):
+                os.remove(temp_filepath)
+        
+        if not codes:
+            raise QRParseError(UNREADABLE, "QR okunamadı.")
+        
+        results = list(get_upstream_pool().map(lambda code: verify_bundle_item(code, embed_pdf), codes))
+        return jsonify({"filename": file.filename, "count": len(results), "results": results}), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Doğrulama hatası: {str(e)}"}), error_status(e)
+
 @app.errorhandler(413)
 def too_large(e):
     return jsonify({"error": "Dosya çok büyük. Maksimum 16MB desteklenir."}), 413
 
 if __name__ == '__main__':
     import os
+    if os.environ.get('CPU_PREWARM', '1') == '1':
+        cpu_pool.prewarm()
+    job_queue.start()
+    upload_store.start()
+    verified_store.start()
     port = int(os.environ.get('PORT', 8080))
     app.run(debug=False, host='0.0.0.0', port=port, threaded=True)
\ No newline at end of file
@@ -0,0 +1,326 @@
+"""
+Servisin asyncio/ASGI sürümü.
+
+app.py ile aynı endpointleri sunar; e-Devlet sorguları httpx ile asenkron yapılır,
+QR çözme süreç havuzuna (worker_pool.cpu_pool) devredilir. Böylece tek süreç
+e-Devlet'i bekleyen yüzlerce isteği thread başına bellek harcamadan taşıyabilir.
+
+Çalıştırma:
+    hypercorn asgi_app:app --bind 0.0.0.0:8080
+"""
+import asyncio
+import os
+import uuid
+
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+from werkzeug.utils import secure_filename
+
+from app import (ALLOWED_EXTENSIONS, allowed_file, store_upload, read_upload, add_verification,
+                 load_verified_pdf, file_digest, compare_cached, error_status, document_cache, upload_digests,
+                 job_queue, upload_store, verified_store)
+from jobs import InvalidCallback
+from eDevlet import AsyncEDevletClient, client, verifyBarkodAsync
+from worker_pool import cpu_pool, decodeDocument
+import metrics
+from metrics import stage_seconds
+
+app = cors(Quart(__name__))
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+
+async_client = None
+
+
+@app.before_serving
+async def startup():
+    global async_client
+    cpu_pool.prewarm()
+    job_queue.start()
+    upload_store.start()
+    verified_store.start()
+    # Devre kesici ve hız sınırı senkron istemciyle paylaşılır
+    async_client = AsyncEDevletClient(breaker=client.breaker, limiter=client.limiter)
+
+@app.after_serving
+async def shutdown():
+    await async_client.aclose()
+    cpu_pool.shutdown()
+
+
+async def decode_qr(source, file_ext, digest, with_pages=False):
+    """app.decode_qr'nin asenkron sürümü; QR çözme süreç havuzunda yapılır"""
+    entry = await asyncio.to_thread(document_cache.get, digest) or {}
+    with_pages = with_pages and file_ext == 'pdf' and "pages" not in entry
+    if "qr" in entry and not with_pages:
+        return entry["qr"]
+    with stage_seconds.time(stage="qr_decode"):
+        qr_data, pages = await cpu_pool.run_async(decodeDocument, source, file_ext, with_pages)
+    fields = {"qr": qr_data}
+    if pages is not None:
+        fields["pages"] = pages
+    await asyncio.to_thread(document_cache.update, digest, **fields)
+    return qr_data
+
+def wants_pdf():
+    """İstemci Accept başlığında JSON yerine application/pdf tercih ediyor mu"""
+    return request.accept_mimetypes.best_match(['application/json', 'application/pdf']) == 'application/pdf'
+
+def embed_pdf_requested():
+    """Doğrulanmış PDF JSON yanıtına base64 olarak gömülsün mü (?embed_pdf=0 ile kapatılır)"""
+    return request.args.get('embed_pdf', '1') != '0' and not wants_pdf()
+
+def pdf_response(result, verification):
+    """Doğrulanmış PDF'i base64'e çevirmeden ham application/pdf olarak döndürür"""
+    headers = {
+        'Content-Disposition': f"attachment; filename={result['barkod']}.pdf",
+        'X-Barkod': result['barkod']
+    }
+    if 'verified_pdf_id' in result:
+        headers['X-Verified-Pdf-Id'] = result['verified_pdf_id']
+    return Response(verification.pdf, mimetype='application/pdf', headers=headers)
+
+async def verify_qr(result, barkod, tc, embed_pdf=True):
+    """app.verify_qr'nin asenkron sürümü"""
+    verification = await verifyBarkodAsync(barkod, tc, async_client)
+    # PDF depoya dosya olarak yazılır; olay döngüsünü bloklamasın
+    await asyncio.to_thread(add_verification, result, verification, embed_pdf)
+    return verification
+
+async def receive_upload():
+    """
+    İstekteki dosyayı app.read_upload ile hazırlar (küçükse bellekte, büyükse geçici dosyada);
+    (dosya, kaynak, özet, geçici yol ya da None) ya da hata yanıtı döndürür.
+    """
+    files = await request.files
+    if 'file' not in files:
+        return None, (jsonify({"error": "Dosya bulunamadı"}), 400)
+    file = files['file']
+    if file.filename == '':
+        return None, (jsonify({"error": "Dosya seçilmedi"}), 400)
+    if not allowed_file(file.filename):
+        return None, (jsonify({"error": "Desteklenmeyen dosya formatı"}), 400)
+    source, digest, temp_filepath = await asyncio.to_thread(read_upload, file)
+    return (file, source, digest, temp_filepath), None
+
+
+@app.route('/health', methods=['GET'])
+async def health_check():
+    """API sağlık kontrolü"""
+    return jsonify({"status": "healthy", "message": "API çalışıyor"})
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint():
+    """Aşama süreleri, QR çözme kademeleri, önbellek ve e-Devlet sayaçları (Prometheus metin formatı)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/upload', methods=['POST'])
+async def upload_file():
+    """Dosya yükleme endpointi"""
+    try:
+        files = await request.files
+        if 'file' not in files:
+            return jsonify({"error": "Dosya bulunamadı"}), 400
+
+        file = files['file']
+        if file.filename == '':
+            return jsonify({"error": "Dosya seçilmedi"}), 400
+
+        if not allowed_file(file.filename):
+            return jsonify({"error": "Desteklenmeyen dosya formatı. PDF, PNG, JPG desteklenir."}), 400
+
+        filename = secure_filename(file.filename)
+        unique_filename = f"{uuid.uuid4()}_{filename}"
+
+        digest = await asyncio.to_thread(store_upload, file, unique_filename)
+        upload_digests.set(unique_filename, digest, upload_store.ttl)
+
+        return jsonify({
+            "message": "Dosya başarıyla yüklendi",
+            "file_id": unique_filename,
+            "filename": filename
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Dosya yükleme hatası: {str(e)}"}), error_status(e)
+
+@app.route('/verify', methods=['POST'])
+async def verify_document():
+    """Belge doğrulama endpointi"""
+    filepath = None
+    try:
+        data = await request.get_json()
+
+        if not data or 'file_id' not in data:
+            return jsonify({"error": "file_id gerekli"}), 400
+
+        file_id = data['file_id']
+        filepath = await asyncio.to_thread(upload_store.get, file_id)
+
+        if filepath is None:
+            return jsonify({"error": "Dosya bulunamadı"}), 404
+
+        file_ext = file_id.split('.')[-1].lower()
+        if file_ext not in ALLOWED_EXTENSIONS:
+            return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
+
+        digest = upload_digests.pop(file_id) or await asyncio.to_thread(file_digest, filepath)
+        qr_data = await decode_qr(filepath, file_ext, digest)
+
+        barkod = qr_data["barkod"]
+        tc = qr_data["tckn"]
+
+        result = {
+            "file_id": file_id,
+            "barkod": barkod,
+            "tc_kimlik": tc
+        }
+
+        verification = await verify_qr(result, barkod, tc, embed_pdf=embed_pdf_requested())
+
+        if verification.is_valid and wants_pdf():
+            return pdf_response(result, verification)
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Doğrulama hatası: {str(e)}"}), error_status(e)
+    finally:
+        # Geçici dosyayı sil
+        if filepath:
+            await asyncio.to_thread(upload_store.remove, file_id)
+
+@app.route('/verify-direct', methods=['POST'])
+async def verify_direct():
+    """Direkt dosya yükleme ve doğrulama endpointi"""
+    try:
+        upload, error = await receive_upload()
+        if error:
+            return error
+        file, source, digest, temp_filepath = upload
+
+        try:
+            file_ext = file.filename.split('.')[-1].lower()
+            qr_data = await decode_qr(source, file_ext, digest)
+
+            barkod = qr_data["barkod"]
+            tc = qr_data["tckn"]
+
+            result = {
+                "filename": file.filename,
+                "barkod": barkod,
+                "tc_kimlik": tc
+            }
+
+            verification = await verify_qr(result, barkod, tc, embed_pdf=embed_pdf_requested())
+
+            if verification.is_valid and wants_pdf():
+                return pdf_response(result, verification)
+            return jsonify(result), 200
+
+        finally:
+            if temp_filepath and os.path.exists(temp_filepath):
+                os.remove(temp_filepath)
+
+    except Exception as e:
+        return jsonify({"error": f"Doğrulama hatası: {str(e)}"}), error_status(e)
+
+@app.route('/verified/<pdf_id>', methods=['GET'])
+async def download_verified(pdf_id):
+    """Doğrulanmış PDF'i ham application/pdf olarak indirme endpointi"""
+    pdf = await asyncio.to_thread(load_verified_pdf, pdf_id)
+    if pdf is None:
+        return jsonify({"error": "Doğrulanmış belge bulunamadı ya da süresi doldu"}), 404
+    return Response(pdf, mimetype='application/pdf')
+
+@app.route('/verify-compare', methods=['POST'])
+async def verify_compare():
+    """Belgeyi doğrula ve OCR ile karşılaştır (tek adımda)"""
+    try:
+        upload, error = await receive_upload()
+        if error:
+            return error
+        file, source, digest, temp_filepath = upload
+
+        try:
+            file_ext = file.filename.split('.')[-1].lower()
+            qr_data = await decode_qr(source, file_ext, digest, with_pages=True)
+
+            barkod = qr_data["barkod"]
+            tc = qr_data["tckn"]
+
+            result = {
+                "filename": file.filename,
+                "barkod": barkod,
+                "tc_kimlik": tc
+            }
+
+            verification = await verify_qr(result, barkod, tc, embed_pdf=embed_pdf_requested())
+
+            if verification.is_valid:
+                document_type = (await request.form).get('document_type')
+                result["ocr_comparison"] = await asyncio.to_thread(
+                    compare_cached, source, file_ext, digest, verification, document_type)
+            else:
+                result["ocr_comparison"] = {
+                    "error": "Belge doğrulanamadığı için OCR karşılaştırması yapılamadı",
+                    "similarity_score": 0.0,
+                    "similarity_percentage": 0.0,
+                    "is_similar": False,
+                    "comparison_status": "BELGE GEÇERSİZ"
+                }
+
+            return jsonify(result), 200
+
+        finally:
+            if temp_filepath and os.path.exists(temp_filepath):
+                os.remove(temp_filepath)
+
+    except Exception as e:
+        return jsonify({"error": f"Doğrulama ve karşılaştırma hatası: {str(e)}"}), error_status(e)
+
+@app.route('/jobs/verify-compare', methods=['POST'])
+async def submit_compare_job():
+    """Doğrulama ve karşılaştırmayı iş kuyruğuna alır; iş kimliğiyle hemen 202 döner"""
+    try:
+        files = await request.files
+        if 'file' not in files:
+            return jsonify({"error": "Dosya bulunamadı"}), 400
+        file = files['file']
+        if file.filename == '':
+            return jsonify({"error": "Dosya seçilmedi"}), 400
+        if not allowed_file(file.filename):
+            return jsonify({"error": "Desteklenmeyen dosya formatı"}), 400
+
+        form = await request.form
+        params = {
+            "filename": file.filename,
+            "file_ext": file.filename.split('.')[-1].lower(),
+            "embed_pdf": request.args.get('embed_pdf', '1') != '0',
+            "document_type": form.get('document_type')
+        }
+        job_id = await asyncio.to_thread(job_queue.submit, file.read(), params, form.get('callback_url'))
+
+        response = jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"})
+        response.headers['Location'] = f"/jobs/{job_id}"
+        return response, 202
+
+    except InvalidCallback as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"İş oluşturma hatası: {str(e)}"}), error_status(e)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    """İşin durumu (queued, running, done, failed) ve bittiyse sonucu"""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        return jsonify({"error": "İş bulunamadı ya da süresi doldu"}), 404
+    return jsonify(job), 200
+
+
+@app.errorhandler(413)
+async def too_large(e):
+    return jsonify({"error": "Dosya çok büyük. Maksimum 16MB desteklenir."}), 413
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 8080))
+    app.run(host='0.0.0.0', port=port)
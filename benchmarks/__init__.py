@@ -0,0 +1,11 @@
+"""
+QR çözme → e-Devlet doğrulama → metin karşılaştırma hattı için tekrarlanabilir benchmark.
+
+- corpus: sabit tohumla sentetik e-Devlet tarzı PDF ve resimler üretir
+- mock_upstream: m.turkiye.gov.tr api.php'nin yerel taklidi
+- memory: havuz workerlarının ve ana sürecin en yüksek RSS ölçümü (VmHWM)
+- __main__: aşama süreleri, eşzamanlı yükte verim ve en yüksek RSS'i ölçüp json yazar
+
+Çalıştırma:
+    python -m benchmarks --out bench.json
+"""
@@ -0,0 +1,227 @@
+"""
+Benchmark çalıştırıcı.
+
+    python -m benchmarks [--count 12] [--concurrency 1,4,16] [--workers 2] [--out bench.json]
+
+Ölçülenler:
+- decode / verify / compare: her belge için tek tek aşama süreleri (p50, p95, ortalama) ve başarı oranı
+- load: verilen eşzamanlılık düzeylerinde tüm hattın (havuzda QR çözme → e-Devlet taklidi →
+  karşılaştırma) verimi ve gecikmesi
+- substages: metrics modülündeki aşama histogramlarından PDF çizimi, pyzbar, OpenCV vb. toplamları
+- rss_kb: ana sürecin ve her havuz workerının en yüksek bellek kullanımı (/proc/self/status VmHWM;
+  /proc yoksa RUSAGE_SELF)
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import generate
+from benchmarks.memory import peakRss
+from benchmarks.mock_upstream import MockUpstream
+
+
+def percentile(values:list, q:float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def summarize(durations:list, failures:int = 0) -> dict:
+    return {
+        "count": len(durations) + failures,
+        "failures": failures,
+        "mean": sum(durations) / len(durations) if durations else None,
+        "p50": percentile(durations, 0.5),
+        "p95": percentile(durations, 0.95),
+        "max": max(durations) if durations else None,
+    }
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def gitRevision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchDecode(documents:list, getQRdataByType) -> dict:
+    durations, failures, by_variant = [], 0, {}
+    for doc in documents:
+        try:
+            qr_data, seconds = timed(getQRdataByType, doc.data, doc.kind)
+            ok = qr_data == {"barkod": doc.barkod, "tckn": doc.tckn}
+        except Exception:
+            ok, seconds = False, None
+        variant = by_variant.setdefault(doc.variant, {"ok": 0, "total": 0})
+        variant["total"] += 1
+        if ok:
+            variant["ok"] += 1
+            durations.append(seconds)
+        else:
+            failures += 1
+    result = summarize(durations, failures)
+    result["by_variant"] = by_variant
+    return result
+
+def benchVerify(documents:list, verifyBarkod) -> dict:
+    durations, failures = [], 0
+    for doc in documents:
+        try:
+            verification, seconds = timed(verifyBarkod, doc.barkod, doc.tckn)
+        except Exception:
+            failures += 1
+            continue
+        if verification.is_valid:
+            durations.append(seconds)
+        else:
+            failures += 1
+    return summarize(durations, failures)
+
+def benchCompare(documents:list, comparator) -> dict:
+    durations, failures = [], 0
+    for doc in documents:
+        comparison, seconds = timed(comparator.compare_documents, doc.data, file_type=doc.kind,
+                                    verified_pdf=doc.verified_pdf)
+        if "error" in comparison or not comparison["is_similar"]:
+            failures += 1
+        else:
+            durations.append(seconds)
+    return summarize(durations, failures)
+
+def benchLoad(documents:list, concurrency:int, pipeline) -> dict:
+    durations, failures = [], 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for ok, seconds in executor.map(pipeline, documents):
+            if ok:
+                durations.append(seconds)
+            else:
+                failures += 1
+    wall = time.perf_counter() - start
+    result = summarize(durations, failures)
+    result.update({"concurrency": concurrency, "wall_seconds": wall, "docs_per_second": len(documents) / wall})
+    return result
+
+def metricSnapshot(histogram) -> dict:
+    """metrics.Histogram serilerinden {etiket: {"count", "sum", "mean"}}"""
+    snapshot = {}
+    with histogram.lock:
+        items = list(histogram.values.items())
+    for key, series in items:
+        count, total = series[-1], series[-2]
+        snapshot[",".join(key)] = {"count": count, "sum": total, "mean": total / count if count else None}
+    return snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QR çözme → doğrulama → karşılaştırma benchmark'ı")
+    parser.add_argument("--count", type=int, default=12, help="üretilecek PDF sayısı (her biri için bir resim de üretilir)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--no-images", action="store_true", help="resim varyantlarını üretme")
+    parser.add_argument("--concurrency", default="1,4,16", help="yük testi eşzamanlılık düzeyleri")
+    parser.add_argument("--workers", type=int, default=2, help="işlem havuzu süreç sayısı (CPU_WORKERS)")
+    parser.add_argument("--latency", type=float, default=0.05, help="e-Devlet taklidinin yanıt gecikmesi (saniye)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="e-Devlet taklidinin 503 döndürme oranı")
+    parser.add_argument("--rate", type=float, default=0, help="e-Devlet hız sınırı (istek/saniye, 0 ise kapalı)")
+    parser.add_argument("--ocr", action="store_true", help="resimleri de OCR ile karşılaştır (EasyOCR gerekir)")
+    parser.add_argument("--out", default="-", help="sonuç json dosyası (- ise standart çıktı)")
+    args = parser.parse_args(argv)
+
+    documents = generate(args.count, args.seed, images=not args.no_images)
+    upstream = MockUpstream({(d.barkod, d.tckn): d.verified_pdf for d in documents},
+                            latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    base_url = upstream.start()
+
+    # Servis modülleri ayarlarını içe aktarılırken okuduğu için ortam önce hazırlanır;
+    # doğrulama önbelleği kapatılır ki her sorgu taklit sunucuya gitsin
+    os.environ["EDEVLET_BASE_URL"] = base_url
+    os.environ["VERIFY_CACHE_TTL"] = "0"
+    os.environ["VERIFY_CACHE_NEGATIVE_TTL"] = "0"
+    os.environ["VERIFY_CACHE_SQLITE"] = ""
+    os.environ["CPU_WORKERS"] = str(args.workers)
+    os.environ["EDEVLET_POOL_SIZE"] = str(max(int(c) for c in args.concurrency.split(",")))
+    # Taklit sunucunun kapasitesi ölçülsün diye hız sınırı kapalı (--rate ile açılır)
+    os.environ["EDEVLET_RATE"] = str(args.rate)
+
+    import metrics
+    from eDevlet import getQRdataByType, verifyBarkod
+    from ocr_comparison import DocumentComparator
+    from worker_pool import cpu_pool, compareDocuments
+
+    comparable = [d for d in documents if d.kind == "pdf" or args.ocr]
+
+    def pipeline(doc):
+        start = time.perf_counter()
+        try:
+            qr_data = cpu_pool.run(getQRdataByType, doc.data, doc.kind)
+            verification = verifyBarkod(qr_data["barkod"], qr_data["tckn"])
+            if verification.is_valid and (doc.kind == "pdf" or args.ocr):
+                cpu_pool.run(compareDocuments, doc.data, file_type=doc.kind, verified_pdf=verification.pdf)
+            ok = verification.is_valid
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    results = {
+        "meta": {
+            "revision": gitRevision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "documents": len(documents),
+            "seed": args.seed,
+            "workers": args.workers,
+            "upstream_latency": args.latency,
+            "upstream_error_rate": args.error_rate,
+            "upstream_rate_limit": args.rate,
+        },
+        "stages": {
+            "decode": benchDecode(documents, getQRdataByType),
+            "verify": benchVerify(documents, verifyBarkod),
+            "compare": benchCompare(comparable, DocumentComparator()),
+        },
+        "load": [],
+    }
+
+    cpu_pool.prewarm()
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        results["load"].append(benchLoad(documents, concurrency, pipeline))
+    # spawn ile açılan workerlar RUSAGE_CHILDREN'a yansımaz; her worker kendi VmHWM değerini bildirir
+    worker_rss = {}
+    if args.workers > 0:
+        futures = [cpu_pool.submit(peakRss, block=True) for _ in range(args.workers)]
+        for future in futures:
+            pid, rss = future.result()
+            worker_rss[str(pid)] = rss
+    cpu_pool.shutdown()
+    upstream.stop()
+
+    results["substages"] = metricSnapshot(metrics.stage_seconds)
+    results["upstream"] = metricSnapshot(metrics.upstream_seconds)
+    results["upstream"]["requests"] = upstream.requests
+    results["rss_kb"] = {
+        "main": peakRss(hold=0)[1],
+        "workers": max(worker_rss.values()) if worker_rss else None,
+        "per_worker": worker_rss,
+    }
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == "-":
+        print(output)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Sentetik e-Devlet tarzı belge korpusu.
+
+Her belge birkaç sayfalık metin ve son sayfanın altında QR kodu olan bir PDF'tir; resim
+varyantları bu PDF'in son sayfası farklı DPI'larda çizilip döndürülerek ve gürültü
+eklenerek üretilir. Aynı tohum her zaman aynı korpusu verir.
+"""
+import random
+from collections import namedtuple
+
+import cv2
+import fitz
+import numpy as np
+
+# kind: "pdf" ya da resim uzantısı, variant: üretim biçiminin kısa açıklaması,
+# data: dosya içeriği, verified_pdf: e-Devlet'in bu belge için döndüreceği PDF (QR'sız aynı metin)
+Document = namedtuple("Document", "name kind variant barkod tckn payload data verified_pdf")
+
+PAYLOAD_FORMATS = {
+    "duz": "barkod:{barkod};tckn:{tckn};",
+    "sicil": "barkodlubelgedogrulama://barkod:{barkod};tckn:{tckn}",
+    "url": "barkod:{barkod};tckn:{tckn};https://www.turkiye.gov.tr/belge-dogrulama?barkod={barkod}",
+}
+
+# (ad, DPI, döndürme açısı, gürültü std)
+IMAGE_VARIANTS = (
+    ("150dpi", 150, 0, 0),
+    ("72dpi", 72, 0, 0),
+    ("dondurulmus-90", 150, 90, 0),
+    ("egik-7", 150, 7, 0),
+    ("gurultulu", 150, 0, 12),
+)
+
+WORDS = ("belge", "ogrenci", "kurs", "bitirme", "sertifika", "transkript", "ders", "not", "kredi",
+         "donem", "fakulte", "bolum", "tarih", "sicil", "kayit", "adres", "numara", "mezuniyet",
+         "program", "basari", "ortalama", "yil", "egitim", "kimlik", "dogum", "yer")
+
+
+def makeBarkod(rng:random.Random) -> str:
+    letters = "ABCDEFGHJKLMNPRSTUVYZ"
+    return "".join(rng.choice(letters) for _ in range(4)) + "".join(rng.choice("0123456789") for _ in range(12))
+
+def makeTckn(rng:random.Random) -> str:
+    return str(rng.randint(1, 9)) + "".join(rng.choice("0123456789") for _ in range(10))
+
+def makeText(rng:random.Random, lines:int = 30) -> list:
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 12))) for _ in range(lines)]
+
+def qrPng(payload:str, scale:int = 8) -> bytes:
+    """OpenCV QR kodlayıcısıyla PNG QR kodu üretir."""
+    code = cv2.QRCodeEncoder.create().encode(payload)
+    code = cv2.resize(code, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+    # Okuyucuların ihtiyaç duyduğu sessiz bölge
+    code = cv2.copyMakeBorder(code, 4 * scale, 4 * scale, 4 * scale, 4 * scale, cv2.BORDER_CONSTANT, value=255)
+    return cv2.imencode(".png", code)[1].tobytes()
+
+def makePdf(pages:list, qr_png:bytes = None) -> bytes:
+    """Her sayfası verilen satırlardan oluşan A4 PDF; qr_png verilirse son sayfanın altına basılır."""
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page(width=595, height=842)
+        page.insert_textbox(fitz.Rect(50, 50, 545, 600), "\n".join(lines), fontsize=9)
+    if qr_png is not None:
+        doc[-1].insert_image(fitz.Rect(420, 660, 540, 780), stream=qr_png)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def pdfToImage(pdf:bytes, dpi:int, angle:float, noise:float, rng:random.Random, ext:str = "png") -> bytes:
+    """PDF'in son sayfasını verilen DPI'da çizer, döndürür ve gürültü ekler."""
+    with fitz.open(stream=pdf, filetype="pdf") as doc:
+        pix = doc[-1].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).copy()
+    if angle == 90:
+        image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    elif angle:
+        h, w = image.shape
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        image = cv2.warpAffine(image, matrix, (w, h), borderValue=255)
+    if noise:
+        noisy = image.astype(np.int16) + np.random.default_rng(rng.randint(0, 2 ** 31)).normal(0, noise, image.shape)
+        image = np.clip(noisy, 0, 255).astype(np.uint8)
+    return cv2.imencode(f".{ext}", image)[1].tobytes()
+
+
+def generate(count:int = 12, seed:int = 1234, images:bool = True) -> list:
+    """
+    count PDF belge üretir (QR biçimleri sırayla dönüşümlü); images ise her PDF için
+    IMAGE_VARIANTS'taki resimlerden biri de eklenir. Document listesi döndürür.
+    """
+    rng = random.Random(seed)
+    formats = list(PAYLOAD_FORMATS.items())
+    documents = []
+    for i in range(count):
+        barkod, tckn = makeBarkod(rng), makeTckn(rng)
+        fmt_name, fmt = formats[i % len(formats)]
+        payload = fmt.format(barkod=barkod, tckn=tckn)
+        pages = [makeText(rng) for _ in range(rng.randint(1, 3))]
+        verified_pdf = makePdf(pages)
+        pdf = makePdf(pages, qrPng(payload))
+        documents.append(Document(f"belge-{i:03d}.pdf", "pdf", fmt_name, barkod, tckn, payload, pdf, verified_pdf))
+        if images:
+            variant, dpi, angle, noise = IMAGE_VARIANTS[i % len(IMAGE_VARIANTS)]
+            ext = "jpg" if i % 2 else "png"
+            image = pdfToImage(pdf, dpi, angle, noise, rng, ext)
+            documents.append(Document(f"belge-{i:03d}-{variant}.{ext}", ext, f"{fmt_name}/{variant}",
+                                      barkod, tckn, payload, image, verified_pdf))
+    return documents
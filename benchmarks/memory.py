@@ -0,0 +1,24 @@
+"""
+Süreçlerin en yüksek bellek kullanımı ölçümü.
+"""
+import os
+import time
+
+
+def peakRss(hold:float = 0.2) -> tuple:
+    """
+    Çalıştığı sürecin (pid, en yüksek bellek kullanımı KB) bilgisini döndürür; havuz workerlarına
+    gönderilerek her worker'ın tepe değeri alınır. hold kadar bekler ki aynı anda gönderilen
+    istekler farklı workerlara dağılsın.
+    Linux'ta ru_maxrss fork/exec'te ana sürecin tepe değerini devraldığı için /proc'taki VmHWM okunur.
+    """
+    time.sleep(hold)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return os.getpid(), int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return os.getpid(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
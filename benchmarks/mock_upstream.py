@@ -0,0 +1,80 @@
+"""
+m.turkiye.gov.tr belge doğrulama api.php'sinin yerel taklidi.
+
+    GET /api.php?p=belge-dogrulama&qr=barkod:<barkod>;tckn:<tckn>
+
+Korpustaki belgeler için gerçek api ile aynı biçimde {"return": true, "data": {"barkodluBelge": ...}}
+döndürür; bilinmeyen barkodlar için {"return": false, "messageArr": [...]}. Gecikme ve 5xx oranı
+ayarlanabilir. EDEVLET_BASE_URL bu sunucunun adresine ayarlanarak kullanılır.
+"""
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class MockUpstream:
+    """
+    documents: {(barkod, tckn): pdf bytes}, latency: her yanıttan önce beklenecek süre (saniye),
+    error_rate: 503 döndürülecek isteklerin oranı.
+    """
+    def __init__(self, documents:dict, latency:float = 0.0, error_rate:float = 0.0, seed:int = 1234):
+        self.documents = {key: base64.b64encode(pdf).decode("ascii") for key, pdf in documents.items()}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def respond(self, query:str):
+        """(durum kodu, json gövdesi) döndürür."""
+        with self.lock:
+            self.requests += 1
+            fail = self.random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return 503, {"return": False, "messageArr": ["Servis geçici olarak kullanılamıyor"]}
+        params = parse_qs(query)
+        qr = params.get("qr", [""])[0]
+        fields = dict(part.split(":", 1) for part in qr.split(";") if ":" in part)
+        pdf = self.documents.get((fields.get("barkod"), fields.get("tckn")))
+        if pdf is None:
+            return 200, {"return": False, "messageArr": ["Belge bulunamadı"]}
+        return 200, {"return": True, "messageArr": [], "data": {"barkodluBelge": pdf}}
+
+    def start(self, host:str = "127.0.0.1", port:int = 0) -> str:
+        """Sunucuyu arka plan thread'inde başlatır ve taban adresini döndürür."""
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/api.php":
+                    self.send_error(404)
+                    return
+                status, body = upstream.respond(url.query)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="mock-edevlet", daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
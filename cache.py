@@ -0,0 +1,300 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import cache_requests_total
+
+
+class TTLCache:
+    """
+    Thread-safe, boyut sınırlı (LRU) ve kayıt başına süreli bellek içi önbellek.
+    max_bytes verilirse kayıtların sizeof(değer) ile ölçülen toplam boyutu da sınırlanır;
+    tek başına sınırı aşan değerler önbelleğe alınmaz.
+    """
+    def __init__(self, maxsize:int = 1024, max_bytes:int = None, sizeof=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self.lock:
+            item = self.data.get(key)
+            if item is None or item[1] <= now:
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl:float):
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self.lock:
+            if key in self.data:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self.data[key] = (value, time.monotonic() + ttl, size)
+            self.bytes += size
+            while len(self.data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._remove(next(iter(self.data)))
+
+    def _remove(self, key):
+        item = self.data.pop(key)
+        self.bytes -= item[2]
+        return item
+
+    def pop(self, key, default=None):
+        with self.lock:
+            item = self._remove(key) if key in self.data else None
+        return default if item is None else item[0]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self) -> dict:
+        stats = {"size": len(self.data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+        if self.max_bytes is not None:
+            stats.update(bytes=self.bytes, max_bytes=self.max_bytes)
+        return stats
+
+
+class SQLiteBackend:
+    """
+    Aynı makinedeki tüm gunicorn workerlarının paylaştığı SQLite dosyası üzerinde anahtar-değer deposu.
+    Değerler (json ile serileştirilebilen meta, bytes) ikilisi olarak saklanır.
+    """
+    def __init__(self, path:str):
+        self.path = path
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        with self.connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                         "key TEXT PRIMARY KEY, meta TEXT, blob BLOB, expires REAL)")
+            # Her yazmadaki süresi dolanları silme sorgusu tabloyu taramasın
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key:str):
+        row = self.connection().execute(
+            "SELECT meta, blob FROM cache WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def set(self, key:str, meta, blob:bytes, ttl:float):
+        if ttl <= 0:
+            return
+        now = time.time()
+        with self.connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, meta, blob, expires) VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(meta), blob, now + ttl))
+            conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+
+    def stats(self) -> dict:
+        return {"path": self.path, "hits": self.hits, "misses": self.misses}
+
+
+class VerificationCache:
+    """
+    (barkod, tckn) anahtarlı doğrulama sonucu önbelleği.
+    Önce süreç içi LRU'ya, o da yoksa varsa paylaşılan SQLite deposuna bakar. Süreç içi LRU
+    kayıt sayısının yanında içindeki PDF'lerin toplam boyutuyla (max_bytes) da sınırlıdır.
+    Geçersiz sonuçlar ayrı ve daha kısa bir süreyle saklanır.
+    Ayarlar verilmezse VERIFY_CACHE_* ortam değişkenlerinden okunur.
+    """
+    def __init__(self, maxsize:int = None, ttl:float = None, negative_ttl:float = None, sqlite_path:str = None,
+                 max_bytes:int = None):
+        env = os.environ.get
+        self.ttl = ttl if ttl is not None else float(env("VERIFY_CACHE_TTL", 3600))
+        self.negative_ttl = negative_ttl if negative_ttl is not None else float(env("VERIFY_CACHE_NEGATIVE_TTL", 60))
+        max_bytes = max_bytes if max_bytes is not None else int(env("VERIFY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        self.memory = TTLCache(maxsize if maxsize is not None else int(env("VERIFY_CACHE_SIZE", 1024)),
+                               max_bytes=max_bytes, sizeof=lambda value: len(value[2] or b""))
+        sqlite_path = sqlite_path if sqlite_path is not None else env("VERIFY_CACHE_SQLITE", "")
+        self.shared = SQLiteBackend(sqlite_path) if sqlite_path else None
+
+    @staticmethod
+    def key(barkod:str, tc) -> str:
+        return f"{barkod}:{tc}"
+
+    def get(self, barkod:str, tc):
+        """
+        Önbellekteki (is_valid, messages, pdf) üçlüsünü ya da yoksa None döndürür.
+        """
+        key = self.key(barkod, tc)
+        value = self.memory.get(key)
+        if value is not None:
+            cache_requests_total.inc(cache="verification", result="hit")
+            return value
+        if self.shared is None:
+            cache_requests_total.inc(cache="verification", result="miss")
+            return None
+        try:
+            row = self.shared.get(key)
+        except sqlite3.Error as e:
+            # Paylaşılan depo hatası doğrulamayı engellememeli, ıskalama say
+            print(f"Önbellek okuma hatası: {e}")
+            row = None
+        if row is None:
+            cache_requests_total.inc(cache="verification", result="miss")
+            return None
+        cache_requests_total.inc(cache="verification_shared", result="hit")
+        meta, pdf = row
+        value = (meta["is_valid"], meta["messages"], pdf)
+        self.memory.set(key, value, self.ttl if value[0] else self.negative_ttl)
+        return value
+
+    def set(self, barkod:str, tc, is_valid:bool, messages, pdf:bytes):
+        key = self.key(barkod, tc)
+        ttl = self.ttl if is_valid else self.negative_ttl
+        self.memory.set(key, (is_valid, messages, pdf), ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, {"is_valid": is_valid, "messages": messages}, pdf, ttl)
+            except sqlite3.Error as e:
+                print(f"Önbellek yazma hatası: {e}")
+
+    def clear(self):
+        self.memory.clear()
+
+    def stats(self) -> dict:
+        stats = {"memory": self.memory.stats(), "ttl": self.ttl, "negative_ttl": self.negative_ttl}
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+
+class DocumentCache:
+    """
+    Yüklenen belgelerin içerik özeti (sha256) anahtarlı disk önbelleği.
+    Her kayıt çözülmüş QR bilgisi, çıkarılmış metin katmanı ve karşılaştırma sonucu gibi
+    alanları tutan küçük bir json dosyasıdır. Toplam boyut max_bytes'ı, kayıt yaşı max_age'i
+    aşınca en eski kullanılanlardan başlayarak silinir.
+    Ayarlar verilmezse DOCUMENT_CACHE_* ortam değişkenlerinden okunur.
+    """
+    def __init__(self, directory:str = None, max_bytes:int = None, max_age:float = None):
+        env = os.environ.get
+        self.directory = directory or env("DOCUMENT_CACHE_DIR", os.path.join("temp_uploads", ".doc_cache"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(env("DOCUMENT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        self.max_age = max_age if max_age is not None else float(env("DOCUMENT_CACHE_MAX_AGE", 24 * 3600))
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.last_evict = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, digest:str) -> str:
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, digest:str) -> dict:
+        """
+        Kaydı döndürür, yoksa ya da süresi dolmuşsa None. Okunan kaydın zamanı güncellenir (LRU).
+        """
+        path = self.path(digest)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            cache_requests_total.inc(cache="document", result="miss")
+            return None
+        self.hits += 1
+        cache_requests_total.inc(cache="document", result="hit")
+        return entry
+
+    def update(self, digest:str, **fields):
+        """
+        Kayda verilen alanları ekler (yoksa kaydı oluşturur).
+        """
+        with self.lock:
+            path = self.path(digest)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = {}
+            entry.update(fields)
+            # Aynı dizini paylaşan workerların thread kimlikleri çakışabilir; geçici ad mkstemp'ten alınır
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f"{digest}.", suffix=".tmp")
+            try:
+                with open(fd, "w", encoding="utf-8") as f:
+                    json.dump(entry, f, ensure_ascii=False)
+                os.replace(tmp, path)
+            except BaseException:
+                self._remove(tmp)
+                raise
+            # Dizini her yazmada taramamak için eviction'ı seyrek çalıştır
+            if time.monotonic() - self.last_evict > 30:
+                self.last_evict = time.monotonic()
+                self.evict()
+
+    def evict(self):
+        """
+        Süresi dolan kayıtları, sonra toplam boyut sınırın altına inene kadar en eski kullanılanları siler.
+        """
+        now = time.time()
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > self.max_age:
+                self._remove(entry.path)
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path:str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        return {"directory": self.directory, "max_bytes": self.max_bytes, "max_age": self.max_age,
+                "hits": self.hits, "misses": self.misses}
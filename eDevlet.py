@@ -1,25 +1,459 @@
+import asyncio
 import base64
+import hashlib
+import os
+import random
+import struct
+import threading
+import time
 import requests
 import json
+from collections import namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from cache import VerificationCache
+from metrics import (stage_seconds, upstream_coalesced_total, upstream_errors_total, upstream_queue_seconds,
+                     upstream_rate_limited_total, upstream_seconds)
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 from qrtest import *
+from qr_payload import parsePayload
 
-base_url = "https://m.turkiye.gov.tr"
+base_url = os.environ.get("EDEVLET_BASE_URL", "https://m.turkiye.gov.tr")
 api = "/api.php"
 p = "?p=belge-dogrulama&"
 
-def getJson(barkod:str,tc) -> dict:
+
+class EDevletError(Exception):
+    """e-Devlet istemcisinin fırlattığı hataların temel sınıfı."""
+
+class UpstreamUnavailable(EDevletError):
+    """e-Devlet servisine ulaşılamadığında (tekrar denemeler tükendi ya da devre kesici açık) fırlatılır."""
+
+class RateLimited(EDevletError):
+    """İstek hız sınırında izin verilen en uzun bekleme süresinden fazla bekleyecekse fırlatılır (HTTP 429)."""
+
+# Sorgu öncelikleri: kullanıcının beklediği istekler ve toplu/arka plan işleri
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+
+class CircuitBreaker:
+    """
+    Art arda threshold kadar başarısız sorgudan sonra cooldown saniye boyunca
+    istekleri hiç göndermeden reddeder; süre dolunca tek bir deneme isteğine izin verir.
+    """
+    def __init__(self, threshold:int = 5, cooldown:float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            # Yarı açık: tek bir deneme isteği geçsin
+            self.trial = True
+            return True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """
+        Sonucu alınamayan (ör. hız sınırı ya da iptal yüzünden gönderilemeyen) deneme isteğini
+        başarı ya da hata saymadan bırakır; yoksa devre yarı açık durumda kilitli kalırdı.
+        """
+        with self.lock:
+            self.trial = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+
+class SingleFlight:
+    """
+    Aynı anahtar için eşzamanlı çağrıları birleştirir: ilk çağıran (lider) işi yapar,
+    o sürerken gelen diğerleri yeni istek atmadan liderin sonucunu (ya da hatasını) paylaşır.
+
+    lock_dir verilirse (EDEVLET_SINGLEFLIGHT_LOCK_DIR) lider, aynı makinedeki diğer workerlarla
+    da anahtar başına bir dosya kilidiyle sıraya girer; böylece kilidi bekleyen worker, paylaşılan
+    önbelleğe (VERIFY_CACHE_SQLITE) yazılmış sonucu kullanabilir.
+    """
+    def __init__(self, lock_dir:str = None, stripes:int = None, lock_timeout:float = None):
+        env = os.environ.get
+        self.lock_dir = lock_dir if lock_dir is not None else env("EDEVLET_SINGLEFLIGHT_LOCK_DIR", "")
+        # Kilit dosyası sayısını sınırlamak için anahtarlar sabit sayıda dosyaya dağıtılır
+        self.stripes = stripes or int(env("EDEVLET_SINGLEFLIGHT_STRIPES", 256))
+        self.lock_timeout = lock_timeout or float(env("EDEVLET_SINGLEFLIGHT_LOCK_TIMEOUT", 30))
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self.calls = {}
+        self.tasks = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, fn):
+        """fn()'i anahtar için tek sefer çalıştırır; eşzamanlı çağıranlar aynı sonucu alır."""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+        if not leader:
+            upstream_coalesced_total.inc(scope="thread")
+            return call.result()
+        try:
+            result = fn()
+            call.set_result(result)
+            return result
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    async def doAsync(self, key, fn):
+        """do()'nun asyncio sürümü; fn bir coroutine döndürür. Tek olay döngüsünde kullanılır."""
+        task = self.tasks.get(key)
+        if task is not None:
+            upstream_coalesced_total.inc(scope="task")
+            return await asyncio.shield(task)
+        task = self.tasks[key] = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda _: self.tasks.pop(key, None))
+        return await asyncio.shield(task)
+
+    @contextmanager
+    def processLock(self, key):
+        """
+        lock_dir ayarlıysa anahtarın dosya kilidini alır (diğer workerlar sorgusunu bitirene kadar bekler).
+        Kilit lock_timeout içinde alınamazsa kilitsiz devam edilir; kilit hiçbir zaman hata sebebi olmaz.
+        Kilidi beklemek zorunda kaldıysa True verir.
+        """
+        if not self.lock_dir or fcntl is None:
+            yield False
+            return
+        stripe = int(hashlib.sha1(repr(key).encode()).hexdigest(), 16) % self.stripes
+        with open(os.path.join(self.lock_dir, f"edevlet-{stripe}.lock"), "a") as f:
+            waited = False
+            deadline = time.monotonic() + self.lock_timeout
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                    break
+                except BlockingIOError:
+                    waited = True
+                    if time.monotonic() >= deadline:
+                        locked = False
+                        break
+                    time.sleep(0.05)
+            try:
+                yield waited
+            finally:
+                if locked:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """
+    e-Devlet'e giden isteklerin önündeki, aynı makinedeki tüm workerların paylaştığı token bucket:
+    saniyede rate istek, en fazla burst anlık. Durum (token sayısı, son güncelleme) path'teki
+    küçük bir dosyada fcntl kilidiyle tutulur; fcntl yoksa ya da path boşsa süreç içinde tutulur.
+
+    Öncelikler:
+    - INTERACTIVE: sıradaki tokenı hemen rezerve eder (token sayısı eksiye düşebilir; bu, tüm
+      workerlar arasında sanal bir FIFO kuyruktur) ve sırası gelene kadar bekler.
+    - BATCH: rezervasyon yapmaz; yalnızca kovada interactive_reserve kadar token bırakabiliyorsa
+      geçer, yoksa bekleyip tekrar dener. Toplu işler böylece interaktif kuyruğu hiç uzatmaz,
+      yalnızca boşta kalan kapasiteyi kullanır.
+
+    Bekleme, önceliğin en uzun bekleme süresini (max_wait) aşacaksa istek beklemeden RateLimited ile
+    reddedilir. rate 0 ise sınırlama yapılmaz. Ayarlar verilmezse EDEVLET_RATE* ortam değişkenlerinden okunur.
+    """
+    def __init__(self, rate:float = None, burst:float = None, interactive_reserve:float = None, path:str = None,
+                 max_wait:float = None, batch_max_wait:float = None):
+        env = os.environ.get
+        self.rate = rate if rate is not None else float(env("EDEVLET_RATE", 10))
+        self.burst = burst or float(env("EDEVLET_RATE_BURST", max(self.rate * 2, 1)))
+        interactive_reserve = interactive_reserve if interactive_reserve is not None else \
+            float(env("EDEVLET_RATE_INTERACTIVE_RESERVE", self.burst / 4))
+        # Kova en fazla burst token tutar; toplu istekler 1 + rezerv token beklediği için rezerv
+        # burst - 1'i aşarsa toplu istekler hiç geçemezdi
+        self.interactive_reserve = min(interactive_reserve, max(self.burst - 1, 0))
+        self.path = path if path is not None else env("EDEVLET_RATE_STATE", os.path.join("temp_uploads", "edevlet-rate"))
+        self.max_wait = {
+            INTERACTIVE: max_wait if max_wait is not None else float(env("EDEVLET_QUEUE_MAX_WAIT", 10)),
+            BATCH: batch_max_wait if batch_max_wait is not None else float(env("EDEVLET_BATCH_QUEUE_MAX_WAIT", 120)),
+        }
+        if self.rate > 0 and self.path and fcntl is not None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.state = None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def bucket(self):
+        """Kova durumunu kilitleyip [tokens, zaman] listesi olarak verir; blok sonunda geri yazılır."""
+        with self.lock:
+            if not self.path or fcntl is None:
+                if self.state is None:
+                    self.state = [self.burst, time.time()]
+                yield self.state
+                return
+            # Kilit her seferinde yeni açılan dosyada alınır; fork'la paylaşılan tanımlayıcıda flock süreçleri ayırmaz
+            with open(self.path, "a+b") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    data = f.read(16)
+                    state = list(struct.unpack("dd", data)) if len(data) == 16 else [self.burst, time.time()]
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(struct.pack("dd", *state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def reserve(self, priority:str, max_wait:float) -> tuple:
+        """
+        Token almayı dener; karar kova kilidi altında verilir. (alındı mı, beklenecek süre) döndürür:
+        alındıysa sırası gelene kadar beklenecek süre, alınamadıysa tokenın ne zaman alınabileceği
+        tahmini. Interaktif istek max_wait'ten uzun bekleyecekse token harcanmadan reddedilir.
+        """
+        with self.bucket() as state:
+            now = time.time()
+            tokens = min(self.burst, state[0] + max(now - state[1], 0) * self.rate)
+            state[0], state[1] = tokens, now
+            if priority == BATCH:
+                needed = 1 + self.interactive_reserve
+                if tokens >= needed:
+                    state[0] = tokens - 1
+                    return True, 0.0
+                return False, (needed - tokens) / self.rate
+            delay = max(1 - tokens, 0) / self.rate
+            if delay > max_wait:
+                return False, delay
+            state[0] = tokens - 1
+            return True, delay
+
+    def _reject(self, priority:str):
+        upstream_rate_limited_total.inc(priority=priority)
+        raise RateLimited("e-Devlet sorgu kotası dolu, lütfen daha sonra tekrar deneyin.")
+
+    def acquire(self, priority:str = INTERACTIVE):
+        """Sırası gelene kadar bekler; bekleme max_wait'i aşacaksa RateLimited fırlatır."""
+        if self.rate <= 0:
+            return
+        start = time.monotonic()
+        deadline = start + self.max_wait[priority]
+        while True:
+            remaining = deadline - time.monotonic()
+            granted, delay = self.reserve(priority, max(remaining, 0))
+            if granted:
+                # Token rezerve edildi; bekleme reserve() içinde max_wait'e göre zaten denetlendi
+                if delay > 0:
+                    time.sleep(delay)
+                upstream_queue_seconds.observe(time.monotonic() - start, priority=priority)
+                return
+            if delay > remaining:
+                self._reject(priority)
+            time.sleep(max(delay, 0.01))
+
+    async def acquireAsync(self, priority:str = INTERACTIVE):
+        """acquire()'ın asyncio sürümü; beklerken olay döngüsünü bloklamaz. Kova dosyasının kilidi
+        başka bir süreç tarafından tutulabileceği için reserve() thread'de çağrılır."""
+        if self.rate <= 0:
+            return
+        start = time.monotonic()
+        deadline = start + self.max_wait[priority]
+        while True:
+            remaining = deadline - time.monotonic()
+            granted, delay = await asyncio.to_thread(self.reserve, priority, max(remaining, 0))
+            if granted:
+                # Token rezerve edildi; bekleme reserve() içinde max_wait'e göre zaten denetlendi
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                upstream_queue_seconds.observe(time.monotonic() - start, priority=priority)
+                return
+            if delay > remaining:
+                self._reject(priority)
+            await asyncio.sleep(max(delay, 0.01))
+
+
+def backoffDelay(attempt:int, base:float, maximum:float) -> float:
+    """
+    attempt. tekrar denemeden önce beklenecek süre (üstel artış, tam rastgele jitter).
+    """
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+class EDevletClient:
+    """
+    m.turkiye.gov.tr belge doğrulama apisi için kalıcı bağlantı havuzlu istemci.
+    Bağlantı/okuma zaman aşımları, 5xx ve bağlantı hatalarında jitter'lı üstel geri çekilmeyle
+    tekrar deneme, servis çöktüğünde hızlı hata veren bir devre kesici ve her isteği (tekrar
+    denemeler dahil) workerlar arası paylaşılan hız sınırından geçiren bir RateLimiter içerir.
+    Ayarlar verilmezse EDEVLET_* ortam değişkenlerinden okunur.
+    """
+    def __init__(self, base_url:str = None, pool_size:int = None, connect_timeout:float = None,
+                 read_timeout:float = None, retries:int = None, backoff:float = None,
+                 backoff_max:float = None, breaker:CircuitBreaker = None, limiter:RateLimiter = None):
+        env = os.environ.get
+        # Verilmezse modüldeki base_url kullanılır
+        self.base_url = base_url
+        # Havuz boyutu gunicorn --threads değeriyle aynı tutulmalı
+        self.pool_size = pool_size or int(env("EDEVLET_POOL_SIZE", 8))
+        self.connect_timeout = connect_timeout or float(env("EDEVLET_CONNECT_TIMEOUT", 5))
+        self.read_timeout = read_timeout or float(env("EDEVLET_READ_TIMEOUT", 20))
+        self.retries = retries if retries is not None else int(env("EDEVLET_RETRIES", 2))
+        self.backoff = backoff if backoff is not None else float(env("EDEVLET_BACKOFF", 0.5))
+        self.backoff_max = backoff_max if backoff_max is not None else float(env("EDEVLET_BACKOFF_MAX", 5))
+        self.breaker = breaker or CircuitBreaker(int(env("EDEVLET_BREAKER_THRESHOLD", 5)),
+                                                 float(env("EDEVLET_BREAKER_COOLDOWN", 30)))
+        self.limiter = limiter or RateLimiter()
+        self.session = self.createSession()
+
+    def createSession(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def url(self, barkod:str, tc) -> str:
+        qr = f"qr=barkod:{barkod};tckn:{tc}"
+        return (self.base_url or base_url) + api + p + qr
+
+    def getJson(self, barkod:str, tc, priority:str = INTERACTIVE) -> dict:
+        """
+        Barkod numarası ve tckimlik ile apiden dönen jsonu çeker.
+        """
+        if not self.breaker.allow():
+            upstream_errors_total.inc(reason="breaker_open")
+            raise UpstreamUnavailable("e-Devlet servisine şu an ulaşılamıyor, lütfen daha sonra tekrar deneyin.")
+        # Devre açıkken geçen istek yarı açık durumun tek deneme isteğidir
+        trial = self.breaker.is_open
+        req = self.url(barkod, tc)
+        last_error = None
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(backoffDelay(attempt - 1, self.backoff, self.backoff_max))
+                self.limiter.acquire(priority)
+                start = time.perf_counter()
+                try:
+                    r = self.session.get(req, timeout=(self.connect_timeout, self.read_timeout))
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self.observeFailure(start, "timeout" if isinstance(e, requests.Timeout) else "connection")
+                    last_error = e
+                    continue
+                upstream_seconds.observe(time.perf_counter() - start, status=r.status_code)
+                if r.status_code >= 500:
+                    upstream_errors_total.inc(reason="http_5xx")
+                    last_error = f"HTTP {r.status_code}"
+                    continue
+                self.breaker.success()
+                return r.json()
+            self.breaker.failure()
+            raise UpstreamUnavailable(f"e-Devlet servisine ulaşılamadı: {last_error}")
+        except BaseException:
+            if trial:
+                self.breaker.release()
+            raise
+
+    @staticmethod
+    def observeFailure(start:float, reason:str):
+        """Yanıt alınamayan denemenin süresini ve hata nedenini metriklere yazar."""
+        upstream_seconds.observe(time.perf_counter() - start, status="error")
+        upstream_errors_total.inc(reason=reason)
+
+
+class AsyncEDevletClient(EDevletClient):
+    """
+    EDevletClient'ın asyncio sürümü. httpx.AsyncClient ile aynı zaman aşımı, tekrar deneme ve
+    devre kesici davranışını uygular; tek süreçte yüzlerce bekleyen sorguyu taşıyabilir.
+    Eşzamanlı bağlantı sayısı EDEVLET_ASYNC_MAX_CONNECTIONS ile sınırlanır, fazlası havuzda bekler.
+    """
+    def __init__(self, *args, max_connections:int = None, **kwargs):
+        self.max_connections = max_connections or int(os.environ.get("EDEVLET_ASYNC_MAX_CONNECTIONS", 100))
+        super().__init__(*args, **kwargs)
+
+    def createSession(self):
+        import httpx
+        timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout, pool=None)
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.pool_size)
+        return httpx.AsyncClient(timeout=timeout, limits=limits)
+
+    async def getJson(self, barkod:str, tc, priority:str = INTERACTIVE) -> dict:
+        """
+        Barkod numarası ve tckimlik ile apiden dönen jsonu çeker.
+        """
+        import httpx
+        if not self.breaker.allow():
+            upstream_errors_total.inc(reason="breaker_open")
+            raise UpstreamUnavailable("e-Devlet servisine şu an ulaşılamıyor, lütfen daha sonra tekrar deneyin.")
+        # Devre açıkken geçen istek yarı açık durumun tek deneme isteğidir
+        trial = self.breaker.is_open
+        req = self.url(barkod, tc)
+        last_error = None
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    await asyncio.sleep(backoffDelay(attempt - 1, self.backoff, self.backoff_max))
+                await self.limiter.acquireAsync(priority)
+                start = time.perf_counter()
+                try:
+                    r = await self.session.get(req)
+                except httpx.TransportError as e:
+                    self.observeFailure(start, "timeout" if isinstance(e, httpx.TimeoutException) else "connection")
+                    last_error = e
+                    continue
+                upstream_seconds.observe(time.perf_counter() - start, status=r.status_code)
+                if r.status_code >= 500:
+                    upstream_errors_total.inc(reason="http_5xx")
+                    last_error = f"HTTP {r.status_code}"
+                    continue
+                self.breaker.success()
+                return r.json()
+            self.breaker.failure()
+            raise UpstreamUnavailable(f"e-Devlet servisine ulaşılamadı: {last_error}")
+        except BaseException:
+            if trial:
+                self.breaker.release()
+            raise
+
+    async def aclose(self):
+        await self.session.aclose()
+
+
+client = EDevletClient()
+
+def getJson(barkod:str,tc,priority:str = INTERACTIVE) -> dict:
     """
     Barkod numarası ve tckimlik ile apiden dönen jsonu çeker.
     """
-    global base_url
-    global api
-    global p
-    qr = f"qr=barkod:{barkod};tckn:{tc}"
-    req = base_url + api + p + qr
     print("Json alınıyor")
-    #print(req)
-    r = requests.get(req)
-    return r.json()
+    return client.getJson(barkod,tc,priority)
 
 def checkValid(barkod:str,tc) -> bool:
     """
@@ -31,6 +465,66 @@ def checkValid(barkod:str,tc) -> bool:
         return False
     return True
 
+# Tek e-Devlet sorgusunun sonucu: geçerlilik, api mesajları ve doğrulanmış belgenin pdf içeriği (geçersizse None)
+VerifyResult = namedtuple("VerifyResult", "is_valid messages pdf")
+
+verify_cache = VerificationCache()
+single_flight = SingleFlight()
+
+def verifyBarkod(barkod:str,tc,priority:str = INTERACTIVE) -> VerifyResult:
+    """
+    Barkod numarası ve tckimlik ile apiye tek istek atar; geçerliliği, mesajları ve
+    belge geçerliyse barkodluBelge alanından çözülmüş pdf bytes'ını döndürür.
+    Sonuç verify_cache'te varsa apiye gidilmez. priority, toplu işler için BATCH verilir.
+    """
+    cached = verify_cache.get(barkod,tc)
+    if cached is not None:
+        return VerifyResult(*cached)
+    # Aynı belge için eşzamanlı sorgular tek istekte birleştirilir
+    return single_flight.do((barkod, str(tc)), lambda: fetchVerifyResult(barkod, tc, priority))
+
+def fetchVerifyResult(barkod:str,tc,priority:str = INTERACTIVE) -> VerifyResult:
+    """
+    Single-flight liderinin yaptığı sorgu: gerekiyorsa diğer workerlarla sıraya girer,
+    apiden sonucu alıp önbelleğe yazar.
+    """
+    with single_flight.processLock((barkod, str(tc))) as waited:
+        if waited:
+            # Kilidi beklerken başka bir worker sorguyu yapıp paylaşılan önbelleğe yazmış olabilir
+            cached = verify_cache.get(barkod,tc)
+            if cached is not None:
+                upstream_coalesced_total.inc(scope="process")
+                return VerifyResult(*cached)
+        result = verifyResultFromJson(getJson(barkod,tc,priority))
+        verify_cache.set(barkod, tc, *result)
+        return result
+
+async def verifyBarkodAsync(barkod:str,tc,async_client:AsyncEDevletClient,priority:str = INTERACTIVE) -> VerifyResult:
+    """
+    verifyBarkod'un asyncio sürümü; sorguyu verilen AsyncEDevletClient ile yapar.
+    Paylaşılan önbellek SQLite'ta olabileceği için önbellek okuma/yazma thread'de yapılır.
+    """
+    cached = await asyncio.to_thread(verify_cache.get, barkod, tc)
+    if cached is not None:
+        return VerifyResult(*cached)
+
+    async def fetch():
+        result = verifyResultFromJson(await async_client.getJson(barkod,tc,priority))
+        await asyncio.to_thread(verify_cache.set, barkod, tc, *result)
+        return result
+    return await single_flight.doAsync((barkod, str(tc)), fetch)
+
+def verifyResultFromJson(bilgi:dict) -> VerifyResult:
+    """
+    Api jsonunu VerifyResult'a çevirir; belge geçerliyse barkodluBelge bir kez çözülür.
+    """
+    messages = bilgi.get('messageArr') or []
+    if not checkValidJson(bilgi):
+        return VerifyResult(False, messages, None)
+    with stage_seconds.time(stage="pdf_base64"):
+        pdf = base64.b64decode(bilgi['data']['barkodluBelge'])
+    return VerifyResult(True, messages, pdf)
+
 def checkValidJson(json:dict) -> bool:
     """
     Json ile belgenin geçerli olup olmadığını kontrol eder.
@@ -67,44 +561,10 @@ def getFileBarkod(barkod:str,tc,filename:str = "out"):
 def parseQRdata(qrData:str) -> dict:
     """
     qrtest.readQR()'den okunmuş qr bilgisini {'barkod':barkod,'tckn':tckn} olarak returnler.
+    Ayrıştırma qr_payload modülündedir; içerik okunamazsa ya da yalnızca barkod içeriyorsa
+    (askerlik belgesi gibi) qr_payload.QRParseError fırlatır.
     """
-    if qrData == "null":
-        raise Exception("QR okunamadı.")
-    
-    # QR data'yı temizle (bytes string'den normal string'e çevir)
-    if qrData.startswith("b'") and qrData.endswith("'"):
-        qrData = qrData[2:-1]  # b'...' formatından temizle
-    
-    # Eğer barkodlubelgedogrulama:// prefix'i varsa (sicil belgesi gibi)
-    if "barkodlubelgedogrulama://" in qrData:
-        qrData = qrData.replace("barkodlubelgedogrulama://", "")
-    
-    # URL kısmını temizle (transkript belgesi gibi)
-    if "https://" in qrData:
-        qrData = qrData.split("https://")[0].rstrip(";")
-    
-    # Eğer barkod: ve tckn: formatında ise
-    if "barkod:" in qrData and "tckn:" in qrData:
-        f1 = qrData.index("barkod:") + len("barkod:")
-        f2 = qrData.index(";")
-        barkod = qrData[f1:f2]
-        f1 = qrData.index("tckn:") + len("tckn:")
-        # Son noktalı virgülü bul, yoksa string sonuna kadar al
-        f2 = qrData.find(";",f1)
-        if f2 == -1:
-            tckn = qrData[f1:]
-        else:
-            tckn = qrData[f1:f2]
-        return {
-            "barkod": barkod,
-            "tckn": tckn
-        }
-    # Eğer sadece barkod numarası ise (askerlik belgesi gibi)
-    else:
-        # TC kimlik numarası kullanıcıdan istenecek
-        barkod = qrData.strip()
-        # API için input() yerine exception fırlat
-        raise Exception(f"Barkod '{barkod}' için TC kimlik numarası gerekiyor. Bu belge türü için TC kimlik numarası ayrıca gönderilmelidir.")
+    return parsePayload(qrData).asDict()
 
 def getQRdata(file:str = "belge.pdf") -> dict:
     """
@@ -116,4 +576,16 @@ def getQRdataImg(file:str = "img.jpg") -> dict:
     """
     Girilen resim dosyasında qr kodunu arar ve bulursa {'barkod':barkod,'tckn':tckn} olarak returnler.
     """
-    return parseQRdata(readQRImg(file))
\ No newline at end of file
+    return parseQRdata(readQRImg(file))
+
+def getQRdataByType(file, file_ext:str) -> dict:
+    """
+    Dosya uzantısına göre PDF ya da resim içinden qr kodunu okur ve {'barkod':barkod,'tckn':tckn} olarak returnler.
+    file dosya yolu, dosyanın bytes içeriği ya da (PDF için) açık bir fitz.Document olabilir.
+    """
+    file_ext = file_ext.lower()
+    if file_ext == 'pdf':
+        return getQRdata(file)
+    if file_ext in ['png', 'jpg', 'jpeg']:
+        return getQRdataImg(file)
+    raise Exception("Desteklenmeyen dosya formatı")
@@ -0,0 +1,25 @@
+# gunicorn bu dosyayı çalışma dizininden otomatik okur; komut satırı argümanları önceliklidir.
+import os
+
+# OCR_PRELOAD=1 iken uygulama ve EasyOCR modeli master süreçte bir kez yüklenir,
+# fork edilen workerlar modeli copy-on-write olarak paylaşır (CPU_WORKERS=0 ile OCR'ın
+# worker içinde çalıştığı kurulumlarda anlamlıdır).
+preload_app = os.environ.get("OCR_PRELOAD", "0") == "1"
+
+
+def on_starting(server):
+    if preload_app:
+        from ocr_comparison import prewarm_reader
+        prewarm_reader()
+
+
+def post_fork(server, worker):
+    # İşlem havuzu uygulama içe aktarılırken değil, her worker'da fork sonrası açılır
+    if os.environ.get("CPU_PREWARM", "1") == "1":
+        from worker_pool import cpu_pool
+        cpu_pool.prewarm()
+    # Arka plan thread'leri yalnızca workerlarda çalışır; iş kuyruğu bekleyen işleri hemen almaya başlar
+    from app import job_queue, upload_store, verified_store
+    job_queue.start()
+    upload_store.start()
+    verified_store.start()
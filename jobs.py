@@ -0,0 +1,335 @@
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+import requests
+
+
+class QueueFull(Exception):
+    """Bekleyen iş sayısı sınıra ulaştığında fırlatılır (HTTP 503)."""
+
+class InvalidCallback(ValueError):
+    """callback_url geçersiz ya da izin verilmeyen bir adresse fırlatılır (HTTP 400)."""
+
+
+class JobQueue:
+    """
+    SQLite dosyasında kalıcı iş kuyruğu ve onu işleyen worker thread'leri.
+    İş gövdesi (ör. yüklenen belge) ve parametreleri kuyruğa yazılır, istek hemen iş kimliğiyle döner;
+    sonuç aynı tabloda saklanır ve /jobs/<id> ile sorgulanır, istenirse callback_url'e POST edilir.
+    Başarısız geri çağrılar worker thread'inde beklenmeden kuyruğa geri yazılır ve zamanı gelince
+    tekrar denenir.
+    Aynı dosyayı kullanan tüm gunicorn workerları kuyruğu paylaşır. Çalışan işin kirası (lease) ayrı bir
+    thread'de job_timeout/4'te bir yenilenir; süreç çökerse kirası job_timeout boyunca yenilenmeyen iş
+    yeniden kuyruğa alınır. Uzun süren bir iş böylece ikinci kez alınmaz; kirasını kaybeden bir çalışmanın
+    sonucu da yazılmaz.
+
+    - handler: handler(payload, params) -> sonuç sözlüğü; hata fırlatırsa iş "failed" olur
+    - workers: iş işleyen thread sayısı
+    - max_queued: en fazla bekleyen iş sayısı; dolunca QueueFull
+    - max_queued_bytes: bekleyen ve çalışan işlerin gövdelerinin toplam boyutu; dolunca QueueFull
+    - result_ttl: bitmiş işlerin saklanma süresi (saniye)
+
+    Ayarlar verilmezse JOBS_* ortam değişkenlerinden okunur.
+    """
+    def __init__(self, handler, path:str = None, workers:int = None, max_queued:int = None,
+                 result_ttl:float = None, job_timeout:float = None, poll_interval:float = None,
+                 max_queued_bytes:int = None):
+        env = os.environ.get
+        self.handler = handler
+        self.path = path or env("JOBS_DB", os.path.join("temp_uploads", "jobs.sqlite3"))
+        self.workers = workers if workers is not None else int(env("JOBS_WORKERS", 2))
+        self.max_queued = max_queued or int(env("JOBS_MAX_QUEUED", 1000))
+        self.max_queued_bytes = max_queued_bytes or int(env("JOBS_MAX_QUEUED_BYTES", 256 * 1024 * 1024))
+        self.result_ttl = result_ttl if result_ttl is not None else float(env("JOBS_RESULT_TTL", 3600))
+        self.job_timeout = job_timeout or float(env("JOBS_TIMEOUT", 600))
+        self.poll_interval = poll_interval or float(env("JOBS_POLL_INTERVAL", 1))
+        self.callback_timeout = float(env("JOBS_CALLBACK_TIMEOUT", 10))
+        self.callback_retries = int(env("JOBS_CALLBACK_RETRIES", 3))
+        # Boşsa yalnızca herkese açık (global) adreslere geri çağrı yapılabilir
+        self.callback_hosts = {h.strip() for h in env("JOBS_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()}
+        # İç ağdaki alıcılar için açıkça izin verilmeli (SSRF)
+        self.callback_private = env("JOBS_CALLBACK_ALLOW_PRIVATE", "0") == "1"
+        self.local = threading.local()
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.heartbeat_thread = None
+        # Bu süreçte çalışan işler: iş kimliği -> kira sahibi
+        self.leases = {}
+        self.stopping = False
+        self.halt = threading.Event()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self.connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                         "id TEXT PRIMARY KEY, status TEXT, params TEXT, payload BLOB, result TEXT, "
+                         "error TEXT, callback_url TEXT, created REAL, started REAL, finished REAL, "
+                         "callback_attempts INTEGER DEFAULT 0, callback_next REAL, "
+                         "owner TEXT, heartbeat REAL, payload_size INTEGER DEFAULT 0)")
+            self.migrate(conn, {"callback_attempts": "INTEGER DEFAULT 0", "callback_next": "REAL",
+                                "owner": "TEXT", "heartbeat": "REAL", "payload_size": "INTEGER DEFAULT 0"})
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_callback ON jobs (callback_next)")
+
+    @staticmethod
+    def migrate(conn, columns:dict):
+        """Eski sürümün oluşturduğu tabloya eksik sütunları ekler."""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for name, decl in columns.items():
+            if name in existing:
+                continue
+            try:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+            except sqlite3.OperationalError as e:
+                # Aynı anda açılan başka bir worker eklemiş olabilir
+                if "duplicate column" not in str(e):
+                    raise
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def start(self):
+        """Worker ve kira yenileme thread'lerini (çalışmıyorlarsa) başlatır; fork sonrası tekrar çağrılabilir."""
+        with self.lock:
+            self.threads = [t for t in self.threads if t.is_alive()]
+            for i in range(len(self.threads), self.workers):
+                thread = threading.Thread(target=self.run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            if self.workers > 0 and (self.heartbeat_thread is None or not self.heartbeat_thread.is_alive()):
+                # Fork'tan önce alınan kiralar bu sürece ait değildir
+                self.leases.clear()
+                self.heartbeat_thread = threading.Thread(target=self.heartbeat, name="job-heartbeat", daemon=True)
+                self.heartbeat_thread.start()
+
+    def stop(self):
+        self.stopping = True
+        self.halt.set()
+        self.wakeup.set()
+
+    def heartbeat(self):
+        while not self.halt.wait(self.job_timeout / 4):
+            try:
+                self.renew()
+            except sqlite3.Error as e:
+                print(f"İş kirası yenileme hatası: {e}")
+
+    def renew(self):
+        """Bu süreçte çalışan işlerin kiralarını yeniler."""
+        with self.lock:
+            leases = list(self.leases.items())
+        now = time.time()
+        conn = self.connection()
+        for job_id, owner in leases:
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                         (now, job_id, owner))
+
+    def checkCallback(self, callback_url:str):
+        """
+        callback_url'in geri çağrıya uygun olduğunu denetler. İzin listesi yoksa sunucunun kendisine
+        ya da iç ağa istek attırılmasın (SSRF) diye ad çözümlenir; loopback, özel, link-local (ör. bulut
+        metadata servisi) ve ayrılmış adreslere çözümlenen adresler JOBS_CALLBACK_ALLOW_PRIVATE=1
+        olmadıkça reddedilir.
+        """
+        if not callback_url:
+            return
+        url = urlparse(callback_url)
+        try:
+            port = url.port or (443 if url.scheme == "https" else 80)
+        except ValueError:
+            raise InvalidCallback("callback_url geçersiz port içeriyor")
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise InvalidCallback("callback_url http ya da https adresi olmalı")
+        if self.callback_hosts:
+            if url.hostname not in self.callback_hosts:
+                raise InvalidCallback("callback_url adresine izin verilmiyor")
+            return
+        if self.callback_private:
+            return
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(url.hostname, port, proto=socket.IPPROTO_TCP)}
+        except (socket.gaierror, UnicodeError):
+            raise InvalidCallback("callback_url adresi çözümlenemedi")
+        for address in addresses:
+            ip = ipaddress.ip_address(address.split("%")[0])
+            if not ip.is_global or ip.is_multicast:
+                raise InvalidCallback("callback_url iç ağ adreslerine yönlendirilemez")
+
+    def submit(self, payload:bytes, params:dict, callback_url:str = None) -> str:
+        """İşi kuyruğa yazar ve iş kimliğini döndürür."""
+        self.checkCallback(callback_url)
+        job_id = uuid.uuid4().hex
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            queued, queued_bytes = conn.execute(
+                "SELECT COALESCE(SUM(status = 'queued'), 0), COALESCE(SUM(payload_size), 0) FROM jobs "
+                "WHERE status IN ('queued', 'running')").fetchone()
+            if queued >= self.max_queued or queued_bytes + len(payload) > self.max_queued_bytes:
+                raise QueueFull("İş kuyruğu dolu, lütfen daha sonra tekrar deneyin.")
+            conn.execute("INSERT INTO jobs (id, status, params, payload, payload_size, callback_url, created) "
+                         "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                         (job_id, json.dumps(params, ensure_ascii=False), payload, len(payload), callback_url,
+                          time.time()))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.start()
+        self.wakeup.set()
+        return job_id
+
+    def get(self, job_id:str) -> dict:
+        """İşin durumunu ve bittiyse sonucunu döndürür; iş yoksa None."""
+        row = self.connection().execute(
+            "SELECT status, result, error, created, started, finished FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        status, result, error, created, started, finished = row
+        job = {"job_id": job_id, "status": status, "created_at": created, "started_at": started,
+               "finished_at": finished}
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = error
+        return job
+
+    def claim(self):
+        """
+        Sıradaki işi "running" olarak işaretleyip (id, params, payload, callback_url, kira sahibi)
+        döndürür; iş yoksa None.
+        """
+        conn = self.connection()
+        now = time.time()
+        owner = uuid.uuid4().hex
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Çöken bir süreçte yarıda kalan (kirası yenilenmeyen) işleri yeniden kuyruğa al
+            conn.execute("UPDATE jobs SET status = 'queued', started = NULL, owner = NULL "
+                         "WHERE status = 'running' AND COALESCE(heartbeat, started) < ?", (now - self.job_timeout,))
+            row = conn.execute("SELECT id, params, payload, callback_url FROM jobs WHERE status = 'queued' "
+                               "ORDER BY created LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', started = ?, heartbeat = ?, owner = ? WHERE id = ?",
+                             (now, now, owner, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else (*row, owner)
+
+    def finish(self, job_id:str, result:dict = None, error:str = None, owner:str = None) -> bool:
+        """
+        İşin sonucunu yazar. owner verilirse iş hâlâ bu kiradaysa yazılır; kira kaybedildiyse (iş yeniden
+        kuyruğa alınıp başka bir çalışmaya verildiyse) sonuç atılır ve False döner.
+        """
+        now = time.time()
+        conn = self.connection()
+        # Belge gövdesi artık gerekmez; sonucu yaz, geri çağrıyı sıraya al ve süresi dolan eski işleri temizle
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, payload_size = 0, finished = ?, "
+            "callback_next = CASE WHEN callback_url IS NOT NULL THEN ? END "
+            "WHERE id = ? AND (? IS NULL OR (owner = ? AND status = 'running'))",
+            ("failed" if error is not None else "done",
+             json.dumps(result, ensure_ascii=False) if result is not None else None,
+             error, now, now, job_id, owner, owner))
+        conn.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (now - self.result_ttl,))
+        return cursor.rowcount > 0
+
+    def claimCallback(self):
+        """
+        Zamanı gelmiş bir geri çağrıyı alır ve (id, callback_url, deneme sayısı) döndürür; yoksa None.
+        Gönderim sürerken başka bir thread almasın diye bir sonraki deneme zamanı ileri alınır.
+        """
+        conn = self.connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id, callback_url, callback_attempts FROM jobs "
+                               "WHERE callback_next IS NOT NULL AND callback_next <= ? "
+                               "ORDER BY callback_next LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET callback_next = ? WHERE id = ?",
+                             (now + self.callback_timeout * 2, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def run(self):
+        while not self.stopping:
+            try:
+                callback = self.claimCallback()
+                job = self.claim() if callback is None else None
+            except sqlite3.Error as e:
+                print(f"İş kuyruğu okuma hatası: {e}")
+                callback = job = None
+            if callback is not None:
+                self.deliver(*callback)
+                continue
+            if job is None:
+                # Bu süreçte yeni iş gelince hemen, başka süreçlerin işleri için poll_interval'da bir uyan
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            job_id, params, payload, _, owner = job
+            with self.lock:
+                self.leases[job_id] = owner
+            try:
+                result, error = self.handler(payload, json.loads(params)), None
+            except Exception as e:
+                result, error = None, str(e)
+            finally:
+                with self.lock:
+                    self.leases.pop(job_id, None)
+            try:
+                if not self.finish(job_id, result, error, owner):
+                    print(f"İş {job_id} kirası kaybedildi, sonuç yazılmadı")
+            except sqlite3.Error as e:
+                print(f"İş sonucu yazma hatası: {e}")
+
+    def deliver(self, job_id:str, callback_url:str, attempts:int):
+        """Geri çağrıyı bir kez dener; başarısızsa üstel artan bir süre sonrasına yeniden sıraya koyar."""
+        attempts = (attempts or 0) + 1
+        delivered = self.notify(callback_url, self.get(job_id))
+        retry_at = None if delivered or attempts >= self.callback_retries else time.time() + 2 ** attempts
+        try:
+            self.connection().execute("UPDATE jobs SET callback_attempts = ?, callback_next = ? WHERE id = ?",
+                                      (attempts, retry_at, job_id))
+        except sqlite3.Error as e:
+            print(f"Geri çağrı durumu yazma hatası: {e}")
+
+    def notify(self, callback_url:str, job:dict) -> bool:
+        """
+        İş sonucunu callback_url'e json olarak POST eder; hata işin sonucunu etkilemez.
+        Tekrar denemenin anlamı yoksa (gönderildi, 4xx ya da adrese artık izin verilmiyor) True döndürür.
+        """
+        try:
+            # Ad, kuyruğa yazıldıktan sonra iç ağa çözümlenecek biçimde değiştirilmiş olabilir
+            self.checkCallback(callback_url)
+        except InvalidCallback as e:
+            print(f"Geri çağrı gönderilmedi ({callback_url}): {e}")
+            return True
+        try:
+            r = requests.post(callback_url, json=job, timeout=self.callback_timeout, allow_redirects=False)
+            return r.status_code < 500
+        except requests.RequestException as e:
+            print(f"Geri çağrı hatası ({callback_url}): {e}")
+            return False
+
+    def stats(self) -> dict:
+        rows = self.connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"path": self.path, "workers": self.workers, "jobs": dict(rows)}
@@ -0,0 +1,183 @@
+"""
+Prometheus metin formatında sayaçlar ve histogramlar.
+
+Her süreç kendi değerlerini tutar. İşlem havuzu workerlarında ölçülen değerler (PDF çizimi,
+pyzbar, OpenCV) kaydedilmek yerine biriktirilir ve işin sonucuyla birlikte ana sürece
+gönderilip orada tekrar uygulanır; böylece /metrics tüm aşamaları gösterir.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Saniye cinsinden varsayılan histogram sınırları
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_lock = threading.Lock()
+_metrics = {}
+# Worker süreçlerinde None yerine liste olur; gözlemler (metrik adı, etiketler, değer) olarak biriktirilir
+_buffer = None
+_INF = 'le="+Inf"'
+
+
+def _labelKey(labelnames, labels:dict) -> tuple:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Beklenen etiketler: {', '.join(labelnames)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _formatLabels(labelnames, key, extra:str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value:str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _formatValue(value:float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """
+    Yalnızca artan sayaç; etiket değerlerinin her birleşimi ayrı seri olarak tutulur.
+    """
+    type = "counter"
+
+    def __init__(self, name:str, documentation:str, labelnames:tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        _register(self)
+
+    def inc(self, amount:float = 1, **labels):
+        if _buffer is not None:
+            _buffer.append((self.name, labels, amount))
+            return
+        key = _labelKey(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{_formatLabels(self.labelnames, key)} {_formatValue(value)}"
+
+
+class Histogram:
+    """
+    Gözlemleri sabit sınırlı kovalara dağıtan histogram (_bucket, _sum, _count serileri).
+    """
+    type = "histogram"
+
+    def __init__(self, name:str, documentation:str, labelnames:tuple = (), buckets:tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        self.lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value:float, **labels):
+        if _buffer is not None:
+            _buffer.append((self.name, labels, value))
+            return
+        key = _labelKey(self.labelnames, labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                # [kova sayıları..., toplam, adet]
+                series = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Blok süresini saniye olarak gözlemler (blok hata fırlatsa da)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(series)) for key, series in self.values.items())
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = f'le="{_formatValue(bound)}"'
+                yield f"{self.name}_bucket{_formatLabels(self.labelnames, key, le)} {count}"
+            yield f"{self.name}_bucket{_formatLabels(self.labelnames, key, _INF)} {series[-1]}"
+            yield f"{self.name}_sum{_formatLabels(self.labelnames, key)} {_formatValue(series[-2])}"
+            yield f"{self.name}_count{_formatLabels(self.labelnames, key)} {series[-1]}"
+
+
+def _register(metric):
+    with _lock:
+        if metric.name in _metrics:
+            raise ValueError(f"Metrik zaten tanımlı: {metric.name}")
+        _metrics[metric.name] = metric
+
+def render() -> str:
+    """Tüm metrikleri Prometheus metin formatında (text/plain; version=0.0.4) döndürür."""
+    with _lock:
+        metrics = list(_metrics.values())
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def startBuffering():
+    """Bu süreçteki gözlemleri kaydetmek yerine biriktirir (işlem havuzu workerlarında çağrılır)."""
+    global _buffer
+    _buffer = []
+
+def drain() -> list:
+    """Biriken gözlemleri döndürür ve tamponu boşaltır."""
+    if _buffer is None:
+        return []
+    observations = _buffer[:]
+    del _buffer[:]
+    return observations
+
+def replay(observations:list):
+    """Bir workerdan gelen gözlemleri bu sürecin metriklerine uygular."""
+    for name, labels, value in observations:
+        metric = _metrics.get(name)
+        if isinstance(metric, Histogram):
+            metric.observe(value, **labels)
+        elif metric is not None:
+            metric.inc(value, **labels)
+
+
+# Servisin metrikleri
+stage_seconds = Histogram(
+    "edevlet_stage_seconds", "İşlem aşamalarının süresi (saniye)", ("stage",))
+decode_tier_total = Counter(
+    "edevlet_qr_decode_tier_total", "Denenen QR çözme kademeleri ve bulunup bulunmadığı", ("tier", "found"))
+decode_tier_seconds = Histogram(
+    "edevlet_qr_decode_tier_seconds", "QR çözme kademelerinin süresi (saniye)", ("tier",))
+cache_requests_total = Counter(
+    "edevlet_cache_requests_total", "Önbellek sorguları", ("cache", "result"))
+upstream_seconds = Histogram(
+    "edevlet_upstream_request_seconds", "e-Devlet api isteklerinin süresi (saniye)", ("status",))
+upstream_errors_total = Counter(
+    "edevlet_upstream_errors_total", "e-Devlet api hataları", ("reason",))
+upstream_coalesced_total = Counter(
+    "edevlet_upstream_coalesced_total", "Devam eden aynı sorguya bağlanarak atlanan e-Devlet istekleri", ("scope",))
+storage_evictions_total = Counter(
+    "edevlet_storage_evictions_total", "Geçici depodan silinen dosyalar", ("reason",))
+upstream_queue_seconds = Histogram(
+    "edevlet_upstream_queue_seconds", "e-Devlet istekleri için hız sınırında beklenen süre (saniye)", ("priority",))
+upstream_rate_limited_total = Counter(
+    "edevlet_upstream_rate_limited_total", "Hız sınırında en uzun bekleme süresini aşacağı için reddedilen istekler",
+    ("priority",))
@@ -1,52 +1,195 @@
-import cv2
-import numpy as np
-import fitz
 import base64
-import io
-from PIL import Image
-import difflib
+import importlib.util
+import os
+import threading
+from contextlib import contextmanager
+from itertools import zip_longest
 from typing import Dict, List, Tuple
 
-try:
-    import easyocr
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+from text_similarity import (PreparedText, IncrementalSimilarity, SIMILARITY_MODES, combined_similarity,
+                             get_normalizer, keyword_similarity, text_similarity)
+
+# Ağır kütüphaneler (fitz, cv2, easyocr) ilk kullanımda yüklenir; modülü içe aktarmak
+# servisin açılışını ve /health yanıtını geciktirmez.
+OCR_AVAILABLE = importlib.util.find_spec("easyocr") is not None
+if not OCR_AVAILABLE:
     print("EasyOCR yüklenemedi. OCR özellikleri devre dışı.")
 
+_reader = None
+_reader_lock = threading.Lock()
+
+def get_reader():
+    """
+    Süreç başına bir kez oluşturulan paylaşılan EasyOCR okuyucusunu döndürür.
+    İlk çağrıda model yüklenir; OCR yoksa None döner.
+    """
+    global _reader
+    if not OCR_AVAILABLE:
+        return None
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                import easyocr
+                _reader = easyocr.Reader(['tr', 'en'])
+    return _reader
+
+def prewarm_reader(background: bool = False):
+    """
+    OCR modelini ilk istekten önce yükler. background ise yükleme ayrı bir thread'de yapılır
+    ve servis bu sırada istek kabul etmeye devam eder.
+    """
+    if background:
+        threading.Thread(target=get_reader, name="ocr-prewarm", daemon=True).start()
+    else:
+        get_reader()
+
+if os.environ.get("OCR_PREWARM", "0") == "1":
+    prewarm_reader(background=True)
+
+@contextmanager
+def open_pdf(pdf):
+    """PDF'i dosya yolundan ya da bytes'tan açar; zaten açık bir fitz.Document verilirse kapatmadan kullanır"""
+    import fitz
+    if isinstance(pdf, fitz.Document):
+        yield pdf
+        return
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        doc = fitz.open(stream=pdf, filetype="pdf")
+    else:
+        doc = fitz.open(pdf)
+    with doc:
+        yield doc
+
 class DocumentComparator:
-    def __init__(self):
-        if OCR_AVAILABLE:
-         
-            self.reader = easyocr.Reader(['tr', 'en'])
-        else:
-            self.reader = None
+    def __init__(self, similarity_mode: str = None, normalization_profile: str = None,
+                 normalize_mode: str = None):
+        """similarity_mode: "fast" (varsayılan, doğrusal) ya da "reference" (eski difflib puanlaması).
+        normalization_profile / normalize_mode: antet desenleri profili ve "fast" ya da "compat"
+        normalizasyon (bkz. text_similarity.get_normalizer).
+        Verilmezse ilgili ortam değişkenlerinden okunur."""
+        self.similarity_mode = similarity_mode or os.environ.get("SIMILARITY_MODE", "fast")
+        if self.similarity_mode not in SIMILARITY_MODES:
+            raise ValueError(f"Bilinmeyen benzerlik modu: {self.similarity_mode}")
+        self.normalize_mode = normalize_mode
+        self.normalizer = get_normalizer(normalization_profile, normalize_mode)
+        # Sayfa sayfa karşılaştırmada erken durma; margin 0 ise kapalı
+        self.early_stop_margin = float(os.environ.get("COMPARE_EARLY_STOP_MARGIN", 0.15))
+        self.early_stop_min_pages = int(os.environ.get("COMPARE_EARLY_STOP_MIN_PAGES", 2))
+        # Resim OCR'ı: uzun kenar bu piksele küçültülür, resimler bu boyutta gruplarla okunur
+        self.ocr_max_side = int(os.environ.get("OCR_MAX_SIDE", 1600))
+        self.ocr_batch_size = int(os.environ.get("OCR_BATCH_SIZE", 4))
+    
+    @property
+    def reader(self):
+        """EasyOCR okuyucusu; ilk erişimde yüklenir ve süreçteki tüm karşılaştırıcılarca paylaşılır."""
+        return get_reader()
     
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """PDF'den metin çıkarır"""
+    def extract_text_from_pdf(self, pdf_path) -> str:
+        """PDF'den metin çıkarır (dosya yolu, bytes ya da açık fitz.Document)"""
         try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text.strip()
+            return "".join(self.extract_pdf_pages(pdf_path)).strip()
         except Exception as e:
             print(f"PDF metin çıkarma hatası: {e}")
             return ""
     
-    def extract_text_from_image(self, image_path: str) -> str:
-        """Resim dosyasından OCR ile metin çıkarır"""
+    def extract_pdf_pages(self, pdf) -> List[str]:
+        """PDF'in (dosya yolu, bytes ya da açık fitz.Document) sayfa metinlerini liste olarak döndürür.
+        Açık belge verilirse kapatılmaz."""
+        with open_pdf(pdf) as doc:
+            return [page.get_text() for page in doc]
+    
+    def iter_pdf_pages(self, pdf, document_type: str = None):
+        """PDF'i sayfa sayfa okur; her sayfa için (ham metin, normalize kelimeler, anahtar kelimeler) üretir.
+        Tüm metin hiçbir zaman bellekte birleştirilmez. pdf, daha önce çıkarılmış sayfa metinlerinin
+        listesi de olabilir; o zaman belge tekrar açılmaz."""
+        normalizer = self.get_normalizer(document_type)
+        if isinstance(pdf, list):
+            pages = iter(pdf)
+        else:
+            pages = self._read_pdf_pages(pdf)
+        for text in pages:
+            normalized = normalizer.normalize(text)
+            yield text, normalized.split(), self.extract_key_words(normalized)
+    
+    def _read_pdf_pages(self, pdf):
+        with open_pdf(pdf) as doc:
+            for page in doc:
+                yield page.get_text()
+    
+    def load_image(self, image):
+        """Resmi dosya yolundan, bytes içeriğinden ya da hazır NumPy dizisinden gri tonlamalı okur"""
+        import cv2
+        import numpy as np
+        if isinstance(image, np.ndarray):
+            if image.ndim == 3:
+                return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            return image
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        return cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+    
+    def prepare_ocr_image(self, image):
+        """OCR öncesi resmi hazırlar: uzun kenarı ocr_max_side'a küçültür ve yalnızca yazı içeren
+        bölgeyi kırpar. Resimde yazı bölgesi yoksa None döner (OCR'a hiç verilmez)."""
+        import cv2
+        gray = self.load_image(image)
+        if gray is None:
+            raise ValueError("Resim okunamadı")
+        height, width = gray.shape
+        scale = self.ocr_max_side / max(height, width)
+        if scale < 1:
+            gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        
+        # Yazı bölgesi: koyu pikselleri satır boyunca birleştirip hepsini kapsayan dikdörtgeni al
+        _, mask = cv2.threshold(cv2.GaussianBlur(gray, (3, 3), 0), 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        mask = cv2.dilate(mask, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 5)))
+        points = cv2.findNonZero(mask)
+        if points is None:
+            return None
+        x, y, w, h = cv2.boundingRect(points)
+        if w * h < 0.005 * gray.shape[0] * gray.shape[1]:
+            return None
+        pad = max(gray.shape) // 50
+        return gray[max(y - pad, 0):y + h + pad, max(x - pad, 0):x + w + pad]
+    
+    def ocr_images(self, images: list) -> List[str]:
+        """Birden fazla resmi (yol, bytes ya da NumPy dizisi) tek seferde OCR'lar; her resim için
+        güveni 0.5'in üstündeki kelimelerden oluşan metni döndürür. Aynı boyuta getirilen resimler
+        EasyOCR'a readtext_batched ile ocr_batch_size'lık gruplar halinde verilir."""
+        import numpy as np
+        prepared = [self.prepare_ocr_image(image) for image in images]
+        texts = [""] * len(prepared)
+        indices = [i for i, image in enumerate(prepared) if image is not None]
+        if not indices:
+            return texts
+        
+        # readtext_batched aynı boyutta resim bekler; küçük olanlar beyazla doldurulur
+        height = max(prepared[i].shape[0] for i in indices)
+        width = max(prepared[i].shape[1] for i in indices)
+        batch = []
+        for i in indices:
+            image = prepared[i]
+            if image.shape != (height, width):
+                canvas = np.full((height, width), 255, dtype=np.uint8)
+                canvas[:image.shape[0], :image.shape[1]] = image
+                image = canvas
+            batch.append(image)
+        
+        if len(batch) == 1:
+            results = [self.reader.readtext(batch[0])]
+        else:
+            results = self.reader.readtext_batched(batch, batch_size=self.ocr_batch_size)
+        for i, result in zip(indices, results):
+            texts[i] = " ".join(text_item for (bbox, text_item, confidence) in result if confidence > 0.5)
+        return texts
+    
+    def extract_text_from_image(self, image) -> str:
+        """Resimden (dosya yolu, bytes ya da NumPy dizisi) OCR ile metin çıkarır"""
         if not OCR_AVAILABLE:
             return "OCR kütüphanesi yüklenemedi"
         
         try:
-            results = self.reader.readtext(image_path)
-            text = ""
-            for (bbox, text_item, confidence) in results:
-                if confidence > 0.5:  
-                    text += text_item + " "
-            return text.strip()
+            return self.ocr_images([image])[0]
         except Exception as e:
             print(f"OCR metin çıkarma hatası: {e}")
             return ""
@@ -54,84 +197,48 @@ class DocumentComparator:
     def extract_text_from_base64_pdf(self, base64_pdf: str) -> str:
         try:
             pdf_data = base64.b64decode(base64_pdf)
-            
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(pdf_data)
-                temp_path = temp_file.name
-            
-            text = self.extract_text_from_pdf(temp_path)
-            
-            import os
-            os.unlink(temp_path)
-            
-            return text
+            return self.extract_text_from_pdf(pdf_data)
         except Exception as e:
             print(f"Base64 PDF metin çıkarma hatası: {e}")
             return ""
     
     def extract_text_from_base64_image(self, base64_image: str) -> str:
-        """Base64 resim'den OCR ile metin çıkarır"""
-        if not OCR_AVAILABLE:
-            return "OCR kütüphanesi yüklenemedi"
-        
+        """Base64 resim'den OCR ile metin çıkarır (geçici dosyaya yazmadan)"""
         try:
-            image_data = base64.b64decode(base64_image)
-            
-            image = Image.open(io.BytesIO(image_data))
-            
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-                image.save(temp_file.name)
-                temp_path = temp_file.name
-            
-            text = self.extract_text_from_image(temp_path)
-            
-            import os
-            os.unlink(temp_path)
-            
-            return text
+            return self.extract_text_from_image(base64.b64decode(base64_image))
         except Exception as e:
             print(f"Base64 resim OCR hatası: {e}")
             return ""
     
-    def normalize_text(self, text: str) -> str:
-        """Metni normalize eder (küçük harf, boşlukları düzenle)"""
-        import re
-        text = text.lower()
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'[^\w\s]', '', text)
-        
-        logo_patterns = [
-            r'fsmseh', r'univ', r'vakif', r'universitesi', r'merkezi',
-            r'doga', r'belgelendirme', r'hizmetleri', r'info@', r'www\.',
-            r'0216', r'392', r'92', r'32', r'com', r'tr'
-        ]
+    def normalize_text(self, text: str, document_type: str = None) -> str:
+        """Metni normalize eder (küçük harf, boşlukları düzenle). document_type verilirse
+        o belge türünün antet desenleri kullanılır."""
+        return self.get_normalizer(document_type).normalize(text)
+    
+    def get_normalizer(self, document_type: str = None):
+        """Belge türüne göre normalizer; tür verilmezse karşılaştırıcının varsayılanı"""
+        if document_type is None:
+            return self.normalizer
+        return get_normalizer(document_type, self.normalize_mode)
+    
+    def prepare_text(self, text: str, document_type: str = None) -> PreparedText:
+        """Metni karşılaştırma için bir kez normalize eder ve anahtar kelimelerini çıkarır"""
+        normalized = self.normalize_text(text, document_type)
+        return PreparedText(normalized, self.extract_key_words(normalized))
+    
+    def score(self, prepared1: PreparedText, prepared2: PreparedText, mode: str = None) -> Tuple[float, float]:
+        """Hazırlanmış iki metin için (benzerlik, anahtar kelime benzerliği) döndürür"""
+        keyword_score = self.calculate_keyword_similarity(prepared1.keywords, prepared2.keywords)
+        if not prepared1.normalized or not prepared2.normalized:
+            return 0.0, keyword_score
         
-        for pattern in logo_patterns:
-            text = re.sub(pattern, '', text)
+        similarity = text_similarity(prepared1, prepared2, mode or self.similarity_mode)
         
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
+        return combined_similarity(keyword_score, similarity), keyword_score
     
-    def calculate_similarity(self, text1: str, text2: str) -> float:
+    def calculate_similarity(self, text1: str, text2: str, mode: str = None) -> float:
         """İki metin arasındaki benzerlik oranını hesaplar"""
-        norm_text1 = self.normalize_text(text1)
-        norm_text2 = self.normalize_text(text2)
-        
-        if not norm_text1 or not norm_text2:
-            return 0.0
-        
-        key_words1 = self.extract_key_words(norm_text1)
-        key_words2 = self.extract_key_words(norm_text2)
-        
-        keyword_similarity = self.calculate_keyword_similarity(key_words1, key_words2)
-        
-        text_similarity = difflib.SequenceMatcher(None, norm_text1, norm_text2).ratio()
-        
-        final_similarity = (keyword_similarity * 0.6) + (text_similarity * 0.4)
-        
-        return final_similarity
+        return self.score(self.prepare_text(text1), self.prepare_text(text2), mode)[0]
     
     def extract_key_words(self, text: str) -> set:
         """Metinden anahtar kelimeleri çıkarır"""
@@ -159,57 +266,52 @@ class DocumentComparator:
     
     def calculate_keyword_similarity(self, keywords1: set, keywords2: set) -> float:
         """Anahtar kelime setleri arasındaki benzerliği hesaplar"""
-        if not keywords1 and not keywords2:
-            return 1.0
-        if not keywords1 or not keywords2:
-            return 0.0
-        
-        intersection = keywords1.intersection(keywords2)
-        union = keywords1.union(keywords2)
-        
-        return len(intersection) / len(union) if union else 0.0
+        return keyword_similarity(keywords1, keywords2)
     
-    def compare_documents(self, original_file_path: str, verified_base64: str, 
-                         file_type: str = 'pdf') -> Dict:
-        """Orijinal belge ile doğrulanmış belgeyi karşılaştırır (sadece PDF-PDF)"""
+    def compare_documents(self, original_file_path: str, verified_base64: str = None, 
+                         file_type: str = 'pdf', original_text: str = None,
+                         verified_pdf: bytes = None, document_type: str = None,
+                         original_pages: List[str] = None) -> Dict:
+        """Orijinal belge (PDF ya da PNG/JPG resim) ile doğrulanmış PDF'i karşılaştırır.
+        original_text verilirse orijinal belgeden metin tekrar çıkarılmaz; doğrulanmış belge
+        base64 yerine doğrudan verified_pdf bytes'ı olarak da verilebilir. original_pages, orijinal
+        PDF'in önceden çıkarılmış sayfa metinleridir (verilirse belge tekrar açılmaz). document_type
+        normalizasyonda kullanılacak antet desenleri profilini seçer."""
         try:
-            if file_type.lower() != 'pdf':
+            file_type = file_type.lower()
+            if file_type not in ('pdf', 'png', 'jpg', 'jpeg'):
                 return {
-                    "error": "OCR karşılaştırma sadece PDF dosyaları için desteklenmektedir",
+                    "error": "OCR karşılaştırma sadece PDF, PNG ve JPG dosyaları için desteklenmektedir",
                     "similarity_score": 0.0,
                     "similarity_percentage": 0.0,
                     "is_similar": False,
-                    "comparison_status": "DESTEKLENMİYOR",
-                    "analysis_note": "Resim dosyaları için OCR karşılaştırma desteklenmemektedir"
+                    "comparison_status": "DESTEKLENMİYOR"
                 }
             
-            original_text = self.extract_text_from_pdf(original_file_path)
+            if verified_pdf is None:
+                verified_pdf = base64.b64decode(verified_base64)
             
-            verified_text = self.extract_text_from_base64_pdf(verified_base64)
+            if file_type != 'pdf':
+                return self.compare_image_with_pdf(original_file_path, verified_pdf, original_text, document_type)
             
-            similarity = self.calculate_similarity(original_text, verified_text)
+            # Hızlı modda iki belge sayfa sayfa, tam metin birleştirilmeden karşılaştırılır
+            if original_text is None and self.similarity_mode == "fast":
+                return self.compare_pdf_pages(original_pages if original_pages is not None else original_file_path,
+                                              verified_pdf, document_type)
             
-            key_words1 = self.extract_key_words(self.normalize_text(original_text))
-            key_words2 = self.extract_key_words(self.normalize_text(verified_text))
-            keyword_similarity = self.calculate_keyword_similarity(key_words1, key_words2)
+            if original_text is None and original_pages is not None:
+                original_text = "".join(original_pages).strip()
             
-            result = {
-                "original_text_length": len(original_text),
-                "verified_text_length": len(verified_text),
-                "similarity_score": round(similarity, 4),
-                "similarity_percentage": round(similarity * 100, 2),
-                "keyword_similarity": round(keyword_similarity, 4),
-                "keyword_similarity_percentage": round(keyword_similarity * 100, 2),
-                "is_similar": similarity > 0.7, 
-                "original_text_preview": original_text[:200] + "..." if len(original_text) > 200 else original_text,
-                "verified_text_preview": verified_text[:200] + "..." if len(verified_text) > 200 else verified_text,
-                "original_keywords": list(key_words1)[:10],  
-                "verified_keywords": list(key_words2)[:10],
-                "comparison_status": "BELGE BENZER" if similarity > 0.7 else "BELGE FARKLI",
-                "analysis_note": "PDF-PDF karşılaştırması - metin katmanlarından okuma"
-            }
+            if original_text is None:
+                original_text = self.extract_text_from_pdf(original_file_path)
+            verified_text = self.extract_text_from_pdf(verified_pdf)
             
-            return result
+            prepared1 = self.prepare_text(original_text, document_type)
+            prepared2 = self.prepare_text(verified_text, document_type)
+            similarity, keyword_similarity = self.score(prepared1, prepared2)
+            
+            return self._comparison_result(similarity, keyword_similarity, len(original_text), len(verified_text),
+                                           original_text, verified_text, prepared1.keywords, prepared2.keywords)
             
         except Exception as e:
             return {
@@ -220,6 +322,89 @@ class DocumentComparator:
                 "comparison_status": "HATA"
             }
     
+    def compare_pdf_pages(self, original_pdf, verified_pdf, document_type: str = None) -> Dict:
+        """İki PDF'i sayfa sayfa okuyarak karşılaştırır. Puan, en az birkaç sayfadan sonra eşiğin
+        belirgin biçimde altındaysa kalan sayfalar okunmadan durulur; bu durumda puan okunan
+        sayfalarındır ve early_stopped True döner."""
+        accumulator = IncrementalSimilarity(0.7, self.early_stop_margin, self.early_stop_min_pages)
+        lengths = [0, 0]
+        previews = ["", ""]
+        early_stopped = False
+        
+        readers = (self.iter_pdf_pages(original_pdf, document_type),
+                   self.iter_pdf_pages(verified_pdf, document_type))
+        pages = zip_longest(*readers)
+        try:
+            for pair in pages:
+                for side, page in enumerate(pair):
+                    if page is None:
+                        continue
+                    text, tokens, keywords = page
+                    accumulator.add_page(side, tokens, keywords)
+                    lengths[side] += len(text)
+                    if len(previews[side]) <= 200:
+                        previews[side] += text
+                if accumulator.decision() is not None and None not in pair:
+                    # Kalan sayfa olup olmadığına bakmak bir sayfa daha okumak demek; bakılmaz
+                    early_stopped = True
+                    break
+        finally:
+            for reader in readers:
+                reader.close()
+        
+        similarity, keyword_similarity = accumulator.score()
+        result = self._comparison_result(similarity, keyword_similarity, lengths[0], lengths[1],
+                                         previews[0].strip(), previews[1].strip(), *accumulator.keywords)
+        result["pages_compared"] = max(accumulator.pages)
+        result["early_stopped"] = early_stopped
+        return result
+    
+    def compare_image_with_pdf(self, original_image, verified_pdf, original_text: str = None,
+                               document_type: str = None) -> Dict:
+        """Resim olarak yüklenen belgeyi (ör. kamera çekimi) OCR ile okuyup doğrulanmış PDF'in
+        metin katmanıyla karşılaştırır. original_text verilirse OCR tekrar yapılmaz."""
+        if original_text is None:
+            if not OCR_AVAILABLE:
+                return {
+                    "error": "OCR kütüphanesi yüklenemedi",
+                    "similarity_score": 0.0,
+                    "similarity_percentage": 0.0,
+                    "is_similar": False,
+                    "comparison_status": "DESTEKLENMİYOR",
+                    "analysis_note": "Resim dosyaları için OCR gereklidir"
+                }
+            original_text = self.ocr_images([original_image])[0]
+        verified_text = self.extract_text_from_pdf(verified_pdf)
+        
+        prepared1 = self.prepare_text(original_text, document_type)
+        prepared2 = self.prepare_text(verified_text, document_type)
+        similarity, keyword_similarity = self.score(prepared1, prepared2)
+        
+        return self._comparison_result(similarity, keyword_similarity, len(original_text), len(verified_text),
+                                       original_text, verified_text, prepared1.keywords, prepared2.keywords,
+                                       "Resim-PDF karşılaştırması - resim OCR ile, PDF metin katmanından okuma")
+    
+    def _comparison_result(self, similarity: float, keyword_similarity: float, original_length: int,
+                           verified_length: int, original_text: str, verified_text: str,
+                           key_words1: set, key_words2: set,
+                           analysis_note: str = "PDF-PDF karşılaştırması - metin katmanlarından okuma") -> Dict:
+        return {
+            "original_text_length": original_length,
+            "verified_text_length": verified_length,
+            "similarity_score": round(similarity, 4),
+            "similarity_percentage": round(similarity * 100, 2),
+            "keyword_similarity": round(keyword_similarity, 4),
+            "keyword_similarity_percentage": round(keyword_similarity * 100, 2),
+            "is_similar": similarity > 0.7, 
+            "original_text_preview": original_text[:200] + "..." if len(original_text) > 200 else original_text,
+            "verified_text_preview": verified_text[:200] + "..." if len(verified_text) > 200 else verified_text,
+            "original_keywords": list(key_words1)[:10],  
+            "verified_keywords": list(key_words2)[:10],
+            "comparison_status": "BELGE BENZER" if similarity > 0.7 else "BELGE FARKLI",
+            "similarity_mode": self.similarity_mode,
+            "analysis_note": analysis_note
+        }
+    
     def compare_with_base64_images(self, original_base64: str, verified_base64: str) -> Dict:
         """İki base64 resim'i karşılaştırır"""
         try:
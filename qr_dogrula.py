@@ -1,4 +1,4 @@
-from eDevlet import getQRdata, getFileBarkod, checkValid
+from eDevlet import getQRdata, verifyBarkod
 
 def qr_ile_dogrula(pdf_dosyasi="out.pdf"):
     """
@@ -14,14 +14,17 @@ def qr_ile_dogrula(pdf_dosyasi="out.pdf"):
         print(f"QR'dan okunan TC: {tc}")
         
         # Belgeyi doğrula
-        if checkValid(barkod, tc):
+        sonuc = verifyBarkod(barkod, tc)
+        if sonuc.is_valid:
             print("✅ Belge doğrulandı!")
             
             # Doğrulanmış belgeyi PDF olarak kaydet
-            getFileBarkod(barkod, tc, "dogrulanmis_belge")
+            with open("dogrulanmis_belge.pdf", "wb") as f:
+                f.write(sonuc.pdf)
             return True
         else:
             print("❌ Belge doğrulanamadı!")
+            print(sonuc.messages)
             return False
             
     except Exception as e:
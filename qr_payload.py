@@ -0,0 +1,143 @@
+"""
+e-Devlet karekod içeriği (payload) ayrıştırıcısı.
+
+Bilinen biçimlerin tamamı tek bir derlenmiş dilbilgisiyle (regex) ayrıştırılır:
+- barkod:<barkod>;tckn:<tckn>;            (alanlar ters sırada ya da araya başka alanlar girmiş olabilir)
+- barkodlubelgedogrulama://barkod:...     (sicil belgeleri)
+- barkod:...;tckn:...;https://...          (transkript gibi sonuna adres eklenmiş belgeler)
+- <barkod>                                 (askerlik belgesi gibi yalnızca barkod içeren belgeler)
+- b'...'                                   (str(bytes) ile gelmiş içerik)
+
+Toplu mod:
+    python -m qr_payload payloads.txt [--out sonuc.jsonl]
+"""
+import argparse
+import json
+import re
+import sys
+
+# Hata kodları ve karşılık gelen HTTP durumları
+UNREADABLE = "UNREADABLE"        # belgede QR bulunamadı / okunamadı
+MALFORMED = "MALFORMED"          # içerik bilinen biçimlerin hiçbirine uymuyor
+TCKN_REQUIRED = "TCKN_REQUIRED"  # yalnızca barkod var; TC kimlik numarası ayrıca gönderilmeli
+HTTP_STATUS = {UNREADABLE: 422, MALFORMED: 422, TCKN_REQUIRED: 400}
+
+_GRAMMAR = re.compile(r"""
+    \A\s*(?:b')?                                            # str(bytes) kalıntısı
+    (?:barkodlubelgedogrulama://)?                          # sicil belgelerindeki önek
+    (?:
+        barkod:(?P<barkod>[^;']*);(?:[^;]*;)*?tckn:(?P<tckn>[^;'\s]*?)
+      | tckn:(?P<tckn_first>[^;']*);(?:[^;]*;)*?barkod:(?P<barkod_last>[^;'\s]*?)
+      | (?P<only>[^;:'\s]+?)                                # yalnızca barkod
+    )
+    ;?(?P<url>https://[^\s']*)?                             # sona eklenmiş doğrulama adresi
+    (?:;[^']*)?                                             # bilinmeyen ek alanlar
+    '?\s*\Z
+""", re.VERBOSE)
+
+
+class QRParseError(Exception):
+    """
+    Karekod içeriği ayrıştırılamadığında fırlatılır. code hata türünü (UNREADABLE, MALFORMED,
+    TCKN_REQUIRED), http_status API'nin döneceği durumu verir; TCKN_REQUIRED'da barkod da taşınır.
+    """
+    def __init__(self, code:str, message:str, barkod:str = None):
+        super().__init__(code, message, barkod)
+        self.code = code
+        self.message = message
+        self.barkod = barkod
+
+    @property
+    def http_status(self) -> int:
+        return HTTP_STATUS.get(self.code, 422)
+
+    def __str__(self):
+        return self.message
+
+
+class QRPayload:
+    """
+    Ayrıştırılmış karekod içeriği: barkod, tckn ve varsa sona eklenmiş adres.
+    """
+    __slots__ = ("barkod", "tckn", "url")
+
+    def __init__(self, barkod:str, tckn:str, url:str = None):
+        self.barkod = barkod
+        self.tckn = tckn
+        self.url = url
+
+    def asDict(self) -> dict:
+        """eDevlet.parseQRdata'nın döndürdüğü {'barkod':barkod,'tckn':tckn} biçimi"""
+        return {"barkod": self.barkod, "tckn": self.tckn}
+
+    def __repr__(self):
+        return f"QRPayload(barkod={self.barkod!r}, tckn={self.tckn!r}, url={self.url!r})"
+
+
+def parsePayload(qrData:str) -> QRPayload:
+    """
+    Karekod içeriğini ayrıştırır; QRPayload döndürür ya da QRParseError fırlatır.
+    """
+    if qrData is None or qrData == "null":
+        raise QRParseError(UNREADABLE, "QR okunamadı.")
+    match = _GRAMMAR.match(qrData)
+    if match is None:
+        raise QRParseError(MALFORMED, "QR içeriği tanınan bir e-Devlet biçiminde değil.")
+    only = match.group("only")
+    if only is not None:
+        raise QRParseError(TCKN_REQUIRED, f"Barkod '{only}' için TC kimlik numarası gerekiyor. "
+                           "Bu belge türü için TC kimlik numarası ayrıca gönderilmelidir.", only)
+    barkod = match.group("barkod")
+    if barkod is None:
+        barkod, tckn = match.group("barkod_last"), match.group("tckn_first")
+    else:
+        tckn = match.group("tckn")
+    if not barkod or not tckn:
+        raise QRParseError(MALFORMED, "QR içeriğinde barkod ya da TC kimlik numarası boş.")
+    return QRPayload(barkod, tckn, match.group("url"))
+
+def parseMany(lines):
+    """
+    Satır satır karekod içeriklerini ayrıştırır; her satır için (satır no, QRPayload ya da QRParseError) üretir.
+    Boş satırlar atlanır.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        try:
+            yield number, parsePayload(line)
+        except QRParseError as e:
+            yield number, e
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Karekod içeriklerini toplu ayrıştırır (satır başına bir içerik)")
+    parser.add_argument("input", help="içerik dosyası (- ise standart girdi)")
+    parser.add_argument("--out", default="-", help="json lines çıktı dosyası (- ise standart çıktı)")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    counts = {}
+    try:
+        for number, result in parseMany(source):
+            if isinstance(result, QRParseError):
+                record = {"line": number, "error_code": result.code, "error": result.message}
+                if result.barkod:
+                    record["barkod"] = result.barkod
+                counts[result.code] = counts.get(result.code, 0) + 1
+            else:
+                record = {"line": number, "barkod": result.barkod, "tckn": result.tckn}
+                counts["OK"] = counts.get("OK", 0) + 1
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(counts), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
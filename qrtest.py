@@ -1,82 +1,392 @@
+import os
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
 import cv2
 import fitz
+import numpy as np
 from pyzbar.pyzbar import decode
 
+from metrics import decode_tier_seconds, decode_tier_total, stage_seconds
+
+
+# Kademeli çözücünün bir adımı.
+# zoom: çizim büyütmesi, clip: sayfanın oransal (x0, y0, x1, y1) bölgesi ya da None (tüm sayfa),
+# pages: "last" (son sayfa) ya da "all" (tüm sayfalar), crop: pyzbar bulamazsa OpenCV dedektörünü de dene.
+DecodeTier = namedtuple("DecodeTier", "name zoom clip pages crop")
+
+# e-Devlet belgelerinde karekod son sayfanın alt kısmında yer alır; önce yalnızca o bölge
+# düşük çözünürlükte denenir, bulunamazsa çözünürlük ve taranan alan büyütülür.
+DEFAULT_TIERS = (
+    DecodeTier("alt-bolge", 1.5, (0.0, 0.55, 1.0, 1.0), "last", False),
+    DecodeTier("sayfa-2x", 2, None, "last", False),
+    DecodeTier("sayfa-3x", 3, None, "last", True),
+    DecodeTier("tum-sayfalar", 3, None, "all", True),
+)
+
+
+def openPdf(pdffile):
+    """
+    PDF'i dosya yolundan ya da bellekteki bytes içeriğinden açar.
+    """
+    if isinstance(pdffile, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=pdffile, filetype="pdf")
+    return fitz.open(pdffile)
 
-def readQRPdf(pdffile:str = "belge.pdf") -> str:
-    doc = fitz.open(pdffile)
-    page = doc[doc.page_count-1]  # loadPage yerine index kullan
-    pix = page.get_pixmap(alpha=False,matrix=fitz.Matrix(3, 3))  
-    pix.set_dpi(100,100) 
-    pix.save("some3.png")
-    image = cv2.imread("some3.png",cv2.IMREAD_GRAYSCALE)
-    dec = decode(image)
-    
+@contextmanager
+def usePdf(pdffile):
+    """
+    openPdf gibi, ama zaten açık bir fitz.Document verilirse onu kapatmadan kullanır;
+    böylece aynı belge QR çözme ve metin çıkarma için bir kez açılır.
+    """
+    if isinstance(pdffile, fitz.Document):
+        yield pdffile
+        return
+    with openPdf(pdffile) as doc:
+        yield doc
+
+def readGray(imgfile) -> np.ndarray:
+    """
+    Resmi dosya yolundan ya da bellekteki bytes içeriğinden gri tonlamalı okur.
+    """
+    if isinstance(imgfile, (bytes, bytearray, memoryview)):
+        return cv2.imdecode(np.frombuffer(imgfile, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    return cv2.imread(imgfile, cv2.IMREAD_GRAYSCALE)
+
+def renderGray(page, zoom: float = 3, clip=None):
+    """
+    Sayfayı doğrudan tek kanallı (gri) pixmap olarak çizer.
+    Diske yazılmaz; dönen pixmap pixmapToGray() ile NumPy'a verilir.
+    """
+    with stage_seconds.time(stage="pdf_render"):
+        return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False, clip=clip)
+
+def pixmapToGray(pix) -> np.ndarray:
+    """
+    Gri pixmap'in örnek tamponunu kopyalamadan (height, width) boyutlu uint8 diziye çevirir.
+    Dizi pixmap'in belleğini paylaşır, bu yüzden pixmap referansı dizi kullanıldığı sürece tutulmalıdır.
+    """
+    buf = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    image = buf.reshape(pix.height, pix.stride)[:, :pix.width * pix.n]
+    if pix.n != 1:
+        # Gri dışı bir pixmap gelirse tek kanala indir (kopya oluşur)
+        image = cv2.cvtColor(image.reshape(pix.height, pix.width, pix.n), cv2.COLOR_RGB2GRAY)
+    return image
+
+def decodeGray(image) -> str:
+    """
+    Gri görüntüde pyzbar ile kod arar. QR kodu varsa onu, yoksa bulunan ilk kodu döndürür.
+    Hiç kod yoksa None döner.
+    """
+    with stage_seconds.time(stage="pyzbar_decode"):
+        dec = decode(image)
+    if dec == []:
+        return None
     qr_codes = [d for d in dec if d.type == 'QRCODE']
-    
-    if qr_codes:
-        qr_data = qr_codes[0].data.decode('utf-8')
-        return qr_data
-    elif dec == []:
-        return readQRPdfwCrop(pdffile)
-    else:
-        x = dec[0]
-        qr_data = x.data.decode('utf-8')
-        return qr_data
+    x = qr_codes[0] if qr_codes else dec[0]
+    return x.data.decode('utf-8')
 
-def readQRPdfwCrop(pdffile:str = "belge.pdf") -> str:
-    doc = fitz.open(pdffile)
-    page = doc[doc.page_count-1]  # loadPage yerine index kullan
-    pix = page.get_pixmap(alpha=False,matrix=fitz.Matrix(2, 2))  # getPixmap yerine get_pixmap
-    pix.set_dpi(50,50)
-    pix.save("some3.png")
-    image = cv2.imread("some3.png",cv2.IMREAD_GRAYSCALE)
-    qrCodeDetector = cv2.QRCodeDetector()
-    decodedText, points, _ = qrCodeDetector.detectAndDecode(image)
-    #print(qrCodeDetector.detectAndDecode(image))
-    if points is not None:
-        #print(decodedText,points)
+def decodeAllGray(image) -> list:
+    """
+    Gri görüntüdeki tüm QR kodlarının içeriklerini yukarıdan aşağıya, soldan sağa sırayla döndürür.
+    """
+    with stage_seconds.time(stage="pyzbar_decode"):
+        dec = decode(image)
+    qr_codes = sorted((d for d in dec if d.type == 'QRCODE'), key=lambda d: (d.rect.top, d.rect.left))
+    return [d.data.decode('utf-8') for d in qr_codes]
+
+def decodeGraywCrop(image) -> str:
+    """
+    OpenCV QR dedektörü ile kodun yerini bulur, o bölgeyi kırpıp pyzbar'a verir.
+    Bulunamazsa "null" döner.
+    """
+    with stage_seconds.time(stage="opencv_fallback"):
+        qrCodeDetector = cv2.QRCodeDetector()
+        decodedText, points, _ = qrCodeDetector.detectAndDecode(image)
+        if points is None:
+            return "null"
         pnts = points[0]
         tl = pnts[0]
         br = pnts[2]
-        cropped_qr = image[int(tl[1]):int(br[1]), int(tl[0]):int(br[0])]
-        dec = decode(cropped_qr)[0]
-        qr_data = dec.data.decode('utf-8')
-        return qr_data
+        cropped_qr = image[max(int(tl[1]), 0):int(br[1]), max(int(tl[0]), 0):int(br[0])]
+        dec = decode(cropped_qr) if cropped_qr.size else []
+    if dec == []:
+        return "null"
+    return dec[0].data.decode('utf-8')
+
+
+def getTiers(names:str = None) -> tuple:
+    """
+    Kullanılacak kademeleri döndürür. names (ya da QR_DECODE_TIERS ortam değişkeni)
+    virgülle ayrılmış kademe adlarıdır, örn. "alt-bolge,sayfa-3x"; verilen sırayla denenir.
+    """
+    names = names if names is not None else os.environ.get("QR_DECODE_TIERS", "")
+    if not names.strip():
+        return DEFAULT_TIERS
+    byName = {t.name: t for t in DEFAULT_TIERS}
+    tiers = []
+    for name in names.split(","):
+        name = name.strip()
+        if name not in byName:
+            raise ValueError(f"Bilinmeyen QR çözme kademesi: {name}")
+        tiers.append(byName[name])
+    return tuple(tiers)
+
+def _clipRect(page, clip):
+    if clip is None:
+        return None
+    r = page.rect
+    x0, y0, x1, y1 = clip
+    return fitz.Rect(r.x0 + r.width * x0, r.y0 + r.height * y0, r.x0 + r.width * x1, r.y0 + r.height * y1)
 
+def _recordTier(report:list, name:str, start:float, qr_data) -> None:
+    """Kademenin sonucunu rapora ekler ve metriklere (sayaç ve süre) işler."""
+    seconds = time.perf_counter() - start
+    found = qr_data is not None
+    report.append({"tier": name, "seconds": seconds, "found": found})
+    decode_tier_total.inc(tier=name, found="true" if found else "false")
+    decode_tier_seconds.observe(seconds, tier=name)
+
+def _decodeTier(doc, tier, tried:dict) -> str:
+    """
+    Kademenin sayfalarını çizip çözer. tried, önceki kademelerde aynı büyütme ve bölgeyle çizilmiş
+    sayfaları (OpenCV denendiyse True) tutar; aynı çizim tekrar yapılmaz.
+    """
+    if tier.pages == "all":
+        # Karekod çoğunlukla son sayfalarda olduğu için sondan başa doğru tara
+        pages = range(doc.page_count - 1, -1, -1)
     else:
-        #print("QR code not detected")
-        return "null"
+        pages = [doc.page_count - 1]
+    for i in pages:
+        key = (i, tier.zoom, tier.clip)
+        if key in tried and (tried[key] or not tier.crop):
+            continue
+        tried[key] = tier.crop
+        page = doc[i]
+        pix = renderGray(page, tier.zoom, _clipRect(page, tier.clip))
+        image = pixmapToGray(pix)
+        qr_data = decodeGray(image)
+        if qr_data is None and tier.crop:
+            qr_data = decodeGraywCrop(image)
+            if qr_data == "null":
+                qr_data = None
+        # Bir sonraki çizimden önce pixmap belleğini bırak
+        del image, pix
+        if qr_data is not None:
+            return qr_data
+    return None
+
+def readQRPdfTiered(pdffile:str = "belge.pdf", tiers=None) -> tuple:
+    """
+    PDF'deki (yol, bytes ya da açık fitz.Document) QR kodunu ucuzdan pahalıya kademelerle arar,
+    ilk bulduğunda durur.
+    (qr_data, rapor) döndürür; qr_data bulunamazsa "null", rapor her denenen kademe için
+    {"tier", "seconds", "found"} sözlüklerinin listesidir.
+    """
+    tiers = tiers if tiers is not None else getTiers()
+    report = []
+    tried = {}
+    with usePdf(pdffile) as doc:
+        for tier in tiers:
+            start = time.perf_counter()
+            qr_data = _decodeTier(doc, tier, tried)
+            _recordTier(report, tier.name, start, qr_data)
+            if qr_data is not None:
+                return qr_data, report
+    return "null", report
+
+def readQRPdf(pdffile:str = "belge.pdf", tiers=None) -> str:
+    """readQRPdfTiered'ın yalnızca QR içeriğini döndüren kısayolu; kademe süreleri metriklerdedir."""
+    qr_data, _ = readQRPdfTiered(pdffile, tiers)
+    return qr_data
+
+def readQRPdfwCrop(pdffile:str = "belge.pdf") -> str:
+    with usePdf(pdffile) as doc:
+        page = doc[doc.page_count-1]  # loadPage yerine index kullan
+        return _readPagewCrop(page)
+
+def _readPagewCrop(page) -> str:
+    pix = renderGray(page, 2)
+    return decodeGraywCrop(pixmapToGray(pix))
+
+
+# Çoklu taramada sayfa başına denenen çizim büyütmeleri; sayfada kod bulunursa sonrakilere geçilmez
+SCAN_ZOOMS = (2, 3)
+
+def scanPage(page, zooms=SCAN_ZOOMS) -> list:
+    """
+    Sayfadaki tüm QR kodlarını arar. Hiçbiri bulunamazsa son büyütmede OpenCV dedektörü de denenir.
+    """
+    for zoom in zooms:
+        pix = renderGray(page, zoom)
+        image = pixmapToGray(pix)
+        codes = decodeAllGray(image)
+        if not codes and zoom == zooms[-1]:
+            qr_data = decodeGraywCrop(image)
+            codes = [qr_data] if qr_data != "null" else []
+        del image, pix
+        if codes:
+            return codes
+    return []
+
+def scanQRPdf(pdffile, pages=None, zooms=SCAN_ZOOMS) -> list:
+    """
+    PDF'in verilen sayfalarında (None ise tümünde) tüm QR kodlarını arar.
+    [(sayfa indeksi, qr_data), ...] döndürür.
+    """
+    found = []
+    with usePdf(pdffile) as doc:
+        for i in (pages if pages is not None else range(doc.page_count)):
+            found.extend((i, qr_data) for qr_data in scanPage(doc[i], zooms))
+    return found
+
+def scanQRImg(imgfile) -> list:
+    """
+    Resimdeki tüm QR kodlarını arar; [(0, qr_data), ...] döndürür.
+    """
+    image = readGray(imgfile)
+    codes = decodeAllGray(image)
+    if not codes:
+        qr_data = decodeGraywCrop(image)
+        codes = [qr_data] if qr_data != "null" else []
+    return [(0, qr_data) for qr_data in codes]
+
+
+# Resim ön işleme hattının bir adımı.
+# fn(taban, orijinal) denenecek aday görüntülerin listesini döndürür; rebase ise ilk aday
+# sonraki adımların tabanı olur (ör. küçültülmüş görüntü).
+ImageStage = namedtuple("ImageStage", "name fn rebase")
+
+# Eğik çekimlerde denenecek döndürme açıları (derece); 90'ın katlarını pyzbar zaten okur
+ROTATION_ANGLES = (15, -15, 30, -30, 45)
+
+def _maxSide() -> int:
+    return int(os.environ.get("QR_IMAGE_MAX_SIDE", 1600))
+
+def _downscale(image, original) -> list:
+    """Uzun kenarı QR_IMAGE_MAX_SIDE'dan büyük (ör. 12 MP telefon fotoğrafı) görüntüleri küçültür."""
+    h, w = image.shape[:2]
+    scale = _maxSide() / max(h, w)
+    if scale >= 1:
+        return [image]
+    return [cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)]
 
+def _clahe(image, original) -> list:
+    """Yerel kontrast eşitleme; gölgeli ve soluk çekimlerde modülleri belirginleştirir."""
+    return [cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(image)]
+
+def _adaptiveThreshold(image, original) -> list:
+    """Bulanık ve dengesiz aydınlatılmış çekimler için uyarlamalı eşikleme."""
+    block = max(15, min(image.shape[:2]) // 40) | 1
+    blurred = cv2.GaussianBlur(image, (3, 3), 0)
+    return [cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 10)]
+
+def _perspective(image, original) -> list:
+    """
+    OpenCV dedektörünün bulduğu dört köşeden kodu kare görüntüye düzeltir (açılı çekimler).
+    Köşeler bulunamazsa aday üretmez.
+    """
+    with stage_seconds.time(stage="opencv_fallback"):
+        found, points = cv2.QRCodeDetector().detect(image)
+    if not found or points is None:
+        return []
+    corners = points.reshape(4, 2).astype(np.float32)
+    side = int(max(np.linalg.norm(corners - np.roll(corners, 1, axis=0), axis=1)))
+    if side < 8:
+        return []
+    margin = side // 8  # sessiz bölge
+    target = np.float32([[margin, margin], [margin + side, margin],
+                         [margin + side, margin + side], [margin, margin + side]])
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    return [cv2.warpPerspective(image, matrix, (side + 2 * margin, side + 2 * margin),
+                                flags=cv2.INTER_LINEAR, borderValue=255)]
+
+def _rotations(image, original) -> list:
+    """Eğik çekimler için görüntüyü ROTATION_ANGLES açılarıyla döndürür."""
+    h, w = image.shape[:2]
+    candidates = []
+    for angle in ROTATION_ANGLES:
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        bw, bh = int(h * sin + w * cos), int(h * cos + w * sin)
+        # Köşeler kırpılmasın diye tuval büyütülür
+        matrix[0, 2] += bw / 2 - w / 2
+        matrix[1, 2] += bh / 2 - h / 2
+        candidates.append(cv2.warpAffine(image, matrix, (bw, bh), borderValue=255))
+    return candidates
+
+def _original(image, original) -> list:
+    """
+    Tam çözünürlüklü görüntü; küçültmede okunamaz hale gelen küçük kodlar (ör. 12 MP fotoğrafta
+    250 piksellik karekod) için son çare. Küçültme yapılmadıysa aynı görüntü tekrar çözülmez.
+    """
+    return [original]
+
+IMAGE_STAGES = (
+    ImageStage("kucult", _downscale, True),
+    ImageStage("clahe", _clahe, False),
+    ImageStage("esik", _adaptiveThreshold, False),
+    ImageStage("perspektif", _perspective, False),
+    ImageStage("dondur", _rotations, False),
+    ImageStage("orijinal", _original, False),
+)
+DEFAULT_IMAGE_STAGES = "kucult,clahe,esik,perspektif,dondur,orijinal"
+
+def getImageStages(names:str = None) -> tuple:
+    """
+    Resimlerde kullanılacak ön işleme adımlarını döndürür. names (ya da QR_IMAGE_STAGES ortam
+    değişkeni) virgülle ayrılmış adım adlarıdır; verilen sırayla denenir.
+    """
+    names = names if names is not None else os.environ.get("QR_IMAGE_STAGES", "")
+    if not names.strip():
+        names = DEFAULT_IMAGE_STAGES
+    byName = {s.name: s for s in IMAGE_STAGES}
+    stages = []
+    for name in names.split(","):
+        name = name.strip()
+        if name not in byName:
+            raise ValueError(f"Bilinmeyen resim ön işleme adımı: {name}")
+        stages.append(byName[name])
+    return tuple(stages)
+
+def readQRImgStaged(imgfile, stages=None) -> tuple:
+    """
+    Resimdeki (yol ya da bytes) QR kodunu ön işleme adımlarından geçirerek arar, ilk okunduğunda durur.
+    (qr_data, rapor) döndürür; qr_data bulunamazsa "null", rapor readQRPdfTiered'dakiyle aynı biçimdedir.
+    """
+    stages = stages if stages is not None else getImageStages()
+    original = image = readGray(imgfile)
+    if image is None:
+        return "null", []
+    report = []
+    # Okunmaya çalışılmış orijinal/taban görüntüler; küçültme gerekmediğinde aynı görüntü tekrar çözülmez
+    decoded = []
+    for stage in stages:
+        start = time.perf_counter()
+        qr_data = None
+        candidates = stage.fn(image, original)
+        if stage.rebase and candidates:
+            image = candidates[0]
+        for candidate in candidates:
+            if any(candidate is seen for seen in decoded):
+                continue
+            qr_data = decodeGray(candidate)
+            if candidate is original or candidate is image:
+                decoded.append(candidate)
+            if qr_data is not None:
+                break
+        del candidates
+        _recordTier(report, stage.name, start, qr_data)
+        if qr_data is not None:
+            return qr_data, report
+    return "null", report
 
 def readQRImg(imgfile:str = "img.png"):
-    image = cv2.imread(imgfile,cv2.IMREAD_GRAYSCALE)#,cv2.IMREAD_GRAYSCALE
-    x = decode(image)
-    print(x)
-    if x == []:
-        return readQRImgwCrop(imgfile)
-    y = x[0]
-    qr_data = y.data.decode('utf-8')
+    """readQRImgStaged'ın yalnızca QR içeriğini döndüren kısayolu; adım süreleri metriklerdedir."""
+    qr_data, _ = readQRImgStaged(imgfile)
     return qr_data
 
 def readQRImgwCrop(img):
-    image = cv2.imread(img,cv2.IMREAD_GRAYSCALE)
-    qrCodeDetector = cv2.QRCodeDetector()
-    decodedText, points, _ = qrCodeDetector.detectAndDecode(image)
-    if points is not None:
-        print("OPENCV:")
-        print(decodedText,points)
-        pnts = points[0]
-        tl = pnts[0]
-        br = pnts[2]
-        cropped_qr = image[int(tl[1]):int(br[1]), int(tl[0]):int(br[0])]
-        dec = decode(cropped_qr)
-        print(dec)
-        if dec == []:
-            return "null"
-        dec = dec[0]
-        qr_data = dec.data.decode('utf-8')
-        return qr_data
-    else:
-    #print("QR code not detected")
-        return "null"
\ No newline at end of file
+    image = readGray(img)
+    return decodeGraywCrop(image)
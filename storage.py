@@ -0,0 +1,237 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import storage_evictions_total
+
+
+# Depodan önceki sürümlerin kök klasöre yazdığı dosyalar: "<uuid>_<ad>" yüklemeleri ve
+# "verified_<uuid>_<ad>.pdf" doğrulanmış PDF'leri
+LEGACY_FILE = re.compile(r"(verified_)?[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_")
+
+
+class StorageFull(Exception):
+    """Dosya, eski dosyalar silinse bile depo kotasına sığmıyorsa fırlatılır (HTTP 503)."""
+
+
+class UploadStore:
+    """
+    /upload ile yüklenen dosyalar için süreli ve kotalı geçici depo.
+
+    Durum dosya sisteminde tutulur, böylece aynı klasörü kullanan tüm gunicorn workerları depoyu
+    paylaşır: dosyanın mtime'ı son kullanma zamanı, atime'ı son erişim zamanıdır (LRU için
+    noatime bağlamalarında da çalışsın diye elle yazılır). Kota aşılacaksa önce süresi dolanlar,
+    sonra en uzun süredir erişilmeyenler silinir. Arka plandaki temizleyici thread süresi dolan
+    dosyaları ve yarıda kalmış geçici dosyaları janitor_interval'da bir siler; başlarken önceki
+    sürümlerin kök klasöre bıraktığı dosyaları da toplar (bkz. migrateLegacy).
+
+    - directory: kök klasör; dosyalar files/, yazılmakta olanlar ve büyük istek gövdeleri tmp/ altındadır
+    - ttl: varsayılan dosya ömrü (saniye); writer() ile dosya başına verilebilir
+    - quota: files/ altındaki dosyaların toplam boyut sınırı (bayt)
+    - memory: dosyaları RAM'de (tmpfs, /dev/shm) tut; kota verilmezse tmpfs boyutunun yarısıdır
+
+    Ayarlar verilmezse STORAGE_* ortam değişkenlerinden okunur.
+    """
+    def __init__(self, directory:str = None, ttl:float = None, quota:int = None, janitor_interval:float = None,
+                 memory:bool = None):
+        env = os.environ.get
+        self.memory = memory if memory is not None else env("STORAGE_MEMORY", "0") == "1"
+        default_directory = "temp_uploads"
+        if self.memory:
+            if os.path.isdir("/dev/shm"):
+                default_directory = os.path.join("/dev/shm", "edevlet-uploads")
+            else:
+                print("STORAGE_MEMORY=1 ama /dev/shm yok, dosyalar diske yazılacak")
+                self.memory = False
+        self.directory = directory or env("STORAGE_DIR") or default_directory
+        self.files_dir = os.path.join(self.directory, "files")
+        self.tmp_dir = os.path.join(self.directory, "tmp")
+        os.makedirs(self.files_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.ttl = ttl if ttl is not None else float(env("STORAGE_TTL", 3600))
+        if quota is None and env("STORAGE_QUOTA"):
+            quota = int(env("STORAGE_QUOTA"))
+        if quota is None:
+            quota = shutil.disk_usage(self.directory).total // 2 if self.memory else 1024 ** 3
+        self.quota = quota
+        self.janitor_interval = janitor_interval or float(env("STORAGE_JANITOR_INTERVAL", 60))
+        # Bu süreçteki yaklaşık toplam boyut; diğer süreçlerin yazdıkları temizleyici turlarında eklenir
+        self.usage = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def path(self, file_id:str) -> str:
+        """Dosya kimliğinin depo içindeki yolu; kimlik geçersizse (ör. ../ içeriyorsa) None"""
+        if not file_id or os.path.basename(file_id) != file_id or file_id.startswith("."):
+            return None
+        return os.path.join(self.files_dir, file_id)
+
+    def get(self, file_id:str) -> str:
+        """Dosya varsa ve süresi dolmadıysa yolunu döndürür ve erişim zamanını günceller; yoksa None"""
+        path = self.path(file_id)
+        if path is None:
+            return None
+        try:
+            st = os.stat(path)
+            now = time.time()
+            if st.st_mtime < now:
+                self._delete(path, "expired")
+                return None
+            os.utime(path, (now, st.st_mtime))
+        except FileNotFoundError:
+            return None
+        return path
+
+    @contextmanager
+    def writer(self, file_id:str, ttl:float = None):
+        """
+        Dosyanın yazılacağı geçici yolu verir; blok hatasız biterse dosya kotaya göre yer açılarak
+        depoya taşınır. Yarıda kalan yazmalar depoda görünmez.
+        """
+        target = self.path(file_id)
+        if target is None:
+            raise ValueError("Geçersiz dosya kimliği")
+        fd, temp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        try:
+            yield temp_path
+            size = os.path.getsize(temp_path)
+            self.reserve(size)
+            now = time.time()
+            os.utime(temp_path, (now, now + (ttl if ttl is not None else self.ttl)))
+            os.replace(temp_path, target)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def remove(self, file_id:str):
+        path = self.path(file_id)
+        if path is not None:
+            self._delete(path)
+
+    def reserve(self, size:int):
+        """size baytlık yeni dosya için gerekirse eski dosyaları silerek kotada yer açar."""
+        if size > self.quota:
+            raise StorageFull("Dosya depolama kotasını aşıyor.")
+        with self.lock:
+            if self.usage is None or self.usage + size > self.quota:
+                self.usage = self.evict(size)
+            self.usage += size
+
+    def evict(self, incoming:int = 0) -> int:
+        """
+        Süresi dolan dosyaları siler, toplam boyut incoming bayt eklenince kotayı aşacaksa en uzun
+        süredir erişilmeyenleri de siler. Kalan toplam boyutu döndürür.
+        """
+        now = time.time()
+        entries, total = [], 0
+        with os.scandir(self.files_dir) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if st.st_mtime < now:
+                    self._delete(entry.path, "expired")
+                    continue
+                entries.append((st.st_atime, st.st_size, entry.path))
+                total += st.st_size
+        if total + incoming > self.quota:
+            entries.sort()
+            for _, size, path in entries:
+                if total + incoming <= self.quota:
+                    break
+                self._delete(path, "quota")
+                total -= size
+        if total + incoming > self.quota:
+            raise StorageFull("Depolama kotası dolu, lütfen daha sonra tekrar deneyin.")
+        return total
+
+    def sweep(self):
+        """tmp/ altında ttl'den uzun süredir dokunulmamış (çöken süreçlerden kalan) dosyaları siler."""
+        limit = time.time() - self.ttl
+        with os.scandir(self.tmp_dir) as it:
+            for entry in it:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < limit:
+                        self._delete(entry.path, "stale")
+                except FileNotFoundError:
+                    continue
+
+    def migrateLegacy(self):
+        """
+        Önceki sürümlerden kök klasörde kalan dosyaları toplar: süresi (yazıldığı andan ttl)
+        dolmamış yüklemeler files/ altına taşınır ki /verify çağrıları bulabilsin, süresi dolanlar ve
+        eski doğrulanmış PDF'ler silinir. Kök klasördeki diğer dosyalara (iş kuyruğu, kilitler) dokunmaz.
+        """
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                match = LEGACY_FILE.match(entry.name)
+                try:
+                    if match is None or not entry.is_file():
+                        continue
+                    expires = entry.stat().st_mtime + self.ttl
+                    if match.group(1) or expires < now:
+                        self._delete(entry.path, "stale")
+                        continue
+                    os.utime(entry.path, (now, expires))
+                    os.replace(entry.path, os.path.join(self.files_dir, entry.name))
+                except FileNotFoundError:
+                    continue
+
+    def cleanup(self):
+        """Temizleyici turu: süresi dolanları ve eski geçici dosyaları siler, kullanım bilgisini düzeltir."""
+        with self.lock:
+            self.usage = self.evict()
+        self.sweep()
+
+    def _delete(self, path:str, reason:str = None):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        if reason is not None:
+            storage_evictions_total.inc(reason=reason)
+
+    def start(self):
+        """Temizleyici thread'i (çalışmıyorsa) başlatır; fork sonrası tekrar çağrılabilir."""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self.run, name="storage-janitor", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self):
+        try:
+            self.migrateLegacy()
+        except OSError as e:
+            print(f"Eski yüklemeler taşınamadı: {e}")
+        while not self.stopping.wait(self.janitor_interval):
+            try:
+                self.cleanup()
+            except (OSError, StorageFull) as e:
+                print(f"Depo temizleme hatası: {e}")
+
+    def stats(self) -> dict:
+        files, total = 0, 0
+        with os.scandir(self.files_dir) as it:
+            for entry in it:
+                try:
+                    total += entry.stat().st_size
+                    files += 1
+                except FileNotFoundError:
+                    continue
+        return {"directory": self.directory, "memory": self.memory, "files": files, "bytes": total,
+                "quota": self.quota, "ttl": self.ttl}
@@ -0,0 +1,55 @@
+import io
+import os
+import time
+import zipfile
+
+os.environ.setdefault("CPU_WORKERS", "0")
+os.environ.setdefault("CPU_PREWARM", "0")
+
+import pytest
+
+import app
+from eDevlet import VerifyResult
+from worker_pool import CPUPool
+
+
+def slowDecode(data, file_ext):
+    time.sleep(float(data))
+    return {"barkod": "ABC", "tckn": "1"}
+
+
+def zipOf(count:int) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for i in range(count):
+            zf.writestr(f"belge{i}.pdf", b"%PDF-1.4")
+    return buffer.getvalue()
+
+
+def test_zip_members_past_the_limit_are_not_read(monkeypatch):
+    monkeypatch.setattr(app, "BATCH_MAX_FILES", 3)
+    reads = []
+    read = zipfile.ZipFile.read
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda self, info: reads.append(info) or read(self, info))
+    data = {"files": (io.BytesIO(zipOf(50)), "belgeler.zip")}
+    with app.app.test_request_context("/verify-batch", method="POST", data=data):
+        with pytest.raises(ValueError):
+            app.collect_batch_files()
+    assert len(reads) == 3
+
+
+def test_decode_deadline_starts_when_item_runs(monkeypatch):
+    pool = CPUPool(workers=1, queue_size=8, task_timeout=1.5)
+    try:
+        # Worker'ı ve test modülünün içe aktarılmasını süre ölçümünden önce bitir
+        pool.run(slowDecode, "0", "pdf")
+        monkeypatch.setattr(app, "cpu_pool", pool)
+        monkeypatch.setattr(app, "getQRdataByType", slowDecode)
+        monkeypatch.setattr(app, "verifyBarkod", lambda barkod, tc, priority=None: VerifyResult(False, [], None))
+        # Hepsi aynı anda kuyruğa girer; toplam süre task_timeout'u aşar ama her biri tek başına aşmaz
+        items = [(f"belge{i}.pdf", "0.6") for i in range(4)]
+        results = list(app.run_batch(items))
+    finally:
+        pool.shutdown()
+    assert len(results) == 4
+    assert not [r for r in results if "error" in r]
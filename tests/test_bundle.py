@@ -0,0 +1,64 @@
+import io
+import os
+
+os.environ.setdefault("CPU_WORKERS", "0")
+os.environ.setdefault("CPU_PREWARM", "0")
+
+import cv2
+import fitz
+
+import app
+from eDevlet import VerifyResult
+from worker_pool import scanDocument
+
+FIRST = "barkod:BIRINCI1;tckn:12345678901;"
+SECOND = "barkod:IKINCI22;tckn:10987654321;"
+ONLY_BARKOD = "UCUNCU33"
+PDF = b"%PDF-1.4 verified"
+
+
+def bundle(*pages) -> bytes:
+    """Her sayfaya verilen içerikle bir karekod (None ise yalnızca metin) koyan birleşik PDF"""
+    doc = fitz.open()
+    for payload in pages:
+        page = doc.new_page()
+        page.insert_text((72, 72), "e-Devlet belgesi")
+        if payload is not None:
+            code = cv2.resize(cv2.QRCodeEncoder.create().encode(payload), (300, 300),
+                              interpolation=cv2.INTER_NEAREST)
+            ok, png = cv2.imencode(".png", code)
+            assert ok
+            page.insert_image(fitz.Rect(72, 500, 222, 650), stream=png.tobytes())
+    return doc.tobytes()
+
+
+def test_scan_finds_codes_on_every_page_once():
+    codes = scanDocument(bundle(FIRST, None, SECOND, FIRST), "pdf", pages_per_task=1)
+    assert codes == [{"page": 1, "qr": FIRST}, {"page": 3, "qr": SECOND}]
+
+
+def test_scan_stops_at_limit():
+    codes = scanDocument(bundle(FIRST, SECOND, FIRST), "pdf", limit=1, pages_per_task=1)
+    assert codes == [{"page": 1, "qr": FIRST}]
+
+
+def test_verify_bundle_verifies_each_code(monkeypatch):
+    valid = {"BIRINCI1"}
+    monkeypatch.setattr(app, "verifyBarkod", lambda barkod, tc, priority=None:
+                        VerifyResult(barkod in valid, [], PDF if barkod in valid else None))
+    data = {"file": (io.BytesIO(bundle(FIRST, SECOND, ONLY_BARKOD)), "birlesik.pdf")}
+    response = app.app.test_client().post("/verify-bundle", data=data)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == 3
+    first, second, third = body["results"]
+    assert (first["page"], first["barkod"], first["is_valid"]) == (1, "BIRINCI1", True)
+    assert first["verified_pdf_base64"]
+    assert (second["page"], second["barkod"], second["is_valid"]) == (2, "IKINCI22", False)
+    assert third["page"] == 3 and third["error_code"] == "TCKN_REQUIRED" and third["barkod"] == ONLY_BARKOD
+
+
+def test_verify_bundle_without_codes_is_422():
+    data = {"file": (io.BytesIO(bundle(None, None)), "bos.pdf")}
+    response = app.app.test_client().post("/verify-bundle", data=data)
+    assert response.status_code == 422
@@ -0,0 +1,66 @@
+import sqlite3
+
+from cache import TTLCache, VerificationCache
+
+
+def test_ttl_cache_bounded_by_bytes():
+    cache = TTLCache(100, max_bytes=10, sizeof=len)
+    cache.set("a", b"x" * 4, 60)
+    cache.set("b", b"x" * 4, 60)
+    cache.get("a")
+    cache.set("c", b"x" * 4, 60)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.bytes == 8
+
+
+def test_ttl_cache_skips_oversized_and_replaces():
+    cache = TTLCache(100, max_bytes=10, sizeof=len)
+    cache.set("a", b"x" * 6, 60)
+    cache.set("a", b"x" * 11, 60)
+    assert cache.get("a") is None
+    assert cache.bytes == 0
+    cache.set("a", b"x" * 6, 60)
+    cache.set("a", b"x" * 2, 60)
+    assert cache.bytes == 2
+    assert cache.pop("a") == b"xx"
+    assert cache.bytes == 0
+
+
+def test_verification_cache_memory_limited_by_pdf_bytes():
+    cache = VerificationCache(maxsize=1024, ttl=60, negative_ttl=60, sqlite_path="", max_bytes=3000)
+    for i in range(5):
+        cache.set(f"B{i}", "1", True, [], b"%" * 1000)
+    stats = cache.stats()["memory"]
+    assert stats["size"] == 3
+    assert stats["bytes"] <= 3000
+    assert cache.get("B0", "1") is None
+    assert cache.get("B4", "1") is not None
+
+
+def test_shared_cache_has_expires_index(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = VerificationCache(ttl=60, sqlite_path=path)
+    cache.set("B", "1", True, [], b"pdf")
+    plan = sqlite3.connect(path).execute(
+        "EXPLAIN QUERY PLAN DELETE FROM cache WHERE expires <= ?", (0,)).fetchall()
+    assert any("cache_expires" in row[-1] for row in plan)
+
+
+def test_document_cache_writers_sharing_a_directory_do_not_collide(tmp_path, monkeypatch):
+    import json
+    import os
+    from cache import DocumentCache
+    # Başka bir worker aynı anda, aynı thread kimliğiyle aynı kaydı yazıyor
+    first, other = DocumentCache(str(tmp_path)), DocumentCache(str(tmp_path))
+    dump = json.dump
+
+    def interleaved(entry, f, **kwargs):
+        monkeypatch.setattr(json, "dump", dump)
+        other.update("abc", pages=["p"])
+        dump(entry, f, **kwargs)
+
+    monkeypatch.setattr(json, "dump", interleaved)
+    first.update("abc", qr={"barkod": "B"})
+    assert first.get("abc") == {"qr": {"barkod": "B"}}
+    assert os.listdir(tmp_path) == ["abc.json"]
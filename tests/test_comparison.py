@@ -0,0 +1,54 @@
+from ocr_comparison import DocumentComparator
+from text_similarity import IncrementalSimilarity
+
+GENUINE = [
+    f"T.C. İçişleri Bakanlığı nüfus kayıt örneği sayfa {n} ad soyad baba adı anne adı doğum yeri "
+    f"doğum tarihi medeni hali cilt hane birey sıra no {n} kayıt {n * 7} mahalle köy ilçe il"
+    for n in range(1, 5)
+]
+FORGED = [
+    "tamamen farklı içerik banka hesap ekstresi tutar bakiye işlem tarihi açıklama havale eft "
+    f"kredi kartı borç alacak faiz oranı vade {n}" for n in range(1, 5)
+]
+
+
+def test_decision_never_stops_early_on_similar_pages():
+    accumulator = IncrementalSimilarity(0.7, 0.15, 2)
+    for side in (0, 1):
+        for page in GENUINE[:2]:
+            tokens = page.split()
+            accumulator.add_page(side, tokens, set(tokens))
+    assert accumulator.score()[0] > 0.85
+    assert accumulator.decision() is None
+
+
+def test_forged_trailing_pages_are_compared():
+    original = GENUINE[:2] + FORGED[2:]
+    result = DocumentComparator().compare_pdf_pages(original, GENUINE)
+    assert result["pages_compared"] == 4
+    assert result["early_stopped"] is False
+    assert result["similarity_score"] is not None
+
+
+def test_early_stop_reports_partial_score():
+    result = DocumentComparator().compare_pdf_pages(FORGED, GENUINE)
+    assert result["early_stopped"] is True
+    assert result["pages_compared"] < 4
+    assert result["is_similar"] is False
+    assert result["similarity_score"] < 0.55
+    assert result["similarity_percentage"] == round(result["similarity_score"] * 100, 2)
+
+
+def test_early_stop_does_not_read_an_extra_page():
+    read = []
+
+    def pages(texts):
+        for text in texts:
+            read.append(text)
+            yield text
+
+    comparator = DocumentComparator()
+    comparator._read_pdf_pages = pages
+    result = comparator.compare_pdf_pages(tuple(FORGED), tuple(GENUINE))
+    assert result["early_stopped"] is True
+    assert len(read) == 2 * result["pages_compared"]
@@ -0,0 +1,274 @@
+import asyncio
+import time
+
+import pytest
+
+from eDevlet import BATCH, INTERACTIVE, CircuitBreaker, EDevletClient, RateLimited, RateLimiter
+
+
+def emptyLimiter(max_wait:float = 0) -> RateLimiter:
+    """Süreç içi durumlu, kovası boş ve neredeyse hiç dolmayan hız sınırlayıcı"""
+    limiter = RateLimiter(rate=0.001, burst=1, interactive_reserve=0, path="", max_wait=max_wait, batch_max_wait=0)
+    limiter.state = [0.0, time.time()]
+    return limiter
+
+
+def halfOpenBreaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    breaker.failure()
+    return breaker
+
+
+def test_rate_limited_trial_releases_breaker():
+    breaker = halfOpenBreaker()
+    client = EDevletClient(retries=0, breaker=breaker, limiter=emptyLimiter())
+    with pytest.raises(RateLimited):
+        client.getJson("ABC", "12345678901")
+    assert not breaker.trial
+    assert breaker.allow()
+
+
+def test_rate_limited_trial_releases_breaker_async():
+    pytest.importorskip("httpx")
+    from eDevlet import AsyncEDevletClient
+    breaker = halfOpenBreaker()
+
+    async def run():
+        client = AsyncEDevletClient(retries=0, breaker=breaker, limiter=emptyLimiter())
+        try:
+            with pytest.raises(RateLimited):
+                await client.getJson("ABC", "12345678901")
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert not breaker.trial
+    assert breaker.allow()
+
+
+def test_closed_breaker_keeps_trial_of_others():
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    client = EDevletClient(retries=0, breaker=breaker, limiter=emptyLimiter())
+    with pytest.raises(RateLimited):
+        client.getJson("ABC", "12345678901")
+    assert not breaker.is_open
+    assert breaker.failures == 0
+
+
+def test_limiter_zero_wait_full_bucket_grants():
+    limiter = RateLimiter(rate=1, burst=2, interactive_reserve=0, path="", max_wait=0, batch_max_wait=0)
+    limiter.acquire(INTERACTIVE)
+    limiter.acquire(BATCH)
+    assert limiter.state[0] < 0.1
+
+
+def test_limiter_zero_wait_full_bucket_grants_async():
+    limiter = RateLimiter(rate=1, burst=2, interactive_reserve=0, path="", max_wait=0, batch_max_wait=0)
+    asyncio.run(limiter.acquireAsync(INTERACTIVE))
+    assert limiter.state[0] < 1.1
+
+
+def test_limiter_rejection_keeps_tokens():
+    limiter = emptyLimiter()
+    limiter.state = [0.5, time.time()]
+    for _ in range(3):
+        with pytest.raises(RateLimited):
+            limiter.acquire(INTERACTIVE)
+    assert limiter.state[0] >= 0.5
+
+
+def test_limiter_rejection_keeps_tokens_shared_file(tmp_path):
+    path = str(tmp_path / "rate")
+    limiter = RateLimiter(rate=0.001, burst=1, interactive_reserve=0, path=path, max_wait=0, batch_max_wait=0)
+    limiter.acquire(INTERACTIVE)
+    with pytest.raises(RateLimited):
+        limiter.acquire(INTERACTIVE)
+    other = RateLimiter(rate=0.001, burst=1, interactive_reserve=0, path=path, max_wait=5, batch_max_wait=0)
+    granted, delay = other.reserve(INTERACTIVE, 0)
+    assert not granted
+    assert delay < 1001
+
+
+@pytest.mark.parametrize("rate", [0.5, 0.1])
+def test_batch_admitted_with_small_burst(rate, monkeypatch):
+    monkeypatch.delenv("EDEVLET_RATE_BURST", raising=False)
+    monkeypatch.delenv("EDEVLET_RATE_INTERACTIVE_RESERVE", raising=False)
+    limiter = RateLimiter(rate=rate, path="", batch_max_wait=3)
+    assert limiter.burst == 1
+    start = time.monotonic()
+    limiter.acquire(BATCH)
+    assert time.monotonic() - start < 0.5
+    assert limiter.state[0] < 0.1
+
+
+def test_reserve_still_applies_with_larger_burst():
+    limiter = RateLimiter(rate=1, burst=4, interactive_reserve=2, path="", batch_max_wait=0)
+    limiter.acquire(BATCH)
+    limiter.acquire(BATCH)
+    with pytest.raises(RateLimited):
+        limiter.acquire(BATCH)
+    limiter.acquire(INTERACTIVE)
+
+
+def test_async_verify_keeps_cache_and_limiter_off_the_event_loop(monkeypatch):
+    pytest.importorskip("httpx")
+    import threading
+    import eDevlet
+    calls = []
+
+    def record(name, value=None):
+        def fn(*args):
+            calls.append((name, threading.current_thread() is threading.main_thread()))
+            return value
+        return fn
+
+    class FakeClient:
+        async def getJson(self, barkod, tc, priority):
+            await eDevlet.client.limiter.acquireAsync(priority)
+            return {"return": False, "messageArr": ["geçersiz"]}
+
+    limiter = RateLimiter(rate=1, burst=2, interactive_reserve=0, path="", max_wait=0, batch_max_wait=0)
+    monkeypatch.setattr(limiter, "reserve", record("reserve", (True, 0.0)))
+    monkeypatch.setattr(eDevlet.client, "limiter", limiter)
+    monkeypatch.setattr(eDevlet.verify_cache, "get", record("get"))
+    monkeypatch.setattr(eDevlet.verify_cache, "set", record("set"))
+    result = asyncio.run(eDevlet.verifyBarkodAsync("ASYNC1", "12345678901", FakeClient()))
+    assert result.is_valid is False
+    assert [name for name, _ in calls] == ["get", "reserve", "set"]
+    assert not any(on_loop for _, on_loop in calls)
+
+
+def coalesced() -> float:
+    from metrics import upstream_coalesced_total
+    return upstream_coalesced_total.values.get(("thread",), 0)
+
+
+def waitForFollowers(before:float, count:int):
+    """count çağıran liderin sonucunu beklemeye başlayana kadar bekler"""
+    deadline = time.time() + 5
+    while coalesced() < before + count and time.time() < deadline:
+        time.sleep(0.01)
+    assert coalesced() == before + count
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    import threading
+    from eDevlet import SingleFlight
+    flight = SingleFlight(lock_dir="")
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {"sonuc": len(calls)}
+
+    results = []
+    before = coalesced()
+    threads = [threading.Thread(target=lambda: results.append(flight.do("B", fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    waitForFollowers(before, 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == [{"sonuc": 1}] * 5
+    # Lider bitince anahtar serbest kalır, sonraki çağrı yeniden çalışır
+    assert flight.calls == {}
+    assert flight.do("B", fetch) == {"sonuc": 2}
+
+
+def test_single_flight_shares_leader_error():
+    import threading
+    from eDevlet import SingleFlight
+    flight = SingleFlight(lock_dir="")
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise RuntimeError("e-Devlet hatası")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("B", fetch)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    before = coalesced()
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    waitForFollowers(before, 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert errors == ["e-Devlet hatası"] * 3
+
+
+def test_single_flight_coalesces_tasks():
+    from eDevlet import SingleFlight
+    flight = SingleFlight(lock_dir="")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "sonuc"
+
+    async def run():
+        return await asyncio.gather(*(flight.doAsync("B", fetch) for _ in range(4)))
+
+    assert asyncio.run(run()) == ["sonuc"] * 4
+    assert calls == [1]
+    assert flight.tasks == {}
+
+
+def test_process_lock_makes_other_worker_wait(tmp_path):
+    import threading
+    from eDevlet import SingleFlight
+    # Aynı kilit klasörünü paylaşan iki worker
+    first, second = SingleFlight(lock_dir=str(tmp_path)), SingleFlight(lock_dir=str(tmp_path))
+    held, release = threading.Event(), threading.Event()
+
+    def leader():
+        with first.processLock(("B", "1")):
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    held.wait(5)
+    threading.Timer(0.1, release.set).start()
+    with second.processLock(("B", "1")) as waited:
+        assert waited is True
+    thread.join()
+    with second.processLock(("B", "1")) as waited:
+        assert waited is False
+
+
+def test_concurrent_verifications_share_one_upstream_request(monkeypatch):
+    import threading
+    import eDevlet
+    release = threading.Event()
+    requests = []
+
+    def getJson(barkod, tc, priority=INTERACTIVE):
+        requests.append(barkod)
+        release.wait(5)
+        return {"return": False, "messageArr": ["geçersiz"]}
+
+    monkeypatch.setattr(eDevlet, "getJson", getJson)
+    results = []
+    before = coalesced()
+    threads = [threading.Thread(target=lambda: results.append(eDevlet.verifyBarkod("TEKUCUS1", "12345678901")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    waitForFollowers(before, 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert requests == ["TEKUCUS1"]
+    assert [r.is_valid for r in results] == [False] * 4
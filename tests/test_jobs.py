@@ -0,0 +1,211 @@
+import time
+
+import pytest
+
+import jobs
+from jobs import InvalidCallback, JobQueue, QueueFull
+
+
+class Response:
+    def __init__(self, status_code:int):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.delenv("JOBS_CALLBACK_ALLOWED_HOSTS", raising=False)
+    monkeypatch.delenv("JOBS_CALLBACK_ALLOW_PRIVATE", raising=False)
+    return JobQueue(lambda payload, params: {"size": len(payload), **params},
+                    path=str(tmp_path / "jobs.sqlite3"), workers=0)
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/hook", "http://localhost:8080/hook", "http://169.254.169.254/latest/meta-data",
+    "http://10.1.2.3/hook", "http://192.168.1.1/hook", "http://[::1]/hook", "http://[::ffff:127.0.0.1]/hook",
+    "ftp://example.com/hook", "http:///hook",
+])
+def test_callback_rejects_internal_addresses(queue, url):
+    with pytest.raises(InvalidCallback):
+        queue.submit(b"pdf", {}, url)
+
+
+def test_callback_accepts_public_address(queue):
+    queue.checkCallback("https://93.184.216.34/hook")
+
+
+def test_callback_private_opt_in_and_allowlist(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOBS_CALLBACK_ALLOW_PRIVATE", "1")
+    JobQueue(dict, path=str(tmp_path / "a.sqlite3"), workers=0).checkCallback("http://127.0.0.1/hook")
+    monkeypatch.setenv("JOBS_CALLBACK_ALLOWED_HOSTS", "hooks.internal")
+    queue = JobQueue(dict, path=str(tmp_path / "b.sqlite3"), workers=0)
+    queue.checkCallback("http://hooks.internal/hook")
+    with pytest.raises(InvalidCallback):
+        queue.checkCallback("http://93.184.216.34/hook")
+
+
+def runOnce(queue):
+    """Kuyruktan bir iş ya da geri çağrı alıp işler (worker thread'inin tek turu)"""
+    callback = queue.claimCallback()
+    if callback is not None:
+        queue.deliver(*callback)
+        return "callback"
+    job = queue.claim()
+    if job is None:
+        return None
+    job_id, params, payload, _, owner = job
+    queue.finish(job_id, queue.handler(payload, jobs.json.loads(params)), owner=owner)
+    return "job"
+
+
+def test_failed_callback_is_rescheduled_not_slept(queue, monkeypatch):
+    calls = []
+    monkeypatch.setattr(jobs.requests, "post", lambda url, **kwargs: calls.append(kwargs["json"]) or Response(503))
+    monkeypatch.setattr(jobs.time, "sleep", lambda seconds: pytest.fail("worker thread uyumamalı"))
+    job_id = queue.submit(b"pdf", {"name": "a"}, "https://93.184.216.34/hook")
+    assert runOnce(queue) == "job"
+    assert runOnce(queue) == "callback"
+    assert calls[0]["status"] == "done" and calls[0]["result"] == {"size": 3, "name": "a"}
+    # İkinci deneme ileri bir zamana ertelendi; şimdilik alınacak bir şey yok
+    assert runOnce(queue) is None
+    queue.connection().execute("UPDATE jobs SET callback_next = ? WHERE id = ?", (time.time(), job_id))
+    monkeypatch.setattr(jobs.requests, "post", lambda url, **kwargs: calls.append(kwargs["json"]) or Response(200))
+    assert runOnce(queue) == "callback"
+    assert len(calls) == 2
+    row = queue.connection().execute("SELECT callback_attempts, callback_next FROM jobs WHERE id = ?",
+                                     (job_id,)).fetchone()
+    assert row == (2, None)
+
+
+def test_callback_gives_up_after_retries(queue, monkeypatch):
+    calls = []
+    monkeypatch.setattr(jobs.requests, "post", lambda url, **kwargs: calls.append(url) or Response(500))
+    job_id = queue.submit(b"pdf", {}, "https://93.184.216.34/hook")
+    runOnce(queue)
+    for _ in range(queue.callback_retries):
+        queue.connection().execute("UPDATE jobs SET callback_next = ? WHERE id = ? AND callback_next IS NOT NULL",
+                                   (time.time(), job_id))
+        runOnce(queue)
+    assert len(calls) == queue.callback_retries
+    assert runOnce(queue) is None
+
+
+def test_old_database_is_migrated(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT, params TEXT, payload BLOB, result TEXT, "
+                 "error TEXT, callback_url TEXT, created REAL, started REAL, finished REAL)")
+    conn.commit()
+    conn.close()
+    queue = JobQueue(dict, path=path, workers=0)
+    queue.submit(b"x", {})
+    assert queue.claimCallback() is None
+
+
+def test_renewed_lease_is_not_reclaimed(tmp_path):
+    queue = JobQueue(dict, path=str(tmp_path / "jobs.sqlite3"), workers=0, job_timeout=0.2)
+    queue.submit(b"x", {})
+    job_id, _, _, _, owner = queue.claim()
+    queue.leases[job_id] = owner
+    for _ in range(3):
+        time.sleep(0.1)
+        queue.renew()
+    assert queue.claim() is None
+    assert queue.finish(job_id, {"ok": True}, owner=owner)
+    assert queue.get(job_id)["status"] == "done"
+
+
+def test_lost_lease_result_is_discarded(tmp_path):
+    queue = JobQueue(dict, path=str(tmp_path / "jobs.sqlite3"), workers=0, job_timeout=0.1)
+    queue.submit(b"x", {})
+    job_id, _, _, _, first = queue.claim()
+    time.sleep(0.2)
+    again = queue.claim()
+    assert again is not None and again[0] == job_id and again[4] != first
+    assert not queue.finish(job_id, {"run": 1}, owner=first)
+    assert queue.finish(job_id, {"run": 2}, owner=again[4])
+    assert queue.get(job_id)["result"] == {"run": 2}
+
+
+def test_queued_bytes_are_bounded(tmp_path):
+    queue = JobQueue(dict, path=str(tmp_path / "jobs.sqlite3"), workers=0, max_queued_bytes=10)
+    queue.submit(b"x" * 6, {})
+    with pytest.raises(QueueFull):
+        queue.submit(b"x" * 6, {})
+    job_id, _, _, _, owner = queue.claim()
+    # Çalışan işin gövdesi de sayılır
+    with pytest.raises(QueueFull):
+        queue.submit(b"x" * 6, {})
+    queue.finish(job_id, {}, owner=owner)
+    queue.submit(b"x" * 6, {})
+
+
+def test_long_job_runs_once_across_processes(tmp_path):
+    runs = []
+
+    def handler(payload, params):
+        runs.append(payload)
+        time.sleep(1.0)
+        return {}
+
+    path = str(tmp_path / "jobs.sqlite3")
+    # Aynı dosyayı paylaşan iki gunicorn worker'ı gibi
+    queues = [JobQueue(handler, path=path, workers=1, job_timeout=0.4, poll_interval=0.05) for _ in range(2)]
+    job_id = queues[0].submit(b"x", {})
+    queues[1].start()
+    try:
+        deadline = time.time() + 5
+        while queues[0].get(job_id)["status"] != "done" and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.5)
+    finally:
+        for queue in queues:
+            queue.stop()
+    assert queues[0].get(job_id)["status"] == "done"
+    assert runs == [b"x"]
+
+
+def test_jobs_are_claimed_in_submit_order(queue):
+    first = queue.submit(b"1", {})
+    second = queue.submit(b"22", {})
+    assert queue.claim()[0] == first
+    assert queue.get(first)["status"] == "running"
+    assert queue.get(second)["status"] == "queued"
+    assert queue.claim()[0] == second
+    assert queue.claim() is None
+
+
+def test_job_result_and_failure_are_recorded(queue):
+    job_id = queue.submit(b"pdf", {"name": "a"})
+    assert runOnce(queue) == "job"
+    job = queue.get(job_id)
+    assert job["status"] == "done" and job["result"] == {"size": 3, "name": "a"}
+    assert job["started_at"] <= job["finished_at"]
+
+    failing = queue.submit(b"pdf", {})
+    job_id, _, _, _, owner = queue.claim()
+    assert job_id == failing
+    queue.finish(job_id, error="QR okunamadı.", owner=owner)
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["error"] == "QR okunamadı." and "result" not in job
+    assert queue.get("yok") is None
+
+
+def test_worker_thread_runs_job_and_posts_callback(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs.JobQueue, "checkCallback", lambda self, url: None)
+    posted = []
+    monkeypatch.setattr(jobs.requests, "post", lambda url, **kwargs: posted.append((url, kwargs["json"])) or Response(200))
+
+    def handler(payload, params):
+        raise ValueError("bozuk belge")
+
+    queue = JobQueue(handler, path=str(tmp_path / "jobs.sqlite3"), workers=1, poll_interval=0.05)
+    job_id = queue.submit(b"x", {}, "https://example.com/hook")
+    deadline = time.time() + 5
+    while not posted and time.time() < deadline:
+        time.sleep(0.02)
+    queue.stop()
+    assert queue.get(job_id)["status"] == "failed"
+    url, body = posted[0]
+    assert url == "https://example.com/hook"
+    assert body["job_id"] == job_id and body["status"] == "failed" and body["error"] == "bozuk belge"
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+
+import qrtest
+
+PAYLOAD = "barkod:ABCD1234EFGH5678;tckn:12345678901;"
+
+
+def photo(size:tuple, qr_side:int) -> bytes:
+    """size boyutunda gri bir 'fotoğrafın' ortasına qr_side piksellik karekod yerleştirir"""
+    code = cv2.QRCodeEncoder.create().encode(PAYLOAD)
+    code = cv2.resize(code, (qr_side, qr_side), interpolation=cv2.INTER_NEAREST)
+    height, width = size
+    image = np.full((height, width), 200, dtype=np.uint8)
+    top, left = (height - qr_side) // 2, (width - qr_side) // 2
+    image[top:top + qr_side, left:left + qr_side] = code
+    ok, encoded = cv2.imencode(".png", image)
+    assert ok
+    return encoded.tobytes()
+
+
+def test_default_stages_downscale_first():
+    assert qrtest.getImageStages()[0].name == "kucult"
+    assert qrtest.getImageStages()[-1].name == "orijinal"
+
+
+def test_small_code_in_large_photo_is_read():
+    qr_data, report = qrtest.readQRImgStaged(photo((3000, 4000), 250))
+    assert qr_data == PAYLOAD
+    assert report[-1]["found"]
+
+
+def test_small_image_is_decoded_once(monkeypatch):
+    calls = []
+    decode = qrtest.decodeGray
+    monkeypatch.setattr(qrtest, "decodeGray", lambda image: calls.append(image) or decode(image))
+    qr_data, report = qrtest.readQRImgStaged(photo((400, 300), 10), qrtest.getImageStages("kucult,orijinal"))
+    assert qr_data == "null"
+    assert [r["tier"] for r in report] == ["kucult", "orijinal"]
+    assert len(calls) == 1
+
+
+def blankPdf(pages:int) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"sayfa {i}")
+    return doc.tobytes()
+
+
+def test_pdf_tiers_do_not_render_the_same_page_twice(monkeypatch):
+    import metrics
+    renders = []
+    render = qrtest.renderGray
+    monkeypatch.setattr(qrtest, "renderGray",
+                        lambda page, zoom, clip=None: renders.append((page.number, zoom, clip)) or render(page, zoom, clip))
+    before = metrics.decode_tier_seconds.values.get(("tum-sayfalar",), [0, 0])[-1]
+    qr_data, report = qrtest.readQRPdfTiered(blankPdf(2))
+    assert qr_data == "null"
+    assert [r["tier"] for r in report] == ["alt-bolge", "sayfa-2x", "sayfa-3x", "tum-sayfalar"]
+    assert len(renders) == len(set(renders)) == 4
+    assert metrics.decode_tier_seconds.values[("tum-sayfalar",)][-1] == before + 1
@@ -0,0 +1,58 @@
+import os
+
+os.environ.setdefault("CPU_WORKERS", "0")
+os.environ.setdefault("CPU_PREWARM", "0")
+
+import pytest
+
+import app
+from qr_payload import MALFORMED, TCKN_REQUIRED, UNREADABLE, QRParseError, parseMany, parsePayload
+
+
+@pytest.mark.parametrize("payload", [
+    "barkod:ABC123;tckn:12345678901;",
+    "tckn:12345678901;barkod:ABC123;",
+    "barkod:ABC123;ad:Ali;tckn:12345678901;",
+    "barkodlubelgedogrulama://barkod:ABC123;tckn:12345678901;",
+    "b'barkod:ABC123;tckn:12345678901;'",
+])
+def test_known_formats(payload):
+    result = parsePayload(payload)
+    assert result.asDict() == {"barkod": "ABC123", "tckn": "12345678901"}
+
+
+def test_trailing_url_is_kept():
+    result = parsePayload("barkod:ABC123;tckn:12345678901;https://www.turkiye.gov.tr/belge-dogrulama")
+    assert result.barkod == "ABC123" and result.tckn == "12345678901"
+    assert result.url == "https://www.turkiye.gov.tr/belge-dogrulama"
+
+
+@pytest.mark.parametrize("payload, code, status", [
+    (None, UNREADABLE, 422),
+    ("null", UNREADABLE, 422),
+    ("barkod:;tckn:12345678901;", MALFORMED, 422),
+    ("tckn:12345678901;barkod:;", MALFORMED, 422),
+    ("barkod:ABC123;tckn:;", MALFORMED, 422),
+    ("<html>çöp içerik</html>", MALFORMED, 422),
+    ("a:b:c", MALFORMED, 422),
+    ("ABC123", TCKN_REQUIRED, 400),
+])
+def test_errors_and_status(payload, code, status):
+    with pytest.raises(QRParseError) as info:
+        parsePayload(payload)
+    assert info.value.code == code
+    assert info.value.http_status == status
+    assert app.error_status(info.value) == status
+
+
+def test_tckn_required_carries_barkod():
+    with pytest.raises(QRParseError) as info:
+        parsePayload("ABC123")
+    assert info.value.barkod == "ABC123"
+
+
+def test_parse_many_skips_blank_lines():
+    results = list(parseMany(["barkod:A;tckn:1;\n", "\n", "çöp;;\n"]))
+    assert [number for number, _ in results] == [1, 3]
+    assert results[0][1].barkod == "A"
+    assert isinstance(results[1][1], QRParseError)
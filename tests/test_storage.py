@@ -0,0 +1,76 @@
+import os
+import time
+
+import pytest
+
+from storage import StorageFull, UploadStore
+
+
+def store(tmp_path, quota:int = 100, ttl:float = 60) -> UploadStore:
+    return UploadStore(directory=str(tmp_path), ttl=ttl, quota=quota, janitor_interval=60, memory=False)
+
+
+def put(upload_store:UploadStore, file_id:str, size:int, ttl:float = None):
+    with upload_store.writer(file_id, ttl) as path:
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+
+
+def test_file_larger_than_quota_is_rejected(tmp_path):
+    upload_store = store(tmp_path)
+    with pytest.raises(StorageFull):
+        put(upload_store, "buyuk.pdf", 101)
+    assert upload_store.get("buyuk.pdf") is None
+    assert os.listdir(upload_store.tmp_dir) == []
+
+
+def test_expired_file_is_not_returned(tmp_path):
+    upload_store = store(tmp_path)
+    put(upload_store, "a.pdf", 10)
+    path = upload_store.get("a.pdf")
+    assert path is not None
+    # mtime son kullanma zamanıdır
+    os.utime(path, (time.time(), time.time() - 1))
+    assert upload_store.get("a.pdf") is None
+    assert not os.path.exists(path)
+
+
+def test_quota_evicts_least_recently_accessed(tmp_path):
+    upload_store = store(tmp_path)
+    put(upload_store, "a.pdf", 40)
+    put(upload_store, "b.pdf", 40)
+    now = time.time()
+    # a daha yeni yazılmış olsa da b daha yakın zamanda okunmuş olsun
+    for file_id, atime in (("a.pdf", now - 20), ("b.pdf", now - 10)):
+        path = upload_store.path(file_id)
+        os.utime(path, (atime, os.stat(path).st_mtime))
+    put(upload_store, "c.pdf", 40)
+    assert upload_store.get("a.pdf") is None
+    assert upload_store.get("b.pdf") is not None
+    assert upload_store.get("c.pdf") is not None
+
+
+def test_expired_files_are_evicted_before_recent_ones(tmp_path):
+    upload_store = store(tmp_path)
+    put(upload_store, "eski.pdf", 40, ttl=60)
+    put(upload_store, "yeni.pdf", 40)
+    path = upload_store.path("eski.pdf")
+    os.utime(path, (time.time(), time.time() - 1))
+    put(upload_store, "c.pdf", 40)
+    assert not os.path.exists(path)
+    assert upload_store.get("yeni.pdf") is not None
+
+
+def test_legacy_root_files_are_migrated(tmp_path):
+    upload_store = store(tmp_path, ttl=3600)
+    legacy = "0f8fad5b-d9cb-469f-a165-70867728950e_belge.pdf"
+    expired = "7c9e6679-7425-40de-944b-e07fc1f90ae7_eski.pdf"
+    verified = f"verified_{legacy}.pdf"
+    for name in (legacy, expired, verified, "jobs.sqlite3"):
+        (tmp_path / name).write_bytes(b"x")
+    old = time.time() - 7200
+    os.utime(tmp_path / expired, (old, old))
+    upload_store.migrateLegacy()
+    assert sorted(os.listdir(tmp_path)) == ["files", "jobs.sqlite3", "tmp"]
+    assert upload_store.get(legacy) is not None
+    assert upload_store.get(expired) is None
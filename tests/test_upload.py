@@ -0,0 +1,135 @@
+import hashlib
+import io
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault("CPU_WORKERS", "0")
+os.environ.setdefault("CPU_PREWARM", "0")
+
+from werkzeug.datastructures import FileStorage
+
+import app
+
+
+class SeekOnlyStream:
+    """Python 3.9'daki SpooledTemporaryFile gibi seek/tell sunan ama seekable() sunmayan akış"""
+    def __init__(self, data:bytes):
+        self.buffer = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.buffer.read(size)
+
+    def seek(self, offset, whence=0):
+        return self.buffer.seek(offset, whence)
+
+    def tell(self):
+        return self.buffer.tell()
+
+
+class UnseekableStream:
+    def __init__(self, data:bytes):
+        self.buffer = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.buffer.read(size)
+
+
+DATA = b"%PDF-1.4\n" + b"x" * 1000
+
+
+def test_read_upload_without_seekable_stays_in_memory():
+    source, digest, temp_path = app.read_upload(FileStorage(SeekOnlyStream(DATA), filename="belge.pdf"))
+    assert source == DATA
+    assert digest == hashlib.sha256(DATA).hexdigest()
+    assert temp_path is None
+
+
+def test_read_upload_spooled_file():
+    stream = tempfile.SpooledTemporaryFile(max_size=app.UPLOAD_SPOOL_MAX)
+    stream.write(DATA)
+    source, digest, temp_path = app.read_upload(FileStorage(stream, filename="belge.pdf"))
+    assert source == DATA
+    assert temp_path is None
+
+
+def test_read_upload_unseekable_stream_goes_to_disk():
+    source, digest, temp_path = app.read_upload(FileStorage(UnseekableStream(DATA), filename="belge.pdf"))
+    try:
+        assert source == temp_path
+        assert digest == hashlib.sha256(DATA).hexdigest()
+        with open(temp_path, "rb") as f:
+            assert f.read() == DATA
+    finally:
+        os.remove(temp_path)
+
+
+def spooledUpload(data:bytes, max_size:int = 100) -> FileStorage:
+    spool = app.UploadSpool(max_size, app.upload_store.tmp_dir)
+    for i in range(0, len(data), 64):
+        spool.write(data[i:i + 64])
+    return FileStorage(spool, filename="belge.pdf")
+
+
+def test_upload_spool_stays_in_memory_until_max_size():
+    upload = spooledUpload(DATA[:90])
+    assert upload.stream.name is None
+    assert app.spooled_on_disk(upload) is None
+    upload.stream.seek(0)
+    assert upload.read() == DATA[:90]
+
+
+def test_read_upload_takes_over_spooled_file_without_copying(monkeypatch):
+    monkeypatch.setattr(app, "UPLOAD_SPOOL_MAX", 100)
+    upload = spooledUpload(DATA)
+    spool_path = upload.stream.name
+    monkeypatch.setattr(app, "save_upload", lambda *args: pytest.fail("dosya tekrar kopyalandı"))
+    source, digest, temp_path = app.read_upload(upload)
+    try:
+        upload.close()
+        assert not os.path.exists(spool_path)
+        assert digest == hashlib.sha256(DATA).hexdigest()
+        with open(temp_path, "rb") as f:
+            assert f.read() == DATA
+    finally:
+        os.remove(temp_path)
+
+
+def test_store_upload_moves_spooled_file_into_store(monkeypatch):
+    monkeypatch.setattr(app, "save_upload", lambda *args: pytest.fail("dosya tekrar kopyalandı"))
+    upload = spooledUpload(DATA)
+    digest = app.store_upload(upload, "spool-test.pdf")
+    try:
+        upload.close()
+        assert digest == hashlib.sha256(DATA).hexdigest()
+        with open(app.upload_store.get("spool-test.pdf"), "rb") as f:
+            assert f.read() == DATA
+    finally:
+        app.upload_store.remove("spool-test.pdf")
+
+
+def test_unclaimed_spool_file_is_removed_on_close():
+    upload = spooledUpload(DATA)
+    spool_path = upload.stream.name
+    upload.close()
+    assert not os.path.exists(spool_path)
+
+
+def test_large_verify_direct_upload_is_not_copied_again(monkeypatch):
+    monkeypatch.setattr(app, "UPLOAD_SPOOL_MAX", 100)
+    monkeypatch.setattr(app, "save_upload", lambda *args: pytest.fail("dosya tekrar kopyalandı"))
+    seen = {}
+
+    def decode(source, file_ext, digest, with_pages=False):
+        with open(source, "rb") as f:
+            seen["data"] = f.read()
+        seen["digest"] = digest
+        raise ValueError("durdur")
+
+    monkeypatch.setattr(app, "decode_qr", decode)
+    before = set(os.listdir(app.upload_store.tmp_dir))
+    response = app.app.test_client().post("/verify-direct", data={"file": (io.BytesIO(DATA), "belge.pdf")})
+    assert response.status_code == 500
+    assert seen == {"data": DATA, "digest": hashlib.sha256(DATA).hexdigest()}
+    assert set(os.listdir(app.upload_store.tmp_dir)) == before
@@ -0,0 +1,42 @@
+import os
+
+os.environ.setdefault("CPU_WORKERS", "0")
+os.environ.setdefault("CPU_PREWARM", "0")
+
+import app
+from eDevlet import VerifyResult
+from storage import UploadStore
+
+PDF = b"%PDF-1.4 verified"
+
+
+def fakeVerify(monkeypatch):
+    monkeypatch.setattr(app, "verifyBarkod", lambda barkod, tc, priority=None: VerifyResult(True, [], PDF))
+
+
+def test_verified_pdf_is_visible_to_other_workers(monkeypatch):
+    fakeVerify(monkeypatch)
+    result = {}
+    app.verify_qr(result, "ABC", "1", embed_pdf=False)
+    pdf_id = result["verified_pdf_id"]
+    # Aynı klasörü kullanan başka bir gunicorn worker'ının deposu
+    other = UploadStore(directory=app.verified_store.directory, ttl=60, quota=1024 ** 2)
+    with open(other.get(pdf_id), "rb") as f:
+        assert f.read() == PDF
+    response = app.app.test_client().get(result["verified_pdf_url"])
+    assert response.status_code == 200 and response.data == PDF
+
+
+def test_batch_items_with_embedded_pdf_are_not_stored(monkeypatch):
+    fakeVerify(monkeypatch)
+    stored = []
+    monkeypatch.setattr(app, "store_verified_pdf", lambda pdf: stored.append(pdf) or "id")
+    embedded = app.verify_batch_item("a.pdf", {"barkod": "ABC", "tckn": "1"}, embed_pdf=True)
+    assert "verified_pdf_url" not in embedded and embedded["verified_pdf_base64"]
+    linked = app.verify_batch_item("a.pdf", {"barkod": "ABC", "tckn": "1"}, embed_pdf=False)
+    assert linked["verified_pdf_url"] == "/verified/id"
+    assert stored == [PDF]
+
+
+def test_unknown_verified_pdf_is_404():
+    assert app.app.test_client().get("/verified/yok").status_code == 404
@@ -0,0 +1,219 @@
+"""
+Belge metinleri için normalizasyon ve benzerlik motoru.
+
+Normalizasyon belge türüne göre seçilen antet desenleriyle (profil) derlenmiş tek geçişte yapılır;
+eski çıktıyla bayt bayt aynı "compat" modu da vardır.
+
+Benzerlik için iki mod vardır:
+- "reference": eski puanlama; normalize metinler üzerinde difflib.SequenceMatcher.ratio()
+  (en kötü durumda karesel, uzun transkriptlerde yavaş)
+- "fast": kelime k-gramları (shingle) üzerinde çoklu küme Dice katsayısı; metin uzunluğuyla
+  doğrusal çalışır ve ratio() ile aynı 2*M/T biçiminde 0-1 arası puan üretir
+"""
+import difflib
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+SIMILARITY_MODES = ("fast", "reference")
+NORMALIZE_MODES = ("fast", "compat")
+SHINGLE_SIZE = 3
+
+# Belgelerdeki logo/antet kalıntıları; normalize edilirken metinden silinir
+LOGO_PATTERNS = [
+    r'fsmseh', r'univ', r'vakif', r'universitesi', r'merkezi',
+    r'doga', r'belgelendirme', r'hizmetleri', r'info@', r'www\.',
+    r'0216', r'392', r'92', r'32', r'com', r'tr'
+]
+
+_WHITESPACE = re.compile(r'\s+')
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+class TextNormalizer:
+    """
+    Derlenmiş desenlerle metin normalizasyonu (küçük harf, noktalama ve antet desenlerini silme,
+    boşlukları düzenleme).
+
+    - "fast": noktalama ve tüm desenler tek bir alternasyonla tek geçişte silinir
+    - "compat": eski DocumentComparator.normalize_text ile bayt bayt aynı çıktı; desenler
+      yine sırayla uygulanır ama her çağrıda yeniden derlenmez
+    """
+    def __init__(self, stop_patterns: list = None, mode: str = "fast"):
+        if mode not in NORMALIZE_MODES:
+            raise ValueError(f"Bilinmeyen normalizasyon modu: {mode}")
+        self.mode = mode
+        self.stop_patterns = list(LOGO_PATTERNS if stop_patterns is None else stop_patterns)
+        self.compiled = [re.compile(pattern) for pattern in self.stop_patterns]
+        # Aynı konumda uzun desen önce denensin (ör. universitesi, univ'den önce)
+        alternatives = [r'[^\w\s]+'] + sorted(self.stop_patterns, key=len, reverse=True)
+        self.single_pass = re.compile('|'.join(alternatives))
+
+    def normalize(self, text: str) -> str:
+        text = text.lower()
+        if self.mode == "compat":
+            text = _WHITESPACE.sub(' ', text)
+            text = _PUNCTUATION.sub('', text)
+            for pattern in self.compiled:
+                text = pattern.sub('', text)
+            text = _WHITESPACE.sub(' ', text)
+            return text.strip()
+        return ' '.join(self.single_pass.sub('', text).split())
+
+
+_profiles = None
+_normalizers = {}
+_normalizers_lock = threading.Lock()
+
+def load_profiles() -> dict:
+    """
+    Belge türüne göre antet desenleri. "default" profili LOGO_PATTERNS'tir; NORMALIZATION_PROFILES_FILE
+    ortam değişkeni {"profil": ["desen", ...]} biçiminde bir json dosyasını gösteriyorsa oradaki
+    profiller eklenir ya da varsayılanın yerine geçer.
+    """
+    global _profiles
+    if _profiles is None:
+        profiles = {"default": LOGO_PATTERNS}
+        path = os.environ.get("NORMALIZATION_PROFILES_FILE")
+        if path:
+            with open(path, encoding="utf-8") as f:
+                profiles.update(json.load(f))
+        _profiles = profiles
+    return _profiles
+
+def get_normalizer(profile: str = None, mode: str = None) -> TextNormalizer:
+    """
+    Profil ve mod için derlenmiş normalizer'ı döndürür (süreç başına bir kez derlenir).
+    Verilmezse NORMALIZATION_PROFILE ve NORMALIZE_MODE ortam değişkenleri kullanılır;
+    bilinmeyen profil için "default" kullanılır.
+    """
+    profile = profile or os.environ.get("NORMALIZATION_PROFILE", "default")
+    mode = mode or os.environ.get("NORMALIZE_MODE", "fast")
+    profiles = load_profiles()
+    if profile not in profiles:
+        profile = "default"
+    key = (profile, mode)
+    normalizer = _normalizers.get(key)
+    if normalizer is None:
+        with _normalizers_lock:
+            normalizer = _normalizers.get(key)
+            if normalizer is None:
+                normalizer = _normalizers[key] = TextNormalizer(profiles[profile], mode)
+    return normalizer
+
+
+class PreparedText:
+    """
+    Karşılaştırma için bir kez hazırlanmış metin: normalize metin, kelimeler ve anahtar kelimeler.
+    """
+    __slots__ = ("normalized", "tokens", "keywords")
+
+    def __init__(self, normalized: str, keywords: set):
+        self.normalized = normalized
+        self.tokens = normalized.split()
+        self.keywords = keywords
+
+
+def shingles(tokens: list, size: int = SHINGLE_SIZE) -> Counter:
+    """
+    Ardışık size kelimelik grupların sayacını döndürür. Metin size'dan kısaysa kelimelerin kendisi kullanılır.
+    """
+    if len(tokens) < size:
+        return Counter(tokens)
+    return Counter(zip(*(tokens[i:] for i in range(size))))
+
+def dice_similarity(counts1: Counter, counts2: Counter) -> float:
+    """
+    İki çoklu küme arasındaki Dice katsayısı: 2 * |A ∩ B| / (|A| + |B|).
+    """
+    total = sum(counts1.values()) + sum(counts2.values())
+    if not total:
+        return 0.0
+    common = sum((counts1 & counts2).values())
+    return 2.0 * common / total
+
+def text_similarity(text1: PreparedText, text2: PreparedText, mode: str = "fast") -> float:
+    """
+    İki hazırlanmış metnin (anahtar kelimeler hariç) metin benzerliği.
+    """
+    if mode == "reference":
+        return difflib.SequenceMatcher(None, text1.normalized, text2.normalized).ratio()
+    if mode == "fast":
+        return dice_similarity(shingles(text1.tokens), shingles(text2.tokens))
+    raise ValueError(f"Bilinmeyen benzerlik modu: {mode}")
+
+def keyword_similarity(keywords1: set, keywords2: set) -> float:
+    """
+    Anahtar kelime kümeleri arasındaki Jaccard benzerliği.
+    """
+    if not keywords1 and not keywords2:
+        return 1.0
+    if not keywords1 or not keywords2:
+        return 0.0
+    union = keywords1 | keywords2
+    return len(keywords1 & keywords2) / len(union) if union else 0.0
+
+def combined_similarity(keyword_score: float, text_score: float) -> float:
+    """
+    Nihai puan: anahtar kelime benzerliği %60, metin benzerliği %40 ağırlıklı.
+    """
+    return (keyword_score * 0.6) + (text_score * 0.4)
+
+
+class IncrementalSimilarity:
+    """
+    İki belgenin sayfaları geldikçe beslenen "fast" mod benzerlik hesaplayıcısı.
+    Yalnızca shingle sayaçlarını ve anahtar kelime kümelerini tutar; tüm belge sonunda
+    tek seferde hesaplanan "fast" puanla aynı sonucu verir (sayfa sınırını aşan shingle'lar dahil).
+
+    decision(), en az min_pages sayfa çiftinden sonra puan eşiğin margin kadar altındaysa False
+    döndürür, böylece kalan sayfalar okunmadan durulabilir. Erken durma yalnızca olumsuz yönde
+    yapılır: ilk sayfaları tutan bir belgenin sonraki sayfaları sahte olabileceğinden olumlu sonuç
+    ancak tüm sayfalar karşılaştırıldıktan sonra verilir. margin 0 ise erken durma kapalıdır.
+    """
+    def __init__(self, threshold: float = 0.7, margin: float = 0.15, min_pages: int = 2):
+        self.threshold = threshold
+        self.margin = margin
+        self.min_pages = min_pages
+        self.counts = (Counter(), Counter())
+        self.keywords = (set(), set())
+        self.tails = ([], [])
+        self.token_counts = [0, 0]
+        self.pages = [0, 0]
+
+    def add_page(self, side: int, tokens: list, keywords: set):
+        """side: 0 orijinal, 1 doğrulanmış belge."""
+        tail = self.tails[side]
+        # Önceki sayfanın son kelimeleriyle birleştirerek sayfa sınırındaki shingle'ları da say
+        joined = tail + tokens
+        if len(joined) >= SHINGLE_SIZE:
+            self.counts[side].update(zip(*(joined[i:] for i in range(SHINGLE_SIZE))))
+        self.tails[side][:] = joined[-(SHINGLE_SIZE - 1):] if SHINGLE_SIZE > 1 else []
+        self.token_counts[side] += len(tokens)
+        self.keywords[side].update(keywords)
+        self.pages[side] += 1
+
+    def _counts(self, side: int) -> Counter:
+        # Tüm belge SHINGLE_SIZE kelimeden kısaysa shingles() gibi kelimelerin kendisini kullan
+        if self.token_counts[side] < SHINGLE_SIZE:
+            return Counter(self.tails[side])
+        return self.counts[side]
+
+    def score(self):
+        """(benzerlik, anahtar kelime benzerliği)"""
+        keyword_score = keyword_similarity(*self.keywords)
+        if not self.token_counts[0] or not self.token_counts[1]:
+            return 0.0, keyword_score
+        text_score = dice_similarity(self._counts(0), self._counts(1))
+        return combined_similarity(keyword_score, text_score), keyword_score
+
+    def decision(self):
+        """Belge kesin olarak farklıysa False, henüz belli değilse None."""
+        if self.margin <= 0 or min(self.pages) < self.min_pages:
+            return None
+        similarity, _ = self.score()
+        if similarity <= self.threshold - self.margin:
+            return False
+        return None
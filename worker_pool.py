@@ -0,0 +1,295 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, Future, InvalidStateError, ProcessPoolExecutor,
+                                TimeoutError as FuturesTimeout, wait)
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+
+class PoolBusy(Exception):
+    """İşlem kuyruğu dolu olduğunda fırlatılır (HTTP 503)."""
+
+class TaskTimeout(Exception):
+    """İş, izin verilen sürede tamamlanmadığında fırlatılır (HTTP 504)."""
+
+
+# Worker süreçlerinde bir kez oluşturulan karşılaştırıcı
+_comparator = None
+
+def _prewarm(load_ocr:bool):
+    """
+    Worker süreci başlarken ağır kütüphaneleri (cv2, fitz, pyzbar) ve istenirse OCR modelini
+    bir kez yükler; böylece ilk iş bu maliyeti ödemez.
+    """
+    # Worker'daki ölçümler işin sonucuyla birlikte ana sürece gönderilir
+    metrics.startBuffering()
+    import eDevlet  # noqa: F401
+    if load_ocr:
+        from ocr_comparison import prewarm_reader
+        prewarm_reader()
+
+def _noop():
+    pass
+
+class PoolFuture(Future):
+    """CPUPool.submit'in döndürdüğü future; started() işin havuz kuyruğundan çıkıp çıkmadığını söyler."""
+    def __init__(self, pool:"CPUPool" = None, task:Future = None):
+        super().__init__()
+        self.pool = pool
+        self.task = task
+
+    def started(self) -> bool:
+        """İş bir worker'da çalışıyorsa ya da bittiyse True; havuz kuyruğunda bekliyorsa False."""
+        return self.done() or self.pool is None or self.pool.isRunning(self.task)
+
+
+def _runTask(fn, args, kwargs):
+    """Worker'da işi çalıştırır; sonucu o iş sırasında biriken metrik gözlemleriyle birlikte döndürür."""
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        # Hata da ana sürece taşınır; gözlemler istisnanın üzerinde gider
+        e.metric_observations = metrics.drain()
+        raise
+    return result, metrics.drain()
+
+def _chainResult(task:Future, future:Future):
+    """Worker'dan gelen (sonuç, gözlemler) ikilisini açar, gözlemleri uygular ve sonucu future'a aktarır."""
+    if task.cancelled():
+        future.cancel()
+        return
+    error = task.exception()
+    if error is not None:
+        metrics.replay(getattr(error, "metric_observations", []))
+    else:
+        result, observations = task.result()
+        metrics.replay(observations)
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        # Çağıran zaman aşımında future'ı iptal ettiyse yalnızca gözlemler uygulanır
+        pass
+
+def _getComparator():
+    global _comparator
+    if _comparator is None:
+        from ocr_comparison import DocumentComparator
+        _comparator = DocumentComparator()
+    return _comparator
+
+def decodeDocument(source, file_ext:str, with_pages:bool = False) -> tuple:
+    """
+    Worker'da belgeyi bir kez açar; QR bilgisini ve with_pages ise (PDF için) sayfa metinlerini
+    aynı açılmış belgeden çıkarır. (qr_data, sayfa metinleri ya da None) döndürür.
+    source dosya yolu ya da dosyanın bytes içeriğidir.
+    """
+    from eDevlet import getQRdataByType
+    from qrtest import usePdf
+    if file_ext != 'pdf' or not with_pages:
+        return getQRdataByType(source, file_ext), None
+    with usePdf(source) as doc:
+        qr_data = getQRdataByType(doc, file_ext)
+        return qr_data, _getComparator().extract_pdf_pages(doc)
+
+def scanPages(source, file_ext:str, pages=None) -> list:
+    """
+    Worker'da belgenin verilen sayfalarındaki (None ise tümü) tüm QR kodlarını arar;
+    [(sayfa indeksi, qr_data), ...] döndürür.
+    """
+    from qrtest import scanQRImg, scanQRPdf
+    if file_ext == 'pdf':
+        return scanQRPdf(source, pages)
+    return scanQRImg(source)
+
+def extractPdfText(pdf) -> str:
+    """Worker'da PDF metin katmanını çıkarır."""
+    return _getComparator().extract_text_from_pdf(pdf)
+
+def compareDocuments(*args, **kwargs) -> dict:
+    """Worker'da DocumentComparator.compare_documents çalıştırır."""
+    return _getComparator().compare_documents(*args, **kwargs)
+
+
+class CPUPool:
+    """
+    QR çözme, PDF çizimi ve OCR gibi CPU yoğun işler için yönetilen süreç havuzu.
+    İstek thread'leri yalnızca I/O ve orkestrasyonla meşgul olur, GIL çekişmesi ortadan kalkar.
+
+    - workers: süreç sayısı (0 verilirse işler çağıran thread'de çalışır)
+    - queue_size: aynı anda havuzda bekleyebilecek/çalışabilecek en fazla iş; dolunca PoolBusy
+    - task_timeout: run() için varsayılan iş zaman aşımı (saniye)
+    - prewarm_ocr: workerlar başlarken OCR modelini de yüklesin mi
+
+    Ayarlar verilmezse CPU_* ortam değişkenlerinden okunur.
+    """
+    def __init__(self, workers:int = None, queue_size:int = None, task_timeout:float = None,
+                 prewarm_ocr:bool = None):
+        env = os.environ.get
+        self.workers = workers if workers is not None else int(env("CPU_WORKERS", min(4, os.cpu_count() or 1)))
+        self.queue_size = queue_size or int(env("CPU_QUEUE_SIZE", max(self.workers, 1) * 4))
+        self.task_timeout = task_timeout or float(env("CPU_TASK_TIMEOUT", 60))
+        self.prewarm_ocr = prewarm_ocr if prewarm_ocr is not None else env("CPU_PREWARM_OCR", "0") == "1"
+        self.slots = threading.BoundedSemaphore(self.queue_size)
+        self.lock = threading.Lock()
+        self.executor = None
+        # Bitmemiş işler gönderilme sırasıyla; havuz FIFO çalıştığı için ilk workers tanesi çalışıyordur
+        self.pending = []
+
+    def start(self):
+        """Havuzu (henüz yoksa) başlatır; workerlar hemen ısıtılmaya başlar."""
+        with self.lock:
+            if self.executor is None and self.workers > 0:
+                # Çok thread'li süreç içinde fork güvenli olmadığı için spawn kullanılır
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context("spawn"),
+                                                    initializer=_prewarm, initargs=(self.prewarm_ocr,))
+            return self.executor
+
+    def prewarm(self):
+        """Tüm worker süreçlerini ilk isteği beklemeden şimdi başlatır."""
+        executor = self.start()
+        if executor is not None:
+            for _ in range(self.workers):
+                executor.submit(_noop)
+
+    def submit(self, fn, *args, block:bool = False, timeout:float = None, **kwargs) -> PoolFuture:
+        """
+        İşi kuyruğa ekler. Kuyruk doluysa block=False iken hemen, block=True iken
+        timeout saniye bekledikten sonra PoolBusy fırlatır.
+        """
+        if self.workers <= 0:
+            future = PoolFuture()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if not self.slots.acquire(blocking=block, timeout=timeout if block else None):
+            raise PoolBusy("Sunucu şu an çok yoğun, lütfen daha sonra tekrar deneyin.")
+        try:
+            task = self._submit(_runTask, fn, args, kwargs)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.pending.append(task)
+        # İş zaman aşımına uğrasa bile gerçekten bitene kadar yer tutmaya devam eder
+        task.add_done_callback(self._taskDone)
+        future = PoolFuture(self, task)
+        future.add_done_callback(lambda f: task.cancel() if f.cancelled() else None)
+        task.add_done_callback(lambda t: _chainResult(t, future))
+        return future
+
+    def _taskDone(self, task:Future):
+        with self.lock:
+            self.pending.remove(task)
+        self.slots.release()
+
+    def isRunning(self, task:Future) -> bool:
+        """İş bir worker'a verildi mi. ProcessPoolExecutor işleri önceden sıraya aldığı için
+        task.running() kuyrukta bekleyen işler için de True dönebilir; bunun yerine sıraya bakılır."""
+        with self.lock:
+            return task not in self.pending or self.pending.index(task) < self.workers
+
+    def _submit(self, fn, *args, **kwargs) -> Future:
+        executor = self.start()
+        try:
+            return executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # Bir worker çöktüyse havuzu yeniden kur
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = None
+            return self.start().submit(fn, *args, **kwargs)
+
+    def run(self, fn, *args, timeout:float = None, **kwargs):
+        """İşi havuzda çalıştırır ve sonucunu bekler."""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout or self.task_timeout)
+        except FuturesTimeout:
+            future.cancel()
+            raise TaskTimeout("İşlem zaman aşımına uğradı.")
+
+    async def run_async(self, fn, *args, timeout:float = None, **kwargs):
+        """run()'ın asyncio sürümü; olay döngüsünü bloklamaz."""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.task_timeout)
+        except asyncio.TimeoutError:
+            raise TaskTimeout("İşlem zaman aşımına uğradı.")
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+
+cpu_pool = CPUPool()
+
+
+def scanDocument(source, file_ext:str, limit:int = None, pages_per_task:int = None, timeout:float = None,
+                 pool:CPUPool = None) -> list:
+    """
+    Belgenin tüm sayfalarındaki QR kodlarını bulur. PDF sayfaları pages_per_task'lık (QR_SCAN_PAGES_PER_TASK,
+    varsayılan 2) gruplar halinde havuzda paralel çizilip taranır; limit kadar farklı kod bulununca
+    bekleyen gruplar iptal edilir. Aynı içerik birden fazla sayfada varsa ilk sayfası alınır.
+    [{"page": 1'den başlayan sayfa no, "qr": qr_data}, ...] sayfa sırasıyla döndürür.
+    """
+    pool = pool or cpu_pool
+    timeout = timeout or pool.task_timeout
+    if file_ext != 'pdf':
+        found = pool.run(scanPages, source, file_ext, timeout=timeout)
+    else:
+        from qrtest import usePdf
+        with usePdf(source) as doc:
+            page_count = doc.page_count
+        per_task = pages_per_task or int(os.environ.get("QR_SCAN_PAGES_PER_TASK", 2))
+        groups = deque(list(range(i, min(i + per_task, page_count))) for i in range(0, page_count, per_task))
+        found = _scanGroups(pool, source, groups, limit, time.monotonic() + timeout)
+    codes = {}
+    # Sayfa içindeki sıra (yukarıdan aşağıya) korunur
+    for page, qr_data in sorted(found, key=lambda f: f[0]):
+        codes.setdefault(qr_data, page)
+    results = sorted(({"page": page + 1, "qr": qr_data} for qr_data, page in codes.items()),
+                     key=lambda r: r["page"])
+    return results[:limit] if limit else results
+
+def _scanGroups(pool:CPUPool, source, groups:deque, limit:int, deadline:float) -> list:
+    found, unique, pending = [], set(), set()
+    try:
+        while groups or pending:
+            while groups:
+                try:
+                    # Bekleyen iş yoksa kuyrukta yer açılmasını bekle, varsa sonuçları toplamaya dön
+                    future = pool.submit(scanPages, source, 'pdf', groups[0], block=not pending,
+                                         timeout=max(deadline - time.monotonic(), 0))
+                except PoolBusy:
+                    if not pending:
+                        raise
+                    break
+                groups.popleft()
+                pending.add(future)
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TaskTimeout("İşlem zaman aşımına uğradı.")
+            for future in done:
+                for page, qr_data in future.result():
+                    found.append((page, qr_data))
+                    unique.add(qr_data)
+            if limit and len(unique) >= limit:
+                break
+    finally:
+        # Yeterli kod bulunduysa ya da hata olduysa kalan sayfa gruplarını iptal et
+        for future in pending:
+            future.cancel()
+    return found